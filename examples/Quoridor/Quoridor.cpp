@@ -11,9 +11,6 @@
 using namespace std;
 
 
-default_random_engine Quoridor_state::generator = default_random_engine(time(NULL));
-
-
 Quoridor_state::Quoridor_state()
     : move_counter(0), wx(0), wy(4), bx(8), by(4), wwallsno(10), bwallsno(10), turn('W'), wdists(NULL), bdists(NULL) {
     for (int i = 0 ; i < 81 ; i++) {
@@ -37,6 +34,19 @@ Quoridor_state::~Quoridor_state() {
     reset_dists(bdists);
 }
 
+uint64_t Quoridor_state::hash() const {
+    /** FNV-1a over everything that defines the position (pawns, walls, walls left and turn) but not move_counter */
+    uint64_t h = 0xCBF29CE484222325ULL;
+    auto add = [&h](unsigned char byte) { h = (h ^ byte) * 0x100000001B3ULL; };
+    add(wx); add(wy); add(bx); add(by);
+    add(wwallsno); add(bwallsno);
+    add(turn);
+    for (int i = 0 ; i < 81 ; i++) {
+        add(walls[i / 9][i % 9]);
+    }
+    return (h != 0) ? h : 1;
+}
+
 char Quoridor_state::check_winner() const {
     if (wx == 8) return 'W';
     if (bx == 0) return 'B';
@@ -681,7 +691,7 @@ bool force_playwall(Quoridor_state &s) {
     return false;
 }
 
-Quoridor_move *pick_semirandom_move(Quoridor_state &s, uniform_real_distribution<double> &dist, default_random_engine &gen) {
+Quoridor_move *pick_semirandom_move(Quoridor_state &s, uniform_real_distribution<double> &dist, Xoshiro256 &gen) {
     #define WALL_VS_MOVE_CHANCE 0.4
     #define BEST_VS_RANDOM_MOVE 0.8
     #define BEST_WALLMOVE 0.1                   // this is much more expensive
@@ -797,7 +807,7 @@ Quoridor_move *pick_semirandom_move(Quoridor_state &s, uniform_real_distribution
         return s.get_best_step_move(s.whose_turn());
     } else {
         vector<MCTS_move *> v = s.get_legal_step_moves2(s.whose_turn());
-        int r = rand() % v.size();
+        int r = (int) gen.below(v.size());
         for (int i = 0 ; i < v.size() ; i++) {
             if (i != r) delete v[i];
         }
@@ -832,7 +842,7 @@ double Quoridor_state::rollout() const {
             break;
         }
         // otherwise keep simulating until we do or reached a certain depth
-        Quoridor_move *m = pick_semirandom_move(s, dist, generator);
+        Quoridor_move *m = pick_semirandom_move(s, dist, thread_rng());
         if (!s.legal_move(m)) {
             cout << "Picked illegal move: " << ((m != NULL) ? m->sprint() : "NULL" ) << " intentionally! Move history:" << endl;
             #ifdef DDEBUG
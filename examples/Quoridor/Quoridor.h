@@ -26,6 +26,12 @@ struct Quoridor_move : public MCTS_move {
         string playerstr = (player == 'W') ? "White" : "Black";
         return playerstr + " " + movetype + " " + string(1, (char) ('A' + y)) + to_string(x + 1);
     }
+    vector<double> to_numpy() const override {
+        return {(double) x, (double) y, (double) (type == 'h'), (double) (type == 'v')};
+    }
+    vector<int> to_env_action() const override {
+        return {x, y, (type == 'h') ? 1 : (type == 'v') ? 2 : 0};
+    }
 };
 
 
@@ -46,8 +52,6 @@ class Quoridor_state : public MCTS_state {
     short int **bdists;
     /** moves played */
     unsigned int move_counter;
-    /** randomness for rollouts */
-    static default_random_engine generator;
     //////////////////////////////////////////
     char change_turn() { turn = (turn == 'W') ? 'B' : 'W'; return turn; }
     bool horizontal_wall(short int x, short int y) const { return walls[x][y] == 'h' || walls[x][y] == 'b'; }
@@ -76,7 +80,7 @@ public:
     queue<MCTS_move *> *generate_good_moves();
     queue<MCTS_move *> *generate_all_moves();
     friend bool force_playwall(Quoridor_state &s);
-    friend Quoridor_move *pick_semirandom_move(Quoridor_state &s, std::uniform_real_distribution<double> &dist, std::default_random_engine &gen);
+    friend Quoridor_move *pick_semirandom_move(Quoridor_state &s, std::uniform_real_distribution<double> &dist, Xoshiro256 &gen);
     friend double evaluate_position(Quoridor_state &s, bool cheap);
     /** Overrides: **/
     bool is_terminal() const override;
@@ -86,6 +90,7 @@ public:
     double rollout() const override;                        // the rollout simulation in MCTS
     void print() const override;
     bool is_self_side_turn() const override { return turn == 'W'; }
+    uint64_t hash() const override;
 };
 
 
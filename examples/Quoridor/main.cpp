@@ -5,6 +5,7 @@
 /** AI PARAMETERS **/
 #define MAXITER 20000
 #define MAXSECONDS 15
+#define TRANSPOSITION_TABLE_SIZE (1 << 20)       // move orders often transpose in Quoridor (0 to disable)
 
 #define PROMPT "> "
 
@@ -54,6 +55,7 @@ int main() {
     }
     /** Game Tree for AI (works for both sides) **/
     MCTS_tree *game_tree = new MCTS_tree(new Quoridor_state());    // Important: do not use the same state that we change in main loop
+    game_tree->set_transposition_table_size(TRANSPOSITION_TABLE_SIZE);
 
     cout << (state->whose_turn() == 'W' ? "White's move:" : "Black's move:") << endl << PROMPT;
     flush(cout);
@@ -175,6 +177,7 @@ int main() {
             state = new Quoridor_state();
             delete game_tree;
             game_tree = new MCTS_tree(new Quoridor_state());
+            game_tree->set_transposition_table_size(TRANSPOSITION_TABLE_SIZE);
         }
         else if (command == "rollout") {   // for debug
             double res = 0.0;
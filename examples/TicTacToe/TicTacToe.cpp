@@ -42,6 +42,25 @@ bool TicTacToe_state::is_terminal() const {
 
 char TicTacToe_state::get_turn() const { return turn; }
 
+uint64_t TicTacToe_state::hash() const {
+    // board read as a base-3 number, times two for whose turn it is (+1 so that it is never 0)
+    uint64_t key = 0;
+    for (int i = 0 ; i < 9 ; i++) {
+        char c = board[i / 3][i % 3];
+        key = 3 * key + ((c == 'x') ? 1 : (c == 'o') ? 2 : 0);
+    }
+    return 2 * key + (turn == 'x') + 1;
+}
+
+vector<double> TicTacToe_state::encode() const {
+    vector<double> cells(9, 0.0);
+    for (int i = 0 ; i < 9 ; i++) {
+        char c = board[i / 3][i % 3];
+        if (c != ' ') cells[i] = (c == turn) ? 1.0 : -1.0;
+    }
+    return cells;
+}
+
 char TicTacToe_state::get_winner() const { return winner; }
 
 void TicTacToe_state::change_turn() {
@@ -87,9 +106,7 @@ double TicTacToe_state::rollout() const {
     int a;
     TicTacToe_state *curstate = (TicTacToe_state *) this;   // TODO: ignore const...
     
-    // Thread-safe random number generation
-    static thread_local std::random_device rd;
-    static thread_local std::mt19937 gen(rd());
+    Xoshiro256 &gen = thread_rng();     // per search thread, seeded by the tree
     
     bool first = true;
     do {
@@ -126,8 +143,6 @@ double TicTacToe_state::heuristic_rollout() const {
     }
     
     TicTacToe_state *curstate = (TicTacToe_state *) this;
-    static thread_local std::random_device rd;
-    static thread_local std::mt19937 gen(rd());
     
     bool first = true;
     do {
@@ -162,8 +177,7 @@ double TicTacToe_state::heuristic_rollout() const {
 }
 
 int TicTacToe_state::find_best_heuristic_move(TicTacToe_state* state, const deque<int>& available) const {
-    static thread_local std::random_device rd;
-    static thread_local std::mt19937 gen(rd());
+    Xoshiro256 &gen = thread_rng();
     
     // Priority 1: Win if possible
     for (int pos : available) {
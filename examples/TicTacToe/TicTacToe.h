@@ -31,6 +31,8 @@ public:
     void print() const override;
     bool is_self_side_turn() const override { return turn == 'x'; }
     MCTS_state* clone() const override { return new TicTacToe_state(*this); }
+    uint64_t hash() const override;
+    vector<double> encode() const override;                 // 9 cells: 1 own mark, -1 opponent's, 0 empty
     
     // Heuristic rollout methods
     double heuristic_rollout() const override;
@@ -0,0 +1,43 @@
+#ifndef ATOMIC_STAT_H
+#define ATOMIC_STAT_H
+
+#include <atomic>
+
+using namespace std;
+
+
+/** Search statistic that several search threads may update at once. Notes:
+ * - All accesses are relaxed: statistics only steer selection, a slightly stale read is harmless, a torn or lost
+ * update is not.
+ * - Updates are compare-and-swap loops (C++11 has no fetch_add for floating point types), uncontended they cost
+ * about as much as a plain locked add.
+ * - Unlike std::atomic it can be copied, so it can live in vectors and in nodes that get relocated. Copies are
+ * only meant to be made while no other thread uses the value.
+ */
+template <typename T>
+class AtomicStat {
+    atomic<T> value;
+public:
+    AtomicStat(T v = T()) : value(v) {}
+    AtomicStat(const AtomicStat &other) : value(other.load()) {}
+    AtomicStat &operator=(const AtomicStat &other) { store(other.load()); return *this; }
+    AtomicStat &operator=(T v) { store(v); return *this; }
+
+    T load() const { return value.load(memory_order_relaxed); }
+    void store(T v) { value.store(v, memory_order_relaxed); }
+    operator T() const { return load(); }
+
+    void add(T d) {
+        T current = load();
+        while (!value.compare_exchange_weak(current, current + d, memory_order_relaxed)) {}
+    }
+    void sub(T d) {
+        T current = load();
+        while (!value.compare_exchange_weak(current, current - d, memory_order_relaxed)) {}
+    }
+    AtomicStat &operator+=(T d) { add(d); return *this; }
+    AtomicStat &operator-=(T d) { sub(d); return *this; }
+    void operator++(int) { add(T(1)); }
+};
+
+#endif
@@ -1,64 +1,92 @@
 #ifndef JOBSCHEDULER_H
 #define JOBSCHEDULER_H
 
-#include <queue>
+#include <deque>
+#include <vector>
+#include <thread>
+#include <mutex>
+#include <condition_variable>
+#include <atomic>
 #include <unordered_map>
-#include <pthread.h>
 #include <stdlib.h>
 
 
 #define NUMBER_OF_THREADS 4                  // default number of threads
 #define NOTAG -1
+#define SPIN_BEFORE_PARK 2000                // polls (with yields in between) before a thread goes to sleep, when
+                                             // there are spare cores to spin on
 
 
 using namespace std;
 
 
 class Job {                                  // extend this to whatever job you want scheduled (in a different .cpp/.h)
+    friend class JobScheduler;
+    atomic<unsigned int> *tag_pending = NULL;    // the count of TAG's pending jobs, set when the job is scheduled
 public:
     const int TAG;                           // used to group waiting for different jobs
-    Job(int tag = NOTAG) : TAG(tag) {}
+    const bool OWNED;                        // deleted by the scheduler once run, false for jobs that are reused
+    Job(int tag = NOTAG, bool owned = true) : TAG(tag), OWNED(owned) {}
     virtual ~Job() {}
     virtual void run() = 0;                  // must be thread_safe
 };
 
 
-struct thread_args {
-    queue <Job *> *jobQueue;
-    pthread_mutex_t *queueLock;
-    pthread_cond_t *queueCond;
-    volatile unsigned int *jobsRunning;
-    volatile bool *threads_must_exit;
-    pthread_cond_t *jobs_finished_cond;
-    unordered_map<int, volatile unsigned int> *tagged_jobs_pending;
-    thread_args(queue<Job *> *_jobQueue, pthread_mutex_t *_queueLock, pthread_cond_t *_queueCond,
-                volatile unsigned int *_jobsRunning, volatile bool *_threads_must_exit, pthread_cond_t *_jobs_finished_cond, unordered_map<int, volatile unsigned int> *_tagged_jobs_pending)
-            : jobQueue(_jobQueue), queueLock(_queueLock), queueCond(_queueCond), jobsRunning(_jobsRunning), threads_must_exit(_threads_must_exit), jobs_finished_cond(_jobs_finished_cond), tagged_jobs_pending(_tagged_jobs_pending) {}
-};
-
-void *thread_code(void *args);
-
-
+/** Work-stealing thread pool. Notes:
+ * - Every worker has its own deque: it pops its newest job from the back and, when it runs dry, steals the oldest
+ * half of another worker's deque (starting with the one it last stole from). Each deque has its own lock, so
+ * workers rarely contend.
+ * - Jobs scheduled from a worker go to that worker's deque, jobs from other threads are spread round robin.
+ * - Pending jobs are counted with atomics, one counter overall and one per tag. A tag's counter is created the first
+ * time the tag is scheduled and kept, jobs look it up when they are scheduled: no lock is taken to finish a job.
+ * - Idle workers and waiting threads spin for a while before they park on a condition variable, so bursts of small
+ * jobs do not pay for a wake-up each. A pool with at least as many workers as hardware threads parks right away:
+ * spinning there would only take the cores away from the threads that schedule and run jobs.
+ * - A parked worker is only woken when no other worker is searching for a job and fewer workers than cores are
+ * awake. The searcher that finds a job wakes the next one if more are queued.
+ */
 class JobScheduler {
+    struct WorkerQueue {
+        mutex lock;
+        deque<Job *> jobs;
+        unsigned int last_victim = 0;        // only used by the owner: where its last steal succeeded
+    };
     /* Thread pool */
-    pthread_t *threads;
+    vector<thread> threads;
     const unsigned int number_of_threads;
-    volatile bool threads_must_exit;
-    /* Job queue */
-    queue<Job *> job_queue;
-    pthread_mutex_t queue_lock;
-    pthread_cond_t queue_cond;               // true -> not empty
-    thread_args *t_args;
+    const unsigned int hardware_threads;
+    const int spin_limit;                    // SPIN_BEFORE_PARK, or 1 when the pool oversubscribes the machine
+    atomic<bool> threads_must_exit;
+    /* Job queues */
+    vector<WorkerQueue *> queues;            // one per worker
+    atomic<unsigned int> next_queue;         // round robin for jobs scheduled from outside the pool
+    atomic<unsigned int> queued;             // scheduled, not yet taken by a worker
+    atomic<unsigned int> searching_workers;  // awake and looking for a job, one of them will pick up a new job
+    atomic<unsigned int> parked_workers;
+    mutex work_lock;
+    condition_variable work_cond;            // queued > 0 or threads_must_exit
     /* Job Info */
-    pthread_cond_t jobs_finished_cond;
-    volatile unsigned int jobs_running;      // protected by queue_lock
-    unordered_map<int, volatile unsigned int> tagged_jobs_pending;   // tag -> number of jobs
+    atomic<unsigned int> pending;            // scheduled, not yet finished
+    mutex tags_lock;
+    unordered_map<int, atomic<unsigned int> *> tagged_pending;   // never shrinks: jobs hold pointers to the counters
+    atomic<unsigned int> parked_waiters;
+    mutex finished_lock;
+    condition_variable finished_cond;        // some counter reached 0
+
+    const atomic<unsigned int> *pending_count(int tag);         // NULL for a tag that was never scheduled
+    void push(Job **jobs, size_t n);
+    Job *take(unsigned int worker);
+    void wake_workers(size_t n);
+    void finished(atomic<unsigned int> *tag_pending);
+    void worker_loop(unsigned int worker);
 public:
     JobScheduler(unsigned int _number_of_threads = NUMBER_OF_THREADS);
     ~JobScheduler();                         // Waits until all jobs have finished!
     void schedule(Job *job);
+    void schedule_many(Job **jobs, size_t n);
+    void schedule_many(const vector<Job *> &jobs) { if (!jobs.empty()) schedule_many((Job **) jobs.data(), jobs.size()); }
     bool JobsHaveFinished(int tag = NOTAG);
-    void waitUntilJobsHaveFinished(int taf = NOTAG);
+    void waitUntilJobsHaveFinished(int tag = NOTAG);
     unsigned int get_number_of_threads() const { return number_of_threads; }
 };
 
@@ -0,0 +1,68 @@
+#ifndef NODE_ARENA_H
+#define NODE_ARENA_H
+
+#include <vector>
+#include <new>
+#include <utility>
+#include <cstddef>
+
+#define NODE_ARENA_SLAB_SIZE 4096        // number of objects per slab
+
+using namespace std;
+
+
+/** Slab (bump) allocator for tree nodes. Notes:
+ * - Objects are never freed one by one: clear() runs every destructor and releases whole slabs at once.
+ * - Objects never move while the arena lives, so raw pointers to them stay valid until clear().
+ * - To shrink/compact, relocate whatever should survive into a fresh arena and swap() it in.
+ */
+template <typename T>
+class NodeArena {
+    vector<T *> slabs;
+    size_t slab_capacity;                // objects per slab
+    size_t used;                         // objects handed out from the last slab
+    size_t count;                        // objects handed out in total
+public:
+    explicit NodeArena(size_t slab_capacity = NODE_ARENA_SLAB_SIZE)
+            : slab_capacity(slab_capacity > 0 ? slab_capacity : 1), used(0), count(0) {}
+    NodeArena(const NodeArena &) = delete;
+    NodeArena &operator=(const NodeArena &) = delete;
+    ~NodeArena() { clear(); }
+
+    template <typename... Args>
+    T *create(Args &&... args) {
+        if (slabs.empty() || used == slab_capacity) {
+            slabs.push_back(static_cast<T *>(::operator new(slab_capacity * sizeof(T))));
+            used = 0;
+        }
+        T *obj = new (slabs.back() + used) T(std::forward<Args>(args)...);
+        used++;
+        count++;
+        return obj;
+    }
+
+    void clear() {
+        for (size_t s = 0 ; s < slabs.size() ; s++) {
+            size_t n = (s + 1 == slabs.size()) ? used : slab_capacity;
+            for (size_t i = 0 ; i < n ; i++) {
+                slabs[s][i].~T();
+            }
+            ::operator delete(slabs[s]);
+        }
+        slabs.clear();
+        used = 0;
+        count = 0;
+    }
+
+    void swap(NodeArena &other) {
+        slabs.swap(other.slabs);
+        std::swap(slab_capacity, other.slab_capacity);
+        std::swap(used, other.used);
+        std::swap(count, other.count);
+    }
+
+    size_t size() const { return count; }
+    size_t bytes() const { return slabs.size() * slab_capacity * sizeof(T); }
+};
+
+#endif
@@ -0,0 +1,75 @@
+#ifndef MCTS_RANDOM_H
+#define MCTS_RANDOM_H
+
+#include <cstdint>
+#include <random>
+
+using namespace std;
+
+
+/** Small, fast generator (xoshiro256**) for rollouts. Notes:
+ * - Satisfies UniformRandomBitGenerator, so it works with the <random> distributions and std::shuffle.
+ * - Seeding expands one 64-bit seed with splitmix64, equal seeds give equal sequences on every platform.
+ * - Not thread safe: every thread uses its own, see thread_rng().
+ */
+class Xoshiro256 {
+    uint64_t s[4];
+    static uint64_t rotl(uint64_t x, int k) { return (x << k) | (x >> (64 - k)); }
+public:
+    typedef uint64_t result_type;
+    explicit Xoshiro256(uint64_t seed = 0) { this->seed(seed); }
+    void seed(uint64_t seed) {
+        for (int i = 0 ; i < 4 ; i++) {
+            seed += 0x9e3779b97f4a7c15ULL;           // splitmix64
+            uint64_t z = seed;
+            z = (z ^ (z >> 30)) * 0xbf58476d1ce4e5b9ULL;
+            z = (z ^ (z >> 27)) * 0x94d049bb133111ebULL;
+            s[i] = z ^ (z >> 31);
+        }
+    }
+    static constexpr result_type min() { return 0; }
+    static constexpr result_type max() { return UINT64_MAX; }
+    result_type operator()() {
+        const uint64_t result = rotl(s[1] * 5, 7) * 9;
+        const uint64_t t = s[1] << 17;
+        s[2] ^= s[0];
+        s[3] ^= s[1];
+        s[1] ^= s[2];
+        s[0] ^= s[3];
+        s[2] ^= t;
+        s[3] = rotl(s[3], 45);
+        return result;
+    }
+    double uniform() { return (double) (operator()() >> 11) * (1.0 / 9007199254740992.0); }     // in [0, 1)
+    uint64_t below(uint64_t n) {                     // uniform in [0, n), n > 0, without modulo bias
+        const uint64_t threshold = (0 - n) % n;
+        uint64_t r;
+        do { r = operator()(); } while (r < threshold);
+        return r % n;
+    }
+};
+
+
+/** Derives an independent seed for the given stream (e.g. search thread or rollout index) from a base seed. */
+inline uint64_t mix_seed(uint64_t seed, uint64_t stream) {
+    uint64_t z = seed ^ ((stream + 1) * 0x9e3779b97f4a7c15ULL);
+    z = (z ^ (z >> 30)) * 0xbf58476d1ce4e5b9ULL;
+    z = (z ^ (z >> 27)) * 0x94d049bb133111ebULL;
+    return z ^ (z >> 31);
+}
+
+/** A fresh, non deterministic seed. */
+inline uint64_t random_seed() {
+    random_device rd;
+    return ((uint64_t) rd() << 32) ^ (uint64_t) rd();
+}
+
+/** The generator of the calling thread, for MCTS_state implementations (rollouts, random move choices). Search
+ * threads reseed it from their tree's seed when a search starts, so with a fixed seed a single threaded search is
+ * reproducible. Threads that were never reseeded start from a random seed. */
+inline Xoshiro256 &thread_rng() {
+    static thread_local Xoshiro256 rng(random_seed());
+    return rng;
+}
+
+#endif
@@ -0,0 +1,115 @@
+#ifndef ROLLOUT_BATCH_H
+#define ROLLOUT_BATCH_H
+
+#include "JobScheduler.h"
+#include "AtomicStat.h"
+#include "state.h"
+#include <atomic>
+#include <thread>
+#include <algorithm>
+#include <vector>
+#include <iostream>
+
+using namespace std;
+
+
+/** Persistent pool shared by all rollout batches: created on first use with one worker per hardware thread
+ * besides the caller's (which runs rollouts too) and kept for the lifetime of the program. */
+inline JobScheduler &rollout_scheduler() {
+    static JobScheduler scheduler(max(thread::hardware_concurrency(), 2u) - 1);
+    return scheduler;
+}
+
+
+/** Leaf parallelism: n rollouts from the same state, run by the calling thread together with the pool. Notes:
+ * - One object serves every leaf. It is scheduled (not owned by the scheduler) once per helping worker and all
+ * of them claim rollouts from a shared counter, so there is no allocation per rollout or per leaf.
+ * - The caller runs rollouts as well instead of waiting. Once they are all claimed it closes the batch and only waits
+ * for helpers that joined it: a copy the workers only get to afterwards (e.g. queued behind other batches' jobs on
+ * the shared pool) finds it closed and returns without touching it, or helps with the next batch if that is open.
+ * Copies still queued are counted, so a new batch only schedules the ones missing.
+ * - Rollout is a copyable functor double(const MCTS_state *) that must be thread safe.
+ * - Rollout i runs with thread_rng() seeded from (a seed drawn from the caller's generator, i), so the result of a
+ * batch does not depend on which thread ran which rollout. Every thread's own generator is restored afterwards.
+ * - Not reentrant: use one batch per calling thread (e.g. thread_local).
+ */
+template <typename Rollout>
+class RolloutBatch : public Job {
+    const MCTS_state *state;
+    Rollout rollout;
+    unsigned int n;
+    uint64_t seed;
+    atomic<unsigned int> next;           // next rollout to claim
+    atomic<bool> open;                   // a batch is running and helpers may join it
+    atomic<unsigned int> joined;         // helpers working on the running batch
+    atomic<unsigned int> queued;         // copies handed to the scheduler that have not run yet
+    atomic<unsigned int> valid;          // rollouts that returned a result in [0, 1]
+    AtomicStat<double> sum;
+    vector<Job *> copies;                // this, once per helper, handed to the scheduler in one batch
+
+    void work() {
+        Xoshiro256 &rng = thread_rng();
+        const Xoshiro256 saved = rng;
+        for (unsigned int i = next.fetch_add(1) ; i < n ; i = next.fetch_add(1)) {
+            rng.seed(mix_seed(seed, i));
+            double result = rollout(state);
+            if (result >= 0.0 && result <= 1.0) {
+                sum += result;
+                valid++;
+            } else {    // should not happen
+                cerr << "Warning: Invalid result when aggregating parallel rollouts" << endl;
+            }
+        }
+        rng = saved;
+    }
+
+public:
+    RolloutBatch() : Job(NOTAG, false), state(NULL), rollout(), n(0), seed(0), next(0), open(false), joined(0),
+                     queued(0), valid(0), sum(0.0) {}
+
+    ~RolloutBatch() {                    // the scheduler may still hold copies of this
+        while (queued.load() > 0) {
+            this_thread::yield();
+        }
+    }
+
+    void run() override {                // worker side
+        // joined is raised before open is read and the caller lowers open before it reads joined (both sequentially
+        // consistent), so either the caller waits for this helper or the helper sees the batch closed
+        joined++;
+        if (open) {
+            work();
+        }
+        joined--;
+        queued--;
+    }
+
+    /** Runs count rollouts from s, returns how many of them gave a valid result and their sum in w. */
+    unsigned int run_batch(const MCTS_state *s, const Rollout &r, unsigned int count, double &w) {
+        state = s;
+        rollout = r;
+        n = count;
+        seed = thread_rng()();
+        valid = 0;
+        sum = 0.0;
+        next = 0;
+        open = true;                     // publishes the fields above to the helpers
+        JobScheduler &scheduler = rollout_scheduler();
+        unsigned int k = (count > 1) ? min(count - 1, scheduler.get_number_of_threads()) : 0;
+        unsigned int pending = queued.load();
+        if (k > pending) {
+            queued += k - pending;
+            copies.assign(k - pending, this);
+            scheduler.schedule_many(copies);
+        }
+        work();
+        open = false;                    // every rollout is claimed: helpers arriving from now on stay out
+        while (joined.load() > 0) {      // only helpers that are running rollouts of this batch
+            this_thread::yield();
+        }
+        w = sum;
+        return valid;
+    }
+};
+
+#endif
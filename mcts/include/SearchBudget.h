@@ -0,0 +1,189 @@
+#ifndef SEARCH_BUDGET_H
+#define SEARCH_BUDGET_H
+
+#include <atomic>
+#include <chrono>
+#include <cstddef>
+#include <algorithm>
+#include <cmath>
+
+#define BUDGET_CHECK_SECONDS 0.0005      // aim at reading the clock about this often
+#define BUDGET_MAX_STRIDE 4096           // but at least every this many iterations
+#define EARLY_STOP_STRIDE 32             // iterations between two looks at the root statistics (smart stop)
+
+using namespace std;
+
+
+enum class StopReason {
+    NONE,             // no search yet
+    ITERATIONS,       // max_iterations reached
+    TIME,             // deadline reached
+    NODES,            // max_nodes reached
+    MEMORY,           // max_memory_bytes reached
+    EXHAUSTED,        // nothing left to search (e.g. the tree covers the whole game)
+    DECIDED,          // smart stop: the remaining budget can no longer change the best root move
+    FORCED,           // smart stop: the root has a single legal move
+    CANCELLED         // the cancel flag was raised (e.g. pondering stopped)
+};
+
+inline const char *stop_reason_name(StopReason reason) {
+    switch (reason) {
+        case StopReason::ITERATIONS: return "iterations";
+        case StopReason::TIME: return "time";
+        case StopReason::NODES: return "nodes";
+        case StopReason::MEMORY: return "memory";
+        case StopReason::EXHAUSTED: return "exhausted";
+        case StopReason::DECIDED: return "decided";
+        case StopReason::FORCED: return "forced";
+        case StopReason::CANCELLED: return "cancelled";
+        case StopReason::NONE:
+        default: return "none";
+    }
+}
+
+
+/** Limits of one search, any mix of them. The search stops at the first one reached, or earlier with the smart
+ * stop once spending the rest of the budget would not change the move picked at the root (see best_move_decided). */
+struct SearchBudget {
+    long max_iterations;                 // < 0: unlimited
+    double max_seconds;                  // wall clock, < 0: no deadline
+    size_t max_nodes;                    // nodes held by the tree's arena, 0: unlimited
+    size_t max_memory_bytes;             // bytes of the arena and transposition table, 0: unlimited
+    bool early_stop;                     // smart stop
+    double early_stop_confidence;        // in (0, 1): also stop when the best move is this certain, 0: off
+    const atomic<bool> *cancel;          // if set, the search stops as soon as another thread raises it
+    SearchBudget(long max_iterations = -1, double max_seconds = -1.0, size_t max_nodes = 0, size_t max_memory_bytes = 0,
+                 bool early_stop = false, double early_stop_confidence = 0.0)
+        : max_iterations(max_iterations), max_seconds(max_seconds), max_nodes(max_nodes),
+          max_memory_bytes(max_memory_bytes), early_stop(early_stop), early_stop_confidence(early_stop_confidence),
+          cancel(NULL) {}
+};
+
+
+/** Smart stop test on the statistics of the root's children, for the move select_best_child() picks: the highest
+ * winrate for the player to move. It is decided when either
+ * - the gap cannot close within the remaining iterations (remaining >= 0): even if the leader lost all of them and
+ * a rival won all of them, the rival would still be behind. This takes the visit counts into account, a move
+ * backed by many visits hardly moves;
+ * - or the confidence bounds separate (0 < confidence < 1): the leader's lower Hoeffding bound lies above every
+ * rival's upper bound. This one is statistical: it stops much earlier in lopsided positions but may be wrong.
+ * Every child must have been visited. */
+template <class Stat>
+bool best_move_decided(const Stat *scores, const Stat *visits, size_t n, bool self_side_turn, long remaining,
+                       double confidence) {
+    if (n < 2) return n == 1;
+    // wins of the player to move
+    auto wins = [&](size_t i) { return self_side_turn ? (double) scores[i] : (double) visits[i] - (double) scores[i]; };
+    size_t best = 0;
+    for (size_t i = 0 ; i < n ; i++) {
+        if ((double) visits[i] <= 0.0) return false;
+        if (wins(i) / (double) visits[i] > wins(best) / (double) visits[best]) best = i;
+    }
+    bool by_budget = remaining >= 0, by_confidence = confidence > 0.0 && confidence < 1.0;
+    const double r = (double) max(remaining, 0L);
+    const double log_term = by_confidence ? log(2.0 / (1.0 - confidence)) / 2.0 : 0.0;
+    const double w_best = wins(best), v_best = visits[best];
+    const double leader_worst = w_best / (v_best + r);
+    const double leader_low = w_best / v_best - sqrt(log_term / v_best);
+    for (size_t i = 0 ; i < n && (by_budget || by_confidence) ; i++) {
+        if (i == best) continue;
+        const double w = wins(i), v = visits[i];
+        if (by_budget && (w + r) / (v + r) >= leader_worst) by_budget = false;
+        if (by_confidence && w / v + sqrt(log_term / v) >= leader_low) by_confidence = false;
+    }
+    return by_budget || by_confidence;
+}
+
+
+/** Decides when a search stops. Notes:
+ * - Time is measured on the monotonic steady_clock.
+ * - The clock is not read every iteration: the stride between reads adapts to the measured iteration rate so that
+ * the deadline is overshot by about BUDGET_CHECK_SECONDS (less when little time is left).
+ * - Neither a deadline nor a cancellation stops a search before its first iteration, so the search still gives a
+ * move.
+ * - Not thread safe: concurrent searchers use one copy each and share the outcome themselves.
+ */
+class BudgetController {
+    typedef chrono::steady_clock clock;
+    SearchBudget budget;
+    clock::time_point start, deadline;
+    unsigned long next_check;            // iteration count at which the clock is read next
+    unsigned long next_early_check;      // iteration count at which the smart stop looks at the root next
+    StopReason reason;
+
+    bool finish(StopReason r) {
+        if (reason == StopReason::NONE) reason = r;
+        return true;
+    }
+
+public:
+    explicit BudgetController(const SearchBudget &budget)
+            : budget(budget), start(clock::now()), next_check(0), next_early_check(1), reason(StopReason::NONE) {
+        if (budget.max_seconds >= 0.0) {
+            deadline = start + chrono::duration_cast<clock::duration>(chrono::duration<double>(budget.max_seconds));
+        }
+    }
+
+    /** Called before every iteration with the iterations done so far and the current size of the tree. */
+    bool should_stop(unsigned long iterations, size_t nodes, size_t bytes) {
+        if (reason != StopReason::NONE) return true;
+        if (budget.cancel != NULL && iterations > 0 && budget.cancel->load(memory_order_relaxed)) {
+            return finish(StopReason::CANCELLED);
+        }
+        if (budget.max_iterations >= 0 && iterations >= (unsigned long) budget.max_iterations) {
+            return finish(StopReason::ITERATIONS);
+        }
+        if (budget.max_nodes > 0 && nodes >= budget.max_nodes) return finish(StopReason::NODES);
+        if (budget.max_memory_bytes > 0 && bytes >= budget.max_memory_bytes) return finish(StopReason::MEMORY);
+        if (budget.max_seconds >= 0.0 && iterations > 0 && iterations >= next_check) {
+            clock::time_point now = clock::now();
+            if (now >= deadline) return finish(StopReason::TIME);
+            double elapsed = chrono::duration<double>(now - start).count();
+            double remaining = chrono::duration<double>(deadline - now).count();
+            double per_iteration = elapsed / (double) iterations;
+            double stride = min(BUDGET_CHECK_SECONDS, remaining / 4.0) / max(per_iteration, 1e-9);
+            next_check = iterations + (unsigned long) max(1.0, min(stride, (double) BUDGET_MAX_STRIDE));
+        }
+        return false;
+    }
+
+    /** Deadline or cancellation, with the clock read now whatever the stride. For loops whose steps are coarse or
+     * may make no progress. */
+    bool interrupted() {
+        if (budget.cancel != NULL && budget.cancel->load(memory_order_relaxed)) return finish(StopReason::CANCELLED);
+        if (budget.max_seconds < 0.0 || clock::now() < deadline) return false;
+        return finish(StopReason::TIME);
+    }
+
+    /** Whether the smart stop is on and should look at the root now, every EARLY_STOP_STRIDE iterations. */
+    bool early_stop_due(unsigned long iterations) {
+        if (!budget.early_stop || iterations < next_early_check) return false;
+        next_early_check = iterations + EARLY_STOP_STRIDE;
+        return true;
+    }
+
+    /** Estimate of the iterations the budget still allows, from the iteration limit and the deadline at the rate
+     * measured so far, < 0 if neither bounds the search. */
+    long remaining_iterations(unsigned long iterations) const {
+        long remaining = -1;
+        if (budget.max_iterations >= 0) remaining = max(0L, budget.max_iterations - (long) iterations);
+        double elapsed = elapsed_seconds();
+        if (budget.max_seconds >= 0.0 && iterations > 0 && elapsed > 0.0) {
+            long in_time = (long) (remaining_seconds() * (double) iterations / elapsed);
+            remaining = (remaining < 0) ? in_time : min(remaining, in_time);
+        }
+        return remaining;
+    }
+
+    double get_early_stop_confidence() const { return budget.early_stop_confidence; }
+    void stop(StopReason r) { finish(r); }
+    bool limits_size() const { return budget.max_nodes > 0 || budget.max_memory_bytes > 0; }
+    StopReason get_reason() const { return reason; }
+    double elapsed_seconds() const { return chrono::duration<double>(clock::now() - start).count(); }
+    double remaining_seconds() const {          // < 0 without a deadline
+        if (budget.max_seconds < 0.0) return -1.0;
+        return max(0.0, chrono::duration<double>(deadline - clock::now()).count());
+    }
+};
+
+#endif
@@ -0,0 +1,86 @@
+#ifndef TRANSPOSITION_TABLE_H
+#define TRANSPOSITION_TABLE_H
+
+#include <vector>
+#include <cstdint>
+#include <cstddef>
+
+#define TRANSPOSITION_BUCKET_SIZE 4      // entries per bucket, the least visited one is replaced when it is full
+
+using namespace std;
+
+
+/** Fixed-size map from state hashes to tree nodes, used to share nodes between transpositions. Notes:
+ * - Keys are MCTS_state::hash() values, 0 is reserved for "no key". Entries also record the node's depth and
+ * only match at the same depth, so edges always go one ply deeper and the resulting DAG cannot have cycles.
+ * - The table is bounded: a key goes to one bucket and, once that is full, replaces its least visited entry.
+ * Losing an entry only means that a transposition is not detected, the node itself stays in the tree.
+ * - It does not own the nodes. The tree clears and refills it whenever nodes move (compaction).
+ */
+template <typename Node>
+class TranspositionTable {
+    struct Entry {
+        uint64_t key;
+        unsigned int depth;
+        Node *node;
+    };
+    vector<Entry> entries;               // buckets of TRANSPOSITION_BUCKET_SIZE consecutive entries
+    size_t buckets;
+    size_t count;
+
+    static uint64_t mix(uint64_t x) {     // splitmix64 finalizer, spreads structured keys over the buckets
+        x += 0x9E3779B97F4A7C15ULL;
+        x = (x ^ (x >> 30)) * 0xBF58476D1CE4E5B9ULL;
+        x = (x ^ (x >> 27)) * 0x94D049BB133111EBULL;
+        return x ^ (x >> 31);
+    }
+    Entry *bucket(uint64_t key) { return &entries[(mix(key) % buckets) * TRANSPOSITION_BUCKET_SIZE]; }
+
+public:
+    TranspositionTable() : buckets(0), count(0) {}
+
+    /** Sets the maximum number of entries (rounded up to whole buckets), 0 disables the table. Clears it. */
+    void resize(size_t max_entries) {
+        buckets = (max_entries + TRANSPOSITION_BUCKET_SIZE - 1) / TRANSPOSITION_BUCKET_SIZE;
+        entries.assign(buckets * TRANSPOSITION_BUCKET_SIZE, Entry{0, 0, NULL});
+        count = 0;
+    }
+
+    void clear() {
+        entries.assign(entries.size(), Entry{0, 0, NULL});
+        count = 0;
+    }
+
+    Node *find(uint64_t key, unsigned int depth) {
+        if (buckets == 0 || key == 0) return NULL;
+        Entry *b = bucket(key);
+        for (size_t i = 0 ; i < TRANSPOSITION_BUCKET_SIZE ; i++) {
+            if (b[i].key == key && b[i].depth == depth) return b[i].node;
+        }
+        return NULL;
+    }
+
+    void insert(uint64_t key, unsigned int depth, Node *node) {
+        if (buckets == 0 || key == 0) return;
+        Entry *b = bucket(key);
+        Entry *victim = NULL;
+        for (size_t i = 0 ; i < TRANSPOSITION_BUCKET_SIZE ; i++) {
+            if (b[i].node == NULL || (b[i].key == key && b[i].depth == depth)) {
+                victim = &b[i];
+                break;
+            }
+            if (victim == NULL || b[i].node->get_number_of_simulations() < victim->node->get_number_of_simulations()) {
+                victim = &b[i];
+            }
+        }
+        if (victim->node == NULL) count++;
+        *victim = Entry{key, depth, node};
+    }
+
+    bool enabled() const { return buckets > 0; }
+    size_t capacity() const { return entries.size(); }
+    size_t size() const { return count; }
+    size_t bytes() const { return entries.size() * sizeof(Entry); }
+};
+
+#endif
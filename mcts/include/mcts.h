@@ -2,15 +2,23 @@
 #define MCTS_H
 
 #include "state.h"
+#include "NodeArena.h"
+#include "TranspositionTable.h"
+#include "SearchBudget.h"
 #include <vector>
 #include <queue>
 #include <iomanip>
+#include <thread>
+#include <atomic>
 
-#define STARTING_NUMBER_OF_CHILDREN 32   // expected number so that we can preallocate this many pointers
+#define SELECTION_BLOCK_SIZE 64          // children scored per block in select_best_child (stack buffer size)
 #define PARALLEL_ROLLOUTS                // whether or not to do multiple parallel rollouts
 
 #ifdef PARALLEL_ROLLOUTS
-#include "JobScheduler.h"
+#include "RolloutBatch.h"
+#define DEFAULT_ROLLOUTS_PER_LEAF NUMBER_OF_THREADS
+#else
+#define DEFAULT_ROLLOUTS_PER_LEAF 1
 #endif
 
 using namespace std;
@@ -25,13 +33,27 @@ enum class RolloutStrategy {
 
 /** Ideas for improvements:
  * - state should probably be const like move is (currently problematic because of Quoridor's example)
- * - Instead of a FIFO Queue use a Priority Queue with priority on most probable (better) actions to be explored first
-  or maybe this should just be an iterable and we let the implementation decide but these have no superclasses in C++ it seems
  * - vectors, queues and these structures allocate data on the heap anyway so there is little point in using the heap for them
  * so use stack instead?
  */
 
 
+class MCTS_node;
+class MCTS_tree;
+
+struct MCTS_edge {                      // a legal move out of a node
+    MCTS_move *move;                    // owned by the edge while untried, then by the child node (as its move)
+    MCTS_node *child;                   // NULL while untried
+    bool transposition;                 // child was found in the transposition table: the edge keeps owning its move
+};
+
+struct MCTS_step {                      // one step of a selection path: a node and the edge followed out of it
+    MCTS_node *node;
+    unsigned int edge;
+};
+typedef vector<MCTS_step> MCTS_path;    // with transpositions a node has several parents, so backpropagation follows the path
+
+
 class MCTS_node {
     bool terminal;
     unsigned int size;
@@ -40,19 +62,40 @@ class MCTS_node {
     double prior_probability;           // prior probability for PUCT
     MCTS_state *state;                  // current state
     const MCTS_move *move;              // move to get here from parent node's state
-    mutable vector<MCTS_node *> children;
-    MCTS_node *parent;
-    queue<MCTS_move *> untried_actions;
-    vector<double> action_probabilities; // stored probabilities for untried actions
+    // One edge per legal move, sorted by prior (highest first). Edges [0, expanded) have a child node,
+    // the rest are untried and are expanded in order by advancing the cursor.
+    // Edges are only generated (actions_to_try()) once the node is first selected for expansion.
+    vector<MCTS_edge> edges;
+    bool edges_generated;
+    unsigned int expanded;              // expansion cursor
+    // Struct-of-arrays copy of the children's statistics (entry i belongs to edges[i]) so that
+    // selection scans contiguous memory instead of chasing child pointers.
+    vector<double> child_scores;
+    vector<double> child_visits;        // double so that the selection loop needs no int -> double conversions
+    vector<double> child_priors;
+    unsigned int index_in_parent;       // position of this node in parent's edges (and child_* arrays)
+    unsigned int depth;                 // plies from the tree's first root
+    uint64_t key;                       // state->hash() if the node is in the transposition table, else 0
+    MCTS_node *parent;                  // with transpositions: the parent the node was first reached from
+    MCTS_tree *tree;                    // tree the node belongs to, children are allocated from its arena
+    void generate_edges();              // calls actions_to_try() (and priors) the first time, no-op afterwards
+    void init_edges(queue<MCTS_move *> *actions, const vector<double> &probs);
+    MCTS_node *expand_next();           // creates (or finds) the child of edges[expanded] and advances the cursor
+    int select_best_edge(double c) const;   // index of the edge selection should follow, -1 if there is none
+    void simulate(RolloutStrategy strategy, double &w, int &n) const;   // rollout(s) from this node's state
     void backpropagate(double w, int n);
     
     // Static rollout configuration
     static RolloutStrategy rollout_strategy;
     static double heuristic_ratio;      // For MIXED strategy: ratio of heuristic vs random rollouts
+    static unsigned int rollouts_per_leaf;      // simulations per expansion (run in parallel with PARALLEL_ROLLOUTS)
+
+    friend class MCTS_tree;
     
 public:
     MCTS_node(MCTS_node *parent, MCTS_state *state, const MCTS_move *move, double prior_probability = 1.0);
-    ~MCTS_node();
+    MCTS_node(MCTS_node &&other);       // relocation (used when compacting the tree), leaves other empty
+    ~MCTS_node();                       // does not touch children, the arena destroys them
     bool is_fully_expanded() const;
     bool is_terminal() const;
     const MCTS_move *get_move() const;
@@ -60,10 +103,10 @@ public:
     double get_prior_probability() const { return prior_probability; }
     unsigned int get_number_of_simulations() const { return number_of_simulations; }
     double get_score() const { return score; }
-    const MCTS_move *get_move() const { return move; }
     MCTS_node *get_parent() const { return parent; }
-    const vector<MCTS_node *> &get_children() const { return children; }
-    bool is_fully_expanded() const;
+    vector<MCTS_node *> get_children() const;
+    unsigned int get_number_of_children() const { return expanded; }
+    unsigned int get_number_of_edges() const { return (unsigned int) edges.size(); }
     void expand();
     void rollout();
     void rollout_with_strategy(RolloutStrategy strategy);
@@ -78,81 +121,127 @@ public:
     static RolloutStrategy get_rollout_strategy();
     static void set_heuristic_ratio(double ratio);
     static double get_heuristic_ratio();
+    static void set_rollouts_per_leaf(unsigned int n);
+    static unsigned int get_rollouts_per_leaf();
+};
+
+
+struct StrategyRollout {                     // a single rollout with the given strategy (thread safe)
+    RolloutStrategy strategy;
+    double operator()(const MCTS_state *state) const;
 };
 
 
 
 class MCTS_tree {
     MCTS_node *root;
+    NodeArena<MCTS_node> arena;              // owns every node of the tree
+    TranspositionTable<MCTS_node> table;     // disabled (size 0) unless set_transposition_table_size() is called
+    unsigned long transposition_hits;
+    unsigned long nodes_created;             // nodes created since the tree was built
+    unsigned long move_generations;          // how many of them had to generate their moves
+    uint64_t seed;                           // search threads seed thread_rng() from it, random unless set_seed()
+    uint64_t searches;                       // searches started since the seed was set
+    StopReason stop_reason;                  // outcome of the last search
+    unsigned long search_iterations;
+    unsigned long search_iterations_saved;   // estimate of what the smart stop left of the budget
+    double search_seconds;
+    void compact();                          // relocate the tree rooted at root into a fresh arena
+    MCTS_node *find_transposition(const MCTS_state *state, unsigned int depth, uint64_t &key);
+    bool early_stop(BudgetController &controller, unsigned long iterations);   // smart stop, see best_move_decided
+    friend class MCTS_node;
 public:
     MCTS_tree(MCTS_state *starting_state);
     ~MCTS_tree();
-    MCTS_node *select(double c=1.41);        // select child node to expand according to tree policy (UCT)
+    MCTS_node *select(double c=1.41, MCTS_path *path = NULL);   // select child node to expand according to tree policy (UCT)
+    MCTS_node *expand(MCTS_node *leaf, MCTS_path &path);        // expands leaf (extending path), returns the node to simulate from
+    void backpropagate(const MCTS_path &path, MCTS_node *leaf, double w, int n);
     MCTS_node *select_best_child();          // select the most promising child of the root node
     void grow_tree(int max_iter, double max_time_in_seconds, double exploration_constant = 1.41);
+    void grow_tree(const SearchBudget &budget, double exploration_constant = 1.41);
     void advance_tree(const MCTS_move *move);      // if the move is applicable advance the tree, else start over
     unsigned int get_size() const;
     const MCTS_state *get_current_state() const;
     void print_stats() const;
     MCTS_node *get_root() const { return root; }
+    size_t get_arena_size() const { return arena.size(); }      // nodes allocated (including discarded ones until compaction)
+    size_t get_arena_bytes() const { return arena.bytes(); }
+    size_t get_memory_bytes() const { return arena.bytes() + table.bytes(); }   // what max_memory_bytes limits
+    unsigned long get_nodes_created() const { return nodes_created; }
+    unsigned long get_move_generations() const { return move_generations; }
+    unsigned long get_nodes_without_moves() const { return nodes_created - move_generations; }  // never called actions_to_try()
+    void set_transposition_table_size(size_t max_entries);      // 0 disables transpositions
+    size_t get_transposition_table_size() const { return table.capacity(); }
+    size_t get_transposition_entries() const { return table.size(); }
+    unsigned long get_transposition_hits() const { return transposition_hits; }
+    void set_seed(uint64_t s) { seed = s; searches = 0; }     // makes the following searches reproducible
+    uint64_t get_seed() const { return seed; }
+    uint64_t next_search_seed() { return mix_seed(seed, searches++); }  // base seed of the next search
+    StopReason get_stop_reason() const { return stop_reason; }
+    unsigned long get_search_iterations() const { return search_iterations; }
+    unsigned long get_search_iterations_saved() const { return search_iterations_saved; }
+    double get_search_seconds() const { return search_seconds; }
 };
 
 
 class MCTS_agent {                           // example of an agent based on the MCTS_tree. One can also use the tree directly.
     MCTS_tree *tree;
-    int max_iter, max_seconds;
+    int max_iter;
+    double max_seconds;
+    size_t max_nodes, max_memory_bytes;      // 0: unlimited
+    bool early_stop;                         // smart stop (see SearchBudget)
+    double early_stop_confidence;
     double exploration_constant;
+    // Pondering: a background thread grows the tree during the opponent's turn (see start_pondering)
+    thread ponder_thread;
+    atomic<bool> ponder_cancel;
+    atomic<bool> ponder_running;
+    double ponder_seconds;                   // of the last pondering session
+    unsigned long ponder_iterations;
+    double reuse_ratio;                      // share of the root's visits kept when advancing to the enemy's last move
+    void ponder();                           // body of the pondering thread
 public:
-    MCTS_agent(MCTS_state *starting_state, int max_iter = 100000, int max_seconds = 30, double exploration_constant = 1.41);
+    MCTS_agent(MCTS_state *starting_state, int max_iter = 100000, double max_seconds = 30, double exploration_constant = 1.41);
     ~MCTS_agent();
-    const MCTS_move *genmove(const MCTS_move *enemy_move);
+    const MCTS_move *genmove(const MCTS_move *enemy_move);      // stops pondering first
+    // Grow the tree from the current root in the background until genmove() or stop_pondering(), e.g. while the
+    // opponent thinks. The tree must not be used meanwhile. Only the node and memory limits apply.
+    void start_pondering();
+    void stop_pondering();
+    bool is_pondering() const { return ponder_running; }
+    double get_ponder_seconds() const { return ponder_seconds; }
+    unsigned long get_ponder_iterations() const { return ponder_iterations; }
+    double get_reuse_ratio() const { return reuse_ratio; }
     const MCTS_state *get_current_state() const;
     MCTS_tree *get_tree() const { return tree; }
     void feedback() const { tree->print_stats(); }
     void set_exploration_constant(double c);
     double get_exploration_constant() const;
+    void set_max_iter(int n) { max_iter = n; }
+    int get_max_iter() const { return max_iter; }
+    void set_max_seconds(double s) { max_seconds = s; }
+    double get_max_seconds() const { return max_seconds; }
+    void set_max_nodes(size_t n) { max_nodes = n; }
+    size_t get_max_nodes() const { return max_nodes; }
+    void set_max_memory_bytes(size_t b) { max_memory_bytes = b; }
+    size_t get_max_memory_bytes() const { return max_memory_bytes; }
+    void set_early_stop(bool enabled) { early_stop = enabled; }
+    bool get_early_stop() const { return early_stop; }
+    void set_early_stop_confidence(double confidence) { early_stop_confidence = confidence; }
+    double get_early_stop_confidence() const { return early_stop_confidence; }
+    void set_transposition_table_size(size_t max_entries) { tree->set_transposition_table_size(max_entries); }
+    size_t get_transposition_table_size() const { return tree->get_transposition_table_size(); }
+    void set_seed(uint64_t s) { tree->set_seed(s); }
+    uint64_t get_seed() const { return tree->get_seed(); }
     
     // Rollout strategy configuration
     void set_rollout_strategy(RolloutStrategy strategy);
     RolloutStrategy get_rollout_strategy() const;
     void set_heuristic_ratio(double ratio);
     double get_heuristic_ratio() const;
+    void set_rollouts_per_leaf(unsigned int n);
+    unsigned int get_rollouts_per_leaf() const;
 };
 
 
-#ifdef PARALLEL_ROLLOUTS
-class RolloutJob : public Job {             // class for performing parallel simulations using a thread pool
-    double *score;
-    const MCTS_state *state;
-    RolloutStrategy strategy;
-public:
-    RolloutJob(const MCTS_state *state, double *score, RolloutStrategy strat = RolloutStrategy::RANDOM) 
-        : Job(), state(state), score(score), strategy(strat) {}
-    void run() override {
-        // Execute rollout based on strategy
-        switch (strategy) {
-            case RolloutStrategy::HEURISTIC:
-                *score = state->heuristic_rollout();
-                break;
-            case RolloutStrategy::MIXED:
-                // Use heuristic_ratio to decide which rollout to use
-                if (static_cast<double>(rand()) / RAND_MAX < MCTS_node::get_heuristic_ratio()) {
-                    *score = state->heuristic_rollout();
-                } else {
-                    *score = state->rollout();
-                }
-                break;
-            case RolloutStrategy::HEAVY:
-                *score = state->heuristic_rollout();
-                break;
-            case RolloutStrategy::RANDOM:
-            default:
-                *score = state->rollout();
-                break;
-        }
-    }
-};
-#endif
-
-
 #endif
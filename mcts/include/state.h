@@ -7,6 +7,7 @@
 #include <string>
 #include <vector>
 #include <cstdint>
+#include "Random.h"                        // thread_rng() for rollouts
 
 
 using namespace std;
@@ -17,6 +18,7 @@ struct MCTS_move {
     virtual bool operator==(const MCTS_move& other) const = 0;             // implement this!
     virtual string sprint() const { return "Not implemented"; }   // and optionally this
     virtual uint64_t get_id() const { return 0; }
+    virtual long action_index() const { return -1; }  // index in the game's fixed action space, -1 if it has none
 
     // Virtual methods for Python integration
     virtual vector<double> to_numpy() const = 0;                          // Convert move to numpy array
@@ -67,6 +69,33 @@ public:
     virtual vector<double> get_action_probabilities() const {
         return vector<double>(); // Default empty
     }
+
+    // Encoding of the position for training data, e.g. the input planes of a network, from the point of view of
+    // the side to move (optional override). Every state of a game should give the same size.
+    virtual vector<double> encode() const {
+        return vector<double>();
+    }
+
+    // Size of the game's fixed action space, 0 if it has none. With one, every move has an action_index() below it
+    // and priors (get_action_probabilities(), evaluators) are given per action index rather than per legal move.
+    virtual size_t action_space_size() const {
+        return 0;
+    }
+
+    // Writes the encoding into a row of size floats (e.g. of a batch's input tensor), false if it does not have that
+    // size. Override it to write the row directly instead of going through encode().
+    virtual bool encode_into(float *row, size_t size) const {
+        vector<double> encoding = encode();
+        if (encoding.size() != size) return false;
+        for (size_t i = 0 ; i < size ; i++) row[i] = (float) encoding[i];
+        return true;
+    }
+
+    // Position key for the transposition table (optional override): equal positions must return equal
+    // nonzero keys. 0 means the state cannot be shared with other nodes.
+    virtual uint64_t hash() const {
+        return 0;
+    }
 };
 
 
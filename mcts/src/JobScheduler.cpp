@@ -1,131 +1,206 @@
 #include <iostream>
 #include "../include/JobScheduler.h"
 
-#define CHECK_PERROR(call, msg, actions) { if ( (call) < 0 ) { perror(msg); actions } }
-
 using namespace std;
 
 
+/* Which scheduler and worker the current thread belongs to, if any */
+static thread_local JobScheduler *current_scheduler = NULL;
+static thread_local unsigned int current_worker = 0;
+
+
 /* JobScheduler Implementation */
-JobScheduler::JobScheduler(unsigned int _number_of_threads) : jobs_running(0), number_of_threads(_number_of_threads), t_args(NULL) {
-    threads_must_exit = false;
-    CHECK_PERROR(pthread_mutex_init(&queue_lock, NULL), "pthread_mutex_t_init failed",)
-    CHECK_PERROR(pthread_cond_init(&queue_cond, NULL), "pthread_cond_init failed",)
-    CHECK_PERROR(pthread_cond_init(&jobs_finished_cond, NULL), "pthread_cond_init failed",)
-    t_args = new struct thread_args(&job_queue, &queue_lock, &queue_cond, &jobs_running, &threads_must_exit, &jobs_finished_cond, &tagged_jobs_pending);
-    threads = new pthread_t[number_of_threads];
-    for (int i = 0; i < number_of_threads; i++) {
-        CHECK_PERROR(pthread_create(&threads[i], NULL, thread_code, (void *) t_args), "pthread_create failed", threads[i] = 0;)
+JobScheduler::JobScheduler(unsigned int _number_of_threads)
+        : number_of_threads(_number_of_threads), hardware_threads(max(thread::hardware_concurrency(), 1u)),
+          spin_limit((_number_of_threads < hardware_threads) ? SPIN_BEFORE_PARK : 1),
+          threads_must_exit(false), next_queue(0), queued(0), searching_workers(0), parked_workers(0),
+          pending(0), parked_waiters(0) {
+    for (unsigned int i = 0 ; i < number_of_threads ; i++) queues.push_back(new WorkerQueue());
+    for (unsigned int i = 0 ; i < number_of_threads ; i++) {
+        try {
+            threads.push_back(thread(&JobScheduler::worker_loop, this, i));
+        } catch (const system_error &e) {
+            cerr << "Warning: could not start scheduler thread: " << e.what() << endl;
+        }
     }
 }
 
 JobScheduler::~JobScheduler() {
     waitUntilJobsHaveFinished();     // (!) important
-    delete t_args;
     threads_must_exit = true;
-    CHECK_PERROR(pthread_cond_broadcast(&queue_cond), "pthread_broadcast failed", )
-    for (int i = 0; i < number_of_threads; i++) {
-        CHECK_PERROR(pthread_join(threads[i], NULL), "pthread_join failed", )
+    {
+        lock_guard<mutex> guard(work_lock);
+        work_cond.notify_all();
     }
-    delete[] threads;
-    CHECK_PERROR(pthread_mutex_destroy(&queue_lock), "pthread_mutex_destroy failed", )
-    CHECK_PERROR(pthread_cond_destroy(&queue_cond), "pthread_cond_destroy failed", )
-    CHECK_PERROR(pthread_cond_destroy(&jobs_finished_cond), "pthread_cond_destroy failed", )
+    for (thread &t : threads) t.join();
+    for (WorkerQueue *q : queues) delete q;
+    for (auto &tag : tagged_pending) delete tag.second;
 }
 
 void JobScheduler::schedule(Job *job) {
-    CHECK_PERROR(pthread_mutex_lock(&queue_lock), "pthread_mutex_lock failed", )
-    if (job->TAG != NOTAG){
-        auto it = tagged_jobs_pending.find(job->TAG);
-        if (it == tagged_jobs_pending.end()) tagged_jobs_pending.insert(make_pair(job->TAG, 1));
-        else (it->second)++;
-    }
-    job_queue.push(job);
-    CHECK_PERROR(pthread_cond_signal(&queue_cond), "pthread_cond_signal failed", )
-    CHECK_PERROR(pthread_mutex_unlock(&queue_lock), "pthread_mutex_unlock failed", )
+    push(&job, 1);
 }
 
-bool JobScheduler::JobsHaveFinished(int tag) {
-    bool result;
-    if (tag == NOTAG){
-        CHECK_PERROR(pthread_mutex_lock(&queue_lock), "pthread_mutex_lock failed", )
-        result = job_queue.empty() && jobs_running == 0;
-        CHECK_PERROR(pthread_mutex_unlock(&queue_lock), "pthread_mutex_unlock failed", )
-    } else {
-        CHECK_PERROR(pthread_mutex_lock(&queue_lock), "pthread_mutex_lock failed", )
-        auto it = tagged_jobs_pending.find(tag);
-        if (it != tagged_jobs_pending.end()){
-            result = it->second == 0;
-        } else {
-            result = true;
+void JobScheduler::schedule_many(Job **jobs, size_t n) {
+    push(jobs, n);
+}
+
+void JobScheduler::push(Job **jobs, size_t n) {
+    if (n == 0) return;
+    if (number_of_threads == 0) {
+        cerr << "Warning: job scheduled on a scheduler without threads, it will never run" << endl;
+    }
+    // count first: a job may finish (and be deleted) as soon as it is in a deque
+    pending.fetch_add((unsigned int) n);
+    for (size_t i = 0 ; i < n ; i++) {
+        if (jobs[i]->TAG == NOTAG) {
+            jobs[i]->tag_pending = NULL;
+            continue;
         }
-        CHECK_PERROR(pthread_mutex_unlock(&queue_lock), "pthread_mutex_unlock failed", )
+        lock_guard<mutex> guard(tags_lock);
+        atomic<unsigned int> *&count = tagged_pending[jobs[i]->TAG];
+        if (count == NULL) count = new atomic<unsigned int>(0);
+        count->fetch_add(1);
+        jobs[i]->tag_pending = count;
     }
-    return result;
+    if (current_scheduler == this) {                  // spawned by one of our workers: keep it local
+        WorkerQueue *q = queues[current_worker];
+        lock_guard<mutex> guard(q->lock);
+        q->jobs.insert(q->jobs.end(), jobs, jobs + n);
+    } else if (number_of_threads > 0) {               // spread in contiguous chunks, one lock per deque
+        size_t chunks = min((size_t) number_of_threads, n);
+        unsigned int first = next_queue.fetch_add((unsigned int) chunks);
+        size_t start = 0;
+        for (size_t c = 0 ; c < chunks ; c++) {
+            size_t end = start + n / chunks + (c < n % chunks ? 1 : 0);
+            WorkerQueue *q = queues[(first + c) % number_of_threads];
+            lock_guard<mutex> guard(q->lock);
+            q->jobs.insert(q->jobs.end(), jobs + start, jobs + end);
+            start = end;
+        }
+    }
+    queued.fetch_add((unsigned int) n);
+    if (searching_workers.load() == 0) wake_workers(n);
 }
 
-void JobScheduler::waitUntilJobsHaveFinished(int tag) {
-    if (tag == NOTAG){
-        CHECK_PERROR(pthread_mutex_lock(&queue_lock), "pthread_mutex_lock failed", )
-        while (!job_queue.empty() || jobs_running > 0){
-            CHECK_PERROR(pthread_cond_wait(&jobs_finished_cond, &queue_lock) , "pthread_cond_wait failed", )
+void JobScheduler::wake_workers(size_t n) {
+    unsigned int parked = parked_workers.load();
+    // no point in more awake workers than cores: the awake ones look at queued before they park
+    if (parked == 0 || number_of_threads - parked >= hardware_threads) return;
+    lock_guard<mutex> guard(work_lock);
+    if (n == 1) work_cond.notify_one();
+    else work_cond.notify_all();
+}
+
+Job *JobScheduler::take(unsigned int worker) {
+    static thread_local vector<Job *> loot;
+    Job *job = NULL;
+    WorkerQueue *own = queues[worker];
+    {
+        lock_guard<mutex> guard(own->lock);
+        if (!own->jobs.empty()) {
+            job = own->jobs.back();                   // newest first, it is the most likely to be in cache
+            own->jobs.pop_back();
         }
-        CHECK_PERROR(pthread_mutex_unlock(&queue_lock), "pthread_mutex_unlock failed", )
-    } else {
-        CHECK_PERROR(pthread_mutex_lock(&queue_lock), "pthread_mutex_lock failed", )
-        auto it = tagged_jobs_pending.find(tag);
-        if (it != tagged_jobs_pending.end()){
-            while (it->second > 0){
-                CHECK_PERROR(pthread_cond_wait(&jobs_finished_cond, &queue_lock) , "pthread_cond_wait failed", )
-            }
+    }
+    // steal the oldest half of another deque, starting with the one the last steal came from
+    for (unsigned int i = 0 ; job == NULL && i < number_of_threads ; i++) {
+        unsigned int v = (own->last_victim + i) % number_of_threads;
+        if (v == worker) continue;
+        WorkerQueue *victim = queues[v];
+        unique_lock<mutex> guard(victim->lock, try_to_lock);
+        if (guard.owns_lock() && !victim->jobs.empty()) {
+            size_t count = (victim->jobs.size() + 1) / 2;
+            job = victim->jobs.front();
+            loot.assign(victim->jobs.begin() + 1, victim->jobs.begin() + count);
+            victim->jobs.erase(victim->jobs.begin(), victim->jobs.begin() + count);
+            own->last_victim = v;
         }
-        CHECK_PERROR(pthread_mutex_unlock(&queue_lock), "pthread_mutex_unlock failed", )
     }
+    if (!loot.empty()) {
+        lock_guard<mutex> guard(own->lock);
+        own->jobs.insert(own->jobs.begin(), loot.begin(), loot.end());
+        loot.clear();
+    }
+    if (job != NULL) queued.fetch_sub(1);
+    return job;
+}
+
+void JobScheduler::finished(atomic<unsigned int> *tag_pending) {
+    bool signal = pending.fetch_sub(1) == 1;
+    if (tag_pending != NULL && tag_pending->fetch_sub(1) == 1) signal = true;
+    if (signal && parked_waiters.load() > 0) {
+        lock_guard<mutex> guard(finished_lock);
+        finished_cond.notify_all();
+    }
+}
+
+const atomic<unsigned int> *JobScheduler::pending_count(int tag) {
+    if (tag == NOTAG) return &pending;
+    lock_guard<mutex> guard(tags_lock);
+    auto it = tagged_pending.find(tag);
+    return (it != tagged_pending.end()) ? it->second : NULL;
+}
+
+bool JobScheduler::JobsHaveFinished(int tag) {
+    const atomic<unsigned int> *count = pending_count(tag);
+    return count == NULL || count->load() == 0;
+}
+
+void JobScheduler::waitUntilJobsHaveFinished(int tag) {
+    const atomic<unsigned int> *count = pending_count(tag);      // looked up once, the counter is never freed
+    if (count == NULL) return;
+    for (int spins = 0 ; spins < spin_limit ; spins++) {
+        if (count->load() == 0) return;
+        this_thread::yield();
+    }
+    unique_lock<mutex> guard(finished_lock);
+    parked_waiters++;
+    while (count->load() != 0) {
+        finished_cond.wait(guard);
+    }
+    parked_waiters--;
 }
 
 
 /* Thread logic */
-void *thread_code(void *args) {
-    struct thread_args *argptr = ((struct thread_args *) args);
-    queue<Job *> *job_queue = argptr->jobQueue;
-    pthread_mutex_t *queue_lock = argptr->queueLock;
-    pthread_cond_t *queue_cond = argptr->queueCond;
-    volatile unsigned int *jobs_running_ptr = argptr->jobsRunning;
-    volatile bool *threads_must_exit_ptr = argptr->threads_must_exit;
-    pthread_cond_t *jobs_finished_cond_ptr = argptr->jobs_finished_cond;
-    unordered_map<int, volatile unsigned int> *tagged_jobs_pending_ptr = argptr->tagged_jobs_pending;
-
-    while (!(*threads_must_exit_ptr)) {
-        Job *job;
-        int tag;
-
-        CHECK_PERROR(pthread_mutex_lock(queue_lock), "pthread_mutex_lock failed", continue; )
-        while (job_queue->empty() && !(*threads_must_exit_ptr)){
-            CHECK_PERROR(pthread_cond_wait(queue_cond, queue_lock) , "pthread_cond_wait failed", )
-        }
-        if (*threads_must_exit_ptr){
-            CHECK_PERROR(pthread_mutex_unlock(queue_lock), "pthread_mutex_unlock failed", )
-            break;
+void JobScheduler::worker_loop(unsigned int worker) {
+    current_scheduler = this;
+    current_worker = worker;
+    int spins = 0;
+    searching_workers++;
+    while (!threads_must_exit) {
+        Job *job = (queued.load() > 0) ? take(worker) : NULL;
+        if (job == NULL) {
+            if (++spins < spin_limit) {
+                this_thread::yield();
+                continue;
+            }
+            searching_workers--;                      // from here on push() has to wake us
+            {
+                unique_lock<mutex> guard(work_lock);
+                parked_workers++;
+                while (queued.load() == 0 && !threads_must_exit) {
+                    work_cond.wait(guard);
+                }
+                parked_workers--;
+            }
+            searching_workers++;
+            spins = 0;
+            continue;
         }
-        job = job_queue->front();       // get pointer to next job
-        job_queue->pop();               // remove it from queue
-        (*jobs_running_ptr)++;
-        CHECK_PERROR(pthread_mutex_unlock(queue_lock), "pthread_mutex_unlock failed", )
-
-        tag = job->TAG;
-        job->run();        
-        delete job;                     // (!) scheduler deletes scheduled objects when done but they must be allocated before they get scheduled
-
-        CHECK_PERROR(pthread_mutex_lock(queue_lock), "pthread_mutex_lock failed", )
-        int num = 0;
-        if (job->TAG != NOTAG){
-            num = --(*tagged_jobs_pending_ptr)[job->TAG];
+        spins = 0;
+        if (searching_workers.fetch_sub(1) == 1 && queued.load() > 0) {
+            wake_workers(1);                          // we were the last one searching, hand over
         }
-        (*jobs_running_ptr)--;
-        if ( num == 0 || (*jobs_running_ptr) == 0 ){
-            CHECK_PERROR(pthread_cond_broadcast(jobs_finished_cond_ptr), "pthread_cond_signal failed", )
+        atomic<unsigned int> *tag_pending = job->tag_pending;     // read before run(): the job may be gone after it
+        bool owned = job->OWNED;        // a job that is not owned may be reused or destroyed as soon as run() returns
+        job->run();
+        if (owned) {
+            delete job;                 // (!) scheduler deletes scheduled objects when done but they must be allocated before they get scheduled
         }
-        CHECK_PERROR(pthread_mutex_unlock(queue_lock), "pthread_mutex_unlock failed", )
+        finished(tag_pending);
+        searching_workers++;
     }
-    pthread_exit((void *) 0);
+    searching_workers--;
 }
@@ -3,7 +3,9 @@
 #include <cmath>
 #include <ctime>
 #include <algorithm>
+#include <functional>
 #include <random>
+#include <unordered_map>
 #include "../include/mcts.h"
 
 // #define DEBUG
@@ -14,88 +16,141 @@ using namespace std;
 /*** STATIC MEMBER DEFINITIONS ***/
 RolloutStrategy MCTS_node::rollout_strategy = RolloutStrategy::RANDOM;
 double MCTS_node::heuristic_ratio = 0.5;
+unsigned int MCTS_node::rollouts_per_leaf = DEFAULT_ROLLOUTS_PER_LEAF;
 
 /*** MCTS NODE ***/
 MCTS_node::MCTS_node(MCTS_node *parent, MCTS_state *state, const MCTS_move *move, double prior_probability)
         : terminal(false), size(0), number_of_simulations(0), score(0.0), 
-          prior_probability(prior_probability), state(state), move(move), 
-          parent(parent) {
+          prior_probability(prior_probability), state(state), move(move), edges_generated(false), expanded(0),
+          index_in_parent(0), depth(parent != NULL ? parent->depth + 1 : 0), key(0), parent(parent),
+          tree(parent != NULL ? parent->tree : NULL) {
     terminal = this->state->is_terminal();
-    children.reserve(STARTING_NUMBER_OF_CHILDREN);
-    auto* tmp = state->actions_to_try();
-    untried_actions.swap(*tmp);
-    delete tmp;
-    
-    if (!untried_actions.empty()) {
-        vector<double> probs = this->state->get_action_probabilities();
-        if (!probs.empty()) {
-            // Sort untried actions by probability
-            vector<pair<double, MCTS_move*>> paired;
-            size_t i = 0;
-            while (!untried_actions.empty()) {
-                double p = (i < probs.size()) ? probs[i] : 1.0;
-                paired.push_back({p, untried_actions.front()});
-                untried_actions.pop();
-                i++;
-            }
-            
-            sort(paired.begin(), paired.end(), [](const pair<double, MCTS_move*>& a, const pair<double, MCTS_move*>& b) {
-                return a.first > b.first;
-            });
-            
-            for (auto& item : paired) {
-                untried_actions.push(item.second);
-                action_probabilities.push_back(item.first);
-            }
-        } else {
-            // Fill probabilities with 1.0 for each action
-            while (!untried_actions.empty()) {
-                MCTS_move *m = untried_actions.front();
-                untried_actions.pop();
-                action_probabilities.push_back(1.0);
-            }
+}
+
+void MCTS_node::generate_edges() {
+    /** Move generation is deferred until the node is selected for expansion: most leaves never are. */
+    if (edges_generated) return;
+    edges_generated = true;
+    tree->move_generations++;
+    queue<MCTS_move *> *actions = state->actions_to_try();
+    vector<double> probs;
+    if (!actions->empty()) {
+        probs = this->state->get_action_probabilities();
+    }
+    init_edges(actions, probs);
+    delete actions;
+}
+
+void MCTS_node::init_edges(queue<MCTS_move *> *actions, const vector<double> &probs) {
+    /** Turns the moves (given in actions_to_try() order, probs aligned with them) into edges sorted by prior.
+     * Takes ownership of the moves. */
+    size_t n = actions->size();
+    edges.reserve(n);
+    child_priors.reserve(n);
+    for (size_t i = 0 ; !actions->empty() ; i++) {
+        MCTS_edge edge = {actions->front(), NULL, false};
+        actions->pop();
+        edges.push_back(edge);
+        child_priors.push_back((i < probs.size()) ? probs[i] : 1.0);
+    }
+    if (!is_sorted(child_priors.begin(), child_priors.end(), greater<double>())) {
+        // sort edges and priors together through a permutation (stable: equal priors keep the game's order)
+        vector<unsigned int> order(n);
+        for (unsigned int i = 0 ; i < n ; i++) order[i] = i;
+        stable_sort(order.begin(), order.end(), [this](unsigned int a, unsigned int b) {
+            return child_priors[a] > child_priors[b];
+        });
+        vector<MCTS_edge> sorted_edges(n);
+        vector<double> sorted_priors(n);
+        for (size_t i = 0 ; i < n ; i++) {
+            sorted_edges[i] = edges[order[i]];
+            sorted_priors[i] = child_priors[order[i]];
         }
+        edges.swap(sorted_edges);
+        child_priors.swap(sorted_priors);
     }
+    child_scores.assign(n, 0.0);
+    child_visits.assign(n, 0.0);
 }
+
+MCTS_node::MCTS_node(MCTS_node &&other)
+        : terminal(other.terminal), size(other.size), number_of_simulations(other.number_of_simulations),
+          score(other.score), prior_probability(other.prior_probability), state(other.state), move(other.move),
+          edges(std::move(other.edges)), edges_generated(other.edges_generated), expanded(other.expanded),
+          child_scores(std::move(other.child_scores)), child_visits(std::move(other.child_visits)),
+          child_priors(std::move(other.child_priors)), index_in_parent(other.index_in_parent), depth(other.depth),
+          key(other.key), parent(other.parent), tree(other.tree) {
+    // other is left without anything to free so that destroying it (with its arena) is harmless
+    other.state = NULL;
+    other.move = NULL;
+    other.edges.clear();
+    other.expanded = 0;
 }
 
 MCTS_node::~MCTS_node() {
     delete state;
     delete move;
-    for (auto *child : children) {
-        delete child;
-    }
-    while (!untried_actions.empty()) {
-        delete untried_actions.front();
-        untried_actions.pop();
+    for (size_t i = 0 ; i < edges.size() ; i++) {
+        if (edges[i].child == NULL || edges[i].transposition) {      // otherwise the move belongs to the child
+            delete edges[i].move;
+        }
     }
 }
+
 void MCTS_node::expand() {
     if (is_terminal()) {              // can legitimately happen in end-game situations
         rollout();                    // keep rolling out, eventually causing UCT to pick another node to expand due to exploration
         return;
-    } else if (is_fully_expanded()) {
+    }
+    generate_edges();
+    if (is_fully_expanded()) {
         cerr << "Warning: Cannot expanded this node any more!" << endl;
         return;
     }
-    // get next untried action
-    MCTS_move *next_move = untried_actions.front();
-    untried_actions.pop();
-    
-    // get corresponding probability
-    double prob = 1.0;
-    if (!action_probabilities.empty()) {
-        prob = action_probabilities[0];
-        action_probabilities.erase(action_probabilities.begin());
-    }
-    
-    MCTS_state *next_state = state->next_state(next_move);
-    // build a new MCTS node from it
-    MCTS_node *new_node = new MCTS_node(this, next_state, next_move, prob);
-    // rollout, updating its stats
-    new_node->rollout();
-    // add new node to tree
-    children.push_back(new_node);
+    // build a new MCTS node from the next untried action
+    const unsigned int e = expanded;
+    MCTS_node *new_node = expand_next();
+    // rollout, updating its stats. The result is backed up through this node rather than the new node's parent:
+    // a node shared through the transposition table points to the parent it was first reached from.
+    double w;
+    int n;
+    new_node->simulate(rollout_strategy, w, n);
+    new_node->score += w;
+    new_node->number_of_simulations += n;
+    child_scores[e] += w;
+    child_visits[e] += n;
+    size++;
+    backpropagate(w, n);
+}
+
+MCTS_node *MCTS_node::expand_next() {
+    MCTS_edge &edge = edges[expanded];
+    MCTS_state *next_state = state->next_state(edge.move);
+    uint64_t next_key;
+    MCTS_node *new_node = tree->find_transposition(next_state, depth + 1, next_key);
+    if (new_node != NULL) {           // same position reached through another move order: share its node
+        delete next_state;
+        edge.transposition = true;
+    } else {
+        new_node = tree->arena.create(this, next_state, edge.move, child_priors[expanded]);
+        tree->nodes_created++;
+        new_node->index_in_parent = expanded;
+        if (next_key != 0) {
+            new_node->key = next_key;
+            tree->table.insert(next_key, new_node->depth, new_node);
+        }
+    }
+    edge.child = new_node;
+    expanded++;
+    return new_node;
+}
+
+vector<MCTS_node *> MCTS_node::get_children() const {
+    vector<MCTS_node *> children(expanded);
+    for (unsigned int i = 0 ; i < expanded ; i++) {
+        children[i] = edges[i].child;
+    }
+    return children;
 }
 
 void MCTS_node::rollout() {
@@ -103,62 +158,62 @@ void MCTS_node::rollout() {
 }
 
 void MCTS_node::rollout_with_strategy(RolloutStrategy strategy) {
+    double w;
+    int n;
+    simulate(strategy, w, n);
+    backpropagate(w, n);
+}
+
+void MCTS_node::simulate(RolloutStrategy strategy, double &w, int &n) const {
+    StrategyRollout rollout = {strategy};
 #ifdef PARALLEL_ROLLOUTS
-    // schedule Jobs with the specified strategy
-    static JobScheduler scheduler;               // static so that we don't create new threads every time (!)
-    double results[NUMBER_OF_THREADS]{-1};
-    for (int i = 0 ; i < NUMBER_OF_THREADS ; i++) {
-        scheduler.schedule(new RolloutJob(state, &results[i], strategy));
-    }
-    // wait for all simulations to finish
-    scheduler.waitUntilJobsHaveFinished();
-    // aggregate results
-    double score_sum = 0.0;
-    for (int i = 0 ; i < NUMBER_OF_THREADS ; i++) {
-        if (results[i] >= 0.0 && results[i] <= 1.0){
-            score_sum += results[i];
-        } else {    // should not happen
-            cerr << "Warning: Invalid result when aggregating parallel rollouts" << endl;
-        }
+    // one batch per search thread, reused for every leaf: the pool's workers and this thread share the rollouts
+    static thread_local RolloutBatch<StrategyRollout> batch;
+    n = (int) batch.run_batch(state, rollout, rollouts_per_leaf, w);
+    if (n == 0) {     // should not happen
+        w = rollout(state);
+        n = 1;
     }
-    backpropagate(score_sum, NUMBER_OF_THREADS);
 #else
-    double w;
+    w = 0.0;
+    for (unsigned int i = 0 ; i < rollouts_per_leaf ; i++) {
+        w += rollout(state);
+    }
+    n = (int) rollouts_per_leaf;
+#endif
+}
+
+double StrategyRollout::operator()(const MCTS_state *state) const {
     switch (strategy) {
         case RolloutStrategy::HEURISTIC:
-            w = state->heuristic_rollout();
-            break;
+            return state->heuristic_rollout();
         case RolloutStrategy::MIXED:
             // Use heuristic_ratio to decide which rollout to use
-            if (static_cast<double>(rand()) / RAND_MAX < heuristic_ratio) {
-                w = state->heuristic_rollout();
-            } else {
-                w = state->rollout();
+            if (thread_rng().uniform() < MCTS_node::get_heuristic_ratio()) {
+                return state->heuristic_rollout();
             }
-            break;
+            return state->rollout();
         case RolloutStrategy::HEAVY:
-            w = state->heuristic_rollout();
-            break;
+            return state->heuristic_rollout();
         case RolloutStrategy::RANDOM:
         default:
-            w = state->rollout();
-            break;
+            return state->rollout();
     }
-    backpropagate(w, 1);
-#endif
 }
 
 void MCTS_node::backpropagate(double w, int n) {
     score += w;
     number_of_simulations += n;
     if (parent != NULL) {
+        parent->child_scores[index_in_parent] += w;
+        parent->child_visits[index_in_parent] += n;
         parent->size++;
         parent->backpropagate(w, n);
     }
 }
 
 bool MCTS_node::is_fully_expanded() const {
-    return is_terminal() || untried_actions.empty();
+    return is_terminal() || (edges_generated && expanded == edges.size());
 }
 
 bool MCTS_node::is_terminal() const {
@@ -169,53 +224,78 @@ unsigned int MCTS_node::get_size() const {
     return size;
 }
 
-MCTS_node *MCTS_node::select_best_child(double c) const {
-    /** selects best child based on the winrate of whose turn it is to play */
-    if (children.empty()) return NULL;
-    else if (children.size() == 1) return children[0];
-    else {
-        double score, max = -1e20;
-        MCTS_node *argmax = NULL;
-        for (auto *child : children) {
-            double winrate = child->score / ((double) child->number_of_simulations);
-            // If it's not the self side's turn, apply UCT based on opponent winrate (our loss rate)
-            if (!state->is_self_side_turn()){
-                winrate = 1.0 - winrate;
-            }
-            if (c > 0) {
-                // PUCT formula: Q + C * P * sqrt(ParentN) / (1 + ChildN)
-                double exploration = c * child->prior_probability * sqrt((double)this->number_of_simulations) / (1.0 + (double)child->number_of_simulations);
-                score = winrate + exploration;
-            } else {
-                score = winrate;
-            }
-            if (score > max) {
-                max = score;
-                argmax = child;
+/** Scores m children: offset + sign * Q + c_sqrt_n * P / (1 + N), where unvisited children count as even (Q = 0.5).
+ * Deliberately branch-free (the ternary only selects between constants) so that the compiler can vectorize it. */
+static inline void score_children(const double *s, const double *v, const double *p, size_t m,
+                                  double offset, double sign, double c_sqrt_n, double *values) {
+    for (size_t i = 0 ; i < m ; i++) {
+        double unvisited = (v[i] > 0.0) ? 0.0 : 1.0;
+        double winrate = (s[i] + 0.5 * unvisited) / (v[i] + unvisited);
+        values[i] = offset + sign * winrate + c_sqrt_n * p[i] / (1.0 + v[i]);
+    }
+}
+
+/** PUCT/UCT argmax over the struct-of-arrays child statistics. Children are scored a block at a time into a
+ * stack buffer and the argmax is taken afterwards. Full blocks use a compile-time trip count, which is what
+ * lets the compiler vectorize the scoring loop even at -O2. */
+static size_t select_argmax(const double *scores, const double *visits, const double *priors, size_t n,
+                            double c, double parent_visits, bool self_side_turn) {
+    double values[SELECTION_BLOCK_SIZE];
+    // If it's not the self side's turn, use the opponent winrate (our loss rate): q' = 1 - q
+    const double offset = self_side_turn ? 0.0 : 1.0;
+    const double sign = self_side_turn ? 1.0 : -1.0;
+    // PUCT formula: Q + C * P * sqrt(ParentN) / (1 + ChildN)
+    const double c_sqrt_n = (c > 0) ? c * sqrt(parent_visits) : 0.0;
+    double max = -1e20;
+    size_t argmax = 0;
+    for (size_t start = 0 ; start < n ; start += SELECTION_BLOCK_SIZE) {
+        const size_t m = min(n - start, (size_t) SELECTION_BLOCK_SIZE);
+        if (m == SELECTION_BLOCK_SIZE) {
+            score_children(scores + start, visits + start, priors + start, SELECTION_BLOCK_SIZE, offset, sign, c_sqrt_n, values);
+        } else {
+            score_children(scores + start, visits + start, priors + start, m, offset, sign, c_sqrt_n, values);
+        }
+        for (size_t i = 0 ; i < m ; i++) {
+            if (values[i] > max) {
+                max = values[i];
+                argmax = start + i;
             }
         }
-        return argmax;
     }
+    return argmax;
+}
+
+int MCTS_node::select_best_edge(double c) const {
+    /** selects best child based on the winrate of whose turn it is to play */
+    if (expanded == 0) return -1;
+    else if (expanded == 1) return 0;
+    return (int) select_argmax(child_scores.data(), child_visits.data(), child_priors.data(), expanded,
+                               c, (double) number_of_simulations, state->is_self_side_turn());
+}
+
+MCTS_node *MCTS_node::select_best_child(double c) const {
+    int best = select_best_edge(c);
+    return (best < 0) ? NULL : edges[best].child;
 }
 
 MCTS_node *MCTS_node::advance_tree(const MCTS_move *m) {
-    // Find child with this m and delete all others
+    // Find child with this m. The others are not deleted here: they stay in the arena until the tree compacts it.
     MCTS_node *next = NULL;
-    for (auto *child: children) {
-        if (*(child->move) == *(m)) {
-            next = child;
-        } else {
-            delete child;
+    for (unsigned int i = 0 ; i < expanded ; i++) {
+        if (*(edges[i].move) == *(m)) {
+            next = edges[i].child;
+            break;
         }
     }
-    // remove children from queue so that they won't be re-deleted by the destructor when this node dies (!)
-    children.clear();
     // if not found then we have to create a new node
     if (next == NULL) {
         // Note: UCT may lead to not fully explored tree even for short-term children due to terminal nodes being chosen
         cout << "INFO: Didn't find child node. Had to start over." << endl;
         MCTS_state *next_state = state->next_state(m);
-        next = new MCTS_node(NULL, next_state, NULL, 1.0);
+        next = tree->arena.create((MCTS_node *) NULL, next_state, (const MCTS_move *) NULL, 1.0);
+        next->tree = tree;
+        next->depth = depth + 1;
+        tree->nodes_created++;
     } else {
         next->parent = NULL;     // make parent NULL
         // IMPORTANT: m and next->move can be the same here if we pass the move from select_best_child()
@@ -227,54 +307,192 @@ MCTS_node *MCTS_node::advance_tree(const MCTS_move *m) {
 
 
 /*** MCTS TREE ***/
-MCTS_node *MCTS_tree::select(double c) {
+MCTS_node *MCTS_tree::select(double c, MCTS_path *path) {
     MCTS_node *node = root;
     while (!node->is_terminal()) {
         if (!node->is_fully_expanded()) {
             return node;
         } else {
-            node = node->select_best_child(c);
+            int best = node->select_best_edge(c);
+            if (best < 0) {
+                return NULL;
+            }
+            if (path != NULL) {
+                path->push_back(MCTS_step{node, (unsigned int) best});
+            }
+            node = node->edges[best].child;
         }
     }
     return node;
 }
 
-MCTS_tree::MCTS_tree(MCTS_state *starting_state) {
+MCTS_node *MCTS_tree::expand(MCTS_node *leaf, MCTS_path &path) {
+    if (leaf->is_terminal()) {        // can legitimately happen in end-game situations: simulate from it again
+        return leaf;
+    }
+    leaf->generate_edges();
+    if (leaf->is_fully_expanded()) {
+        cerr << "Warning: Cannot expanded this node any more!" << endl;
+        return NULL;
+    }
+    path.push_back(MCTS_step{leaf, leaf->expanded});
+    return leaf->expand_next();
+}
+
+void MCTS_tree::backpropagate(const MCTS_path &path, MCTS_node *leaf, double w, int n) {
+    /** Like MCTS_node::backpropagate() but along the path that selection took rather than the parent pointers,
+     * which is what tells apart the parents of a node shared through the transposition table. */
+    leaf->score += w;
+    leaf->number_of_simulations += n;
+    for (size_t i = path.size() ; i-- > 0 ;) {
+        MCTS_node *node = path[i].node;
+        node->child_scores[path[i].edge] += w;
+        node->child_visits[path[i].edge] += n;
+        node->score += w;
+        node->number_of_simulations += n;
+        node->size++;
+    }
+}
+
+MCTS_node *MCTS_tree::find_transposition(const MCTS_state *state, unsigned int depth, uint64_t &key) {
+    key = 0;
+    if (!table.enabled()) return NULL;
+    key = state->hash();
+    MCTS_node *node = table.find(key, depth);
+    if (node != NULL) transposition_hits++;
+    return node;
+}
+
+void MCTS_tree::set_transposition_table_size(size_t max_entries) {
+    table.resize(max_entries);
+    if (table.enabled()) {            // register the nodes already in the tree
+        compact();
+    }
+}
+
+MCTS_tree::MCTS_tree(MCTS_state *starting_state)
+    : transposition_hits(0), nodes_created(1), move_generations(0), seed(random_seed()), searches(0),
+      stop_reason(StopReason::NONE), search_iterations(0), search_iterations_saved(0), search_seconds(0.0) {
     assert(starting_state != NULL);
-    root = new MCTS_node(NULL, starting_state, NULL);
+    root = arena.create((MCTS_node *) NULL, starting_state, (const MCTS_move *) NULL);
+    root->tree = this;
 }
 
 MCTS_tree::~MCTS_tree() {
-    delete root;
+    arena.clear();         // frees every node in bulk
+}
+
+void MCTS_tree::compact() {
+    /** Moves the subtree under root into a fresh arena in breadth-first order (so siblings end up next to each other)
+     * and then releases the old arena at once, which destroys every node that was not reachable from root. */
+    NodeArena<MCTS_node> fresh;
+    unordered_map<MCTS_node *, MCTS_node *> relocated;       // old -> new address of nodes shared by several parents
+    const bool shared = transposition_hits > 0;                // otherwise every node has a single parent
+    table.clear();                     // its pointers are about to go stale, surviving nodes are registered again
+    MCTS_node *new_root = fresh.create(std::move(*root));
+    new_root->parent = NULL;
+    if (shared) {
+        relocated[root] = new_root;
+    }
+    queue<MCTS_node *> Q;
+    Q.push(new_root);
+    while (!Q.empty()) {
+        MCTS_node *node = Q.front();
+        Q.pop();
+        if (table.enabled()) {
+            if (node->key == 0) {
+                node->key = node->state->hash();
+            }
+            table.insert(node->key, node->depth, node);
+        }
+        for (unsigned int i = 0 ; i < node->expanded ; i++) {
+            if (shared) {
+                auto it = relocated.find(node->edges[i].child);
+                if (it != relocated.end()) {
+                    node->edges[i].child = it->second;
+                    continue;
+                }
+            }
+            MCTS_node *child = fresh.create(std::move(*node->edges[i].child));
+            if (shared) {
+                relocated[node->edges[i].child] = child;
+                if (node->edges[i].transposition) {
+                    // Not reached through the edge that created it: this parent becomes its first parent, so the
+                    // node takes over this edge's move and the creating edge (if it survives) keeps the old one.
+                    MCTS_node *creator = child->parent;
+                    auto it = relocated.find(creator);
+                    if (it != relocated.end()) {
+                        creator = it->second;
+                    }
+                    creator->edges[child->index_in_parent].transposition = true;
+                    child->move = node->edges[i].move;
+                    node->edges[i].transposition = false;
+                }
+            }
+            child->parent = node;      // the first parent reached breadth-first
+            child->index_in_parent = i;
+            node->edges[i].child = child;
+            Q.push(child);
+        }
+    }
+    arena.swap(fresh);
+    root = new_root;
+    fresh.clear();         // old nodes: discarded subtrees are destroyed here, relocated ones are empty shells
+}
+
+bool MCTS_tree::early_stop(BudgetController &controller, unsigned long iterations) {
+    if (!controller.early_stop_due(iterations) || root->is_terminal() || !root->is_fully_expanded()) return false;
+    long remaining = controller.remaining_iterations(iterations);
+    if (root->edges.size() == 1) {
+        controller.stop(StopReason::FORCED);
+    } else if (best_move_decided(root->child_scores.data(), root->child_visits.data(), root->expanded,
+                                 root->state->is_self_side_turn(), remaining, controller.get_early_stop_confidence())) {
+        controller.stop(StopReason::DECIDED);
+    } else {
+        return false;
+    }
+    search_iterations_saved = (unsigned long) max(remaining, 0L);
+    return true;
 }
 
 void MCTS_tree::grow_tree(int max_iter, double max_time_in_seconds, double exploration_constant) {
+    grow_tree(SearchBudget(max_iter, max_time_in_seconds), exploration_constant);
+}
+
+void MCTS_tree::grow_tree(const SearchBudget &budget, double exploration_constant) {
     MCTS_node *node;
-    double dt;
     #ifdef DEBUG
     cout << "Growing tree..." << endl;
     #endif
-    time_t start_t, now_t;
-    time(&start_t);
-    for (int i = 0 ; i < max_iter ; i++){
+    BudgetController controller(budget);
+    MCTS_path path;
+    double w;
+    int n;
+    unsigned long i = 0;
+    thread_rng().seed(next_search_seed());
+    search_iterations_saved = 0;
+    while (!controller.should_stop(i, arena.size(), get_memory_bytes()) && !early_stop(controller, i)) {
         // select node to expand according to tree policy
-        node = select(exploration_constant);
-        // expand it (this will perform a rollout and backpropagate the results)
-        node->expand();
-        // check if we need to stop
-        time(&now_t);
-        dt = difftime(now_t, start_t);
-        if (dt > max_time_in_seconds) {
-            #ifdef DEBUG
-            cout << "Early stopping: Made " << (i + 1) << " iterations in " << dt << " seconds." << endl;
-            #endif
+        path.clear();
+        node = select(exploration_constant, &path);
+        // expand it, then perform a rollout and backpropagate the results along the path
+        if (node != NULL) {
+            node = expand(node, path);
+        }
+        if (node == NULL) {
+            controller.stop(StopReason::EXHAUSTED);
             break;
         }
+        node->simulate(MCTS_node::rollout_strategy, w, n);
+        backpropagate(path, node, w, n);
+        i++;
     }
+    stop_reason = controller.get_reason();
+    search_iterations = i;
+    search_seconds = controller.elapsed_seconds();
     #ifdef DEBUG
-    time(&now_t);
-    dt = difftime(now_t, start_t);
-    cout << "Finished in " << dt << " seconds." << endl;
+    cout << "Stopped by " << stop_reason_name(stop_reason) << ": made " << i << " iterations in "
+         << search_seconds << " seconds." << endl;
     #endif
 }
 
@@ -297,23 +515,37 @@ void MCTS_node::print_stats() const {
     cout << "___ INFO _______________________" << endl
          << "Tree size: " << size << endl
          << "Number of simulations: " << number_of_simulations << endl
-         << "Branching factor at root: " << children.size() << endl
+         << "Branching factor at root: " << expanded << endl
+         << "Nodes that never generated moves: " << tree->get_nodes_without_moves() << " / " << tree->get_nodes_created() << endl
          << "Chances of self side winning: " << setprecision(4) << 100.0 * (score / number_of_simulations) << "%" << endl;
+    if (tree->get_transposition_table_size() > 0) {
+        cout << "Transposition hits: " << tree->get_transposition_hits() << " (" << tree->get_transposition_entries()
+             << " / " << tree->get_transposition_table_size() << " entries)" << endl;
+    }
+    if (tree->get_stop_reason() != StopReason::NONE) {
+        cout << "Last search: " << tree->get_search_iterations() << " iterations in " << setprecision(4)
+             << 1000.0 * tree->get_search_seconds() << " ms, stopped by " << stop_reason_name(tree->get_stop_reason());
+        if (tree->get_search_iterations_saved() > 0) {
+            cout << " (about " << tree->get_search_iterations_saved() << " iterations saved)";
+        }
+        cout << endl;
+    }
     // sort children based on winrate of current player's turn for this node
+    vector<MCTS_node *> sorted_children = get_children();
     if (state->is_self_side_turn()) {
-        std::sort(children.begin(), children.end(), [](const MCTS_node *n1, const MCTS_node *n2){
+        std::sort(sorted_children.begin(), sorted_children.end(), [](const MCTS_node *n1, const MCTS_node *n2){
             return n1->calculate_winrate(true) > n2->calculate_winrate(true);
         });
     } else {
-        std::sort(children.begin(), children.end(), [](const MCTS_node *n1, const MCTS_node *n2){
+        std::sort(sorted_children.begin(), sorted_children.end(), [](const MCTS_node *n1, const MCTS_node *n2){
             return n1->calculate_winrate(false) > n2->calculate_winrate(false);
         });
     }
     // print TOPK of them along with their winrates
     cout << "Best moves:" << endl;
-    for (int i = 0 ; i < children.size() && i < TOPK ; i++) {
-        cout << "  " << i + 1 << ". " << children[i]->move->sprint() << "  -->  "
-             << setprecision(4) << 100.0 * children[i]->calculate_winrate(state->is_self_side_turn()) << "%" << endl;
+    for (int i = 0 ; i < sorted_children.size() && i < TOPK ; i++) {
+        cout << "  " << i + 1 << ". " << sorted_children[i]->move->sprint() << "  -->  "
+             << setprecision(4) << 100.0 * sorted_children[i]->calculate_winrate(state->is_self_side_turn()) << "%" << endl;
     }
     cout << "________________________________" << endl;
 }
@@ -347,10 +579,17 @@ double MCTS_node::get_heuristic_ratio() {
     return heuristic_ratio;
 }
 
+void MCTS_node::set_rollouts_per_leaf(unsigned int n) {
+    rollouts_per_leaf = (n > 0) ? n : 1;
+}
+
+unsigned int MCTS_node::get_rollouts_per_leaf() {
+    return rollouts_per_leaf;
+}
+
 void MCTS_tree::advance_tree(const MCTS_move *move) {
-    MCTS_node *old_root = root;
     root = root->advance_tree(move);
-    delete old_root;       // this won't delete the new root since we have emptied old_root's children
+    compact();             // reclaims the old root and all discarded siblings at once
 }
 
 const MCTS_state *MCTS_tree::get_current_state() const { return root->get_current_state(); }
@@ -363,14 +602,19 @@ void MCTS_tree::print_stats() const { root->print_stats(); }
 
 
 /*** MCTS agent ***/
-MCTS_agent::MCTS_agent(MCTS_state *starting_state, int max_iter, int max_seconds, double exploration_constant)
-: max_iter(max_iter), max_seconds(max_seconds), exploration_constant(exploration_constant) {
+MCTS_agent::MCTS_agent(MCTS_state *starting_state, int max_iter, double max_seconds, double exploration_constant)
+: max_iter(max_iter), max_seconds(max_seconds), max_nodes(0), max_memory_bytes(0), early_stop(false),
+  early_stop_confidence(0.0), exploration_constant(exploration_constant), ponder_cancel(false),
+  ponder_running(false), ponder_seconds(0.0), ponder_iterations(0), reuse_ratio(0.0) {
     tree = new MCTS_tree(starting_state);
 }
 
 const MCTS_move *MCTS_agent::genmove(const MCTS_move *enemy_move) {
+    stop_pondering();
     if (enemy_move != NULL) {
+        double visits = tree->get_root()->get_number_of_simulations();
         tree->advance_tree(enemy_move);
+        reuse_ratio = (visits > 0) ? tree->get_root()->get_number_of_simulations() / visits : 0.0;
     }
     // If game ended from opponent move, we can't do anything
     if (tree->get_current_state()->is_terminal()) {
@@ -380,7 +624,8 @@ const MCTS_move *MCTS_agent::genmove(const MCTS_move *enemy_move) {
     cout << "___ DEBUG ______________________" << endl
          << "Growing tree..." << endl;
     #endif
-    tree->grow_tree(max_iter, max_seconds, exploration_constant);
+    tree->grow_tree(SearchBudget(max_iter, max_seconds, max_nodes, max_memory_bytes, early_stop, early_stop_confidence),
+                    exploration_constant);
     #ifdef DEBUG
     cout << "Tree size: " << tree->get_size() << endl
          << "________________________________" << endl;
@@ -396,9 +641,32 @@ const MCTS_move *MCTS_agent::genmove(const MCTS_move *enemy_move) {
 }
 
 MCTS_agent::~MCTS_agent() {
+    stop_pondering();
     delete tree;
 }
 
+void MCTS_agent::start_pondering() {
+    if (ponder_thread.joinable() || tree->get_current_state()->is_terminal()) return;
+    ponder_cancel = false;
+    ponder_running = true;
+    ponder_thread = thread(&MCTS_agent::ponder, this);
+}
+
+void MCTS_agent::stop_pondering() {
+    if (!ponder_thread.joinable()) return;
+    ponder_cancel = true;
+    ponder_thread.join();
+}
+
+void MCTS_agent::ponder() {
+    SearchBudget budget(-1, -1.0, max_nodes, max_memory_bytes);
+    budget.cancel = &ponder_cancel;
+    tree->grow_tree(budget, exploration_constant);
+    ponder_iterations = tree->get_search_iterations();
+    ponder_seconds = tree->get_search_seconds();
+    ponder_running = false;
+}
+
 const MCTS_state *MCTS_agent::get_current_state() const { return tree->get_current_state(); }
 
 // Rollout strategy configuration methods
@@ -418,6 +686,14 @@ double MCTS_agent::get_heuristic_ratio() const {
     return MCTS_node::get_heuristic_ratio();
 }
 
+void MCTS_agent::set_rollouts_per_leaf(unsigned int n) {
+    MCTS_node::set_rollouts_per_leaf(n);
+}
+
+unsigned int MCTS_agent::get_rollouts_per_leaf() const {
+    return MCTS_node::get_rollouts_per_leaf();
+}
+
 void MCTS_agent::set_exploration_constant(double c) {
     exploration_constant = c;
 }
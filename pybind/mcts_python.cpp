@@ -6,6 +6,8 @@
 #include <thread>
 #include <future>
 #include <vector>
+#include <unordered_map>
+#include <stdexcept>
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
 #include "py_wrappers.h"
@@ -20,46 +22,86 @@ unsigned int MCTS_node::num_rollout_threads = DEFAULT_NUMBER_OF_THREADS;
 
 /*** MCTS NODE ***/
 MCTS_node::MCTS_node(MCTS_node *parent, MCTS_state *state, const MCTS_move *move, bool owns_state, double prior_probability)
-        : parent(parent), state(state->clone()), move(move), score(0.0), number_of_simulations(0), size(0),
-          owns_state(true), prior_probability(prior_probability), is_evaluated(false) {
-    terminal = this->state->is_terminal();
-    children.reserve(STARTING_NUMBER_OF_CHILDREN);
-    auto* tmp = state->actions_to_try();
-    untried_actions.swap(*tmp);
-    delete tmp;
+        : parent(parent), state((owns_state || state == NULL) ? state : state->clone()), move(move), score(0.0),
+          number_of_simulations(0), size(0), owns_state(true), prior_probability(prior_probability),
+          is_evaluated(false), edges_generated(false), expanded(0), expanding(false), index_in_parent(0),
+          depth(parent != NULL ? parent->depth + 1 : 0), key(0), tree(parent != NULL ? parent->tree : NULL) {
+    // a state we do not get to own (the user's root) is cloned, so the node always owns the one it holds
+    terminal = (this->state != NULL) ? this->state->is_terminal() : false;      // no state: see materialize()
+}
+
+void MCTS_node::generate_edges() {
+    /** Move generation is deferred until the node is selected for expansion: most leaves never are. */
+    if (edges_generated) return;
+    tree->move_generations++;
+    queue<MCTS_move *> *actions = state->actions_to_try();
     
-    bool has_batch_support = false;
     SerializedPythonState* sps_check = dynamic_cast<SerializedPythonState*>(this->state);
-    if (sps_check != nullptr) {
-        has_batch_support = py::hasattr(sps_check->get_python_state(), "evaluate_batch");
-    }
+    bool has_batch_support = sps_check != nullptr && sps_check->has_evaluate_batch();
     
-    if (!untried_actions.empty()) {
-        if (has_batch_support) {
-            action_probabilities.assign(untried_actions.size(), 1.0);
-        } else {
-            vector<double> probs = this->state->get_action_probabilities();
-            if (!probs.empty()) {
-                vector<pair<double, MCTS_move*>> paired;
-                size_t i = 0;
-                while (!untried_actions.empty()) {
-                    double p = (i < probs.size()) ? probs[i] : 1.0;
-                    paired.push_back({p, untried_actions.front()});
-                    untried_actions.pop();
-                    i++;
-                }
-                sort(paired.begin(), paired.end(), [](const pair<double, MCTS_move*>& a, const pair<double, MCTS_move*>& b) {
-                    return a.first > b.first;
-                });
-                for (auto& item : paired) {
-                    untried_actions.push(item.second);
-                    action_probabilities.push_back(item.first);
-                }
-            } else {
-                action_probabilities.assign(untried_actions.size(), 1.0);
-            }
+    vector<double> probs;
+    if (!actions->empty() && !has_batch_support) {      // batched search gets its priors from evaluate_batch instead
+        probs = this->state->get_action_probabilities();
+    }
+    init_edges(actions, probs);
+    delete actions;
+    edges_generated = true;           // only now: concurrent selection may look at the edges from here on
+}
+
+// Prior of the i-th move in actions_to_try() order: priors are given per move, or per action index in games with a
+// fixed action space
+static inline double prior_of(const MCTS_move *move, size_t i, const vector<double> &priors) {
+    const long action = move->action_index();
+    const size_t index = (action >= 0) ? (size_t) action : i;
+    return (index < priors.size()) ? priors[index] : 1.0;
+}
+
+void MCTS_node::init_edges(queue<MCTS_move *> *actions, const vector<double> &probs) {
+    /** Turns the moves (given in actions_to_try() order, probs aligned with them or with their action indices) into
+     * edges sorted by prior. Takes ownership of the moves. */
+    size_t n = actions->size();
+    edges.reserve(n);
+    child_priors.reserve(n);
+    for (size_t i = 0 ; !actions->empty() ; i++) {
+        MCTS_edge edge = {actions->front(), NULL, false, (unsigned int) i};
+        actions->pop();
+        edges.push_back(edge);
+        child_priors.push_back(prior_of(edge.move, i, probs));
+    }
+    if (!is_sorted(child_priors.begin(), child_priors.end(), greater<double>())) {
+        // sort edges and priors together through a permutation (stable: equal priors keep the game's order)
+        vector<unsigned int> order(n);
+        for (unsigned int i = 0 ; i < n ; i++) order[i] = i;
+        stable_sort(order.begin(), order.end(), [this](unsigned int a, unsigned int b) {
+            return child_priors[a] > child_priors[b];
+        });
+        vector<MCTS_edge> sorted_edges(n);
+        vector<double> sorted_priors(n);
+        for (size_t i = 0 ; i < n ; i++) {
+            sorted_edges[i] = edges[order[i]];
+            sorted_priors[i] = child_priors[order[i]];
         }
+        edges.swap(sorted_edges);
+        child_priors.swap(sorted_priors);
     }
+    child_scores.assign(n, 0.0);
+    child_visits.assign(n, 0.0);
+}
+
+MCTS_node::MCTS_node(MCTS_node &&other)
+        : terminal(other.terminal), size(other.size), number_of_simulations(other.number_of_simulations),
+          score(other.score), prior_probability(other.prior_probability), state(other.state), move(other.move),
+          edges(std::move(other.edges)), edges_generated(other.edges_generated.load()), expanded(other.expanded.load()),
+          expanding(false),
+          child_scores(std::move(other.child_scores)), child_visits(std::move(other.child_visits)),
+          child_priors(std::move(other.child_priors)), index_in_parent(other.index_in_parent), depth(other.depth),
+          key(other.key), parent(other.parent), owns_state(other.owns_state), is_evaluated(other.is_evaluated),
+          tree(other.tree) {
+    // other is left without anything to free so that destroying it (with its arena) is harmless
+    other.state = NULL;
+    other.move = NULL;
+    other.edges.clear();
+    other.expanded = 0;
 }
 
 MCTS_node::~MCTS_node() {
@@ -67,51 +109,189 @@ MCTS_node::~MCTS_node() {
         delete state;
     }
     delete move;
-    for (auto *child : children) {
-        delete child;
-    }
-    while (!untried_actions.empty()) {
-        delete untried_actions.front();
-        untried_actions.pop();
+    for (size_t i = 0 ; i < edges.size() ; i++) {
+        if (edges[i].child == NULL || edges[i].transposition) {      // otherwise the move belongs to the child
+            delete edges[i].move;
+        }
     }
 }
 
 void MCTS_node::expand() {
+    if (state == NULL) {
+        throw runtime_error("MCTS_node.expand: the node has no state yet (see materialize)");
+    }
     if (is_terminal()) {              // can legitimately happen in end-game situations
         rollout();                    // keep rolling out, eventually causing UCT to pick another node to expand due to exploration
         return;
-    } else if (is_fully_expanded()) {
+    }
+    generate_edges();
+    if (is_fully_expanded()) {
         cerr << "Warning: Cannot expanded this node any more!" << endl;
         return;
     }
-    // get next untried action
-    MCTS_move *next_move = untried_actions.front();
-    untried_actions.pop();
-    
-    // get corresponding probability
-    double prob = 1.0;
-    if (!action_probabilities.empty()) {
-        prob = action_probabilities[0];
-        action_probabilities.erase(action_probabilities.begin());
+    // build a new MCTS node from the next untried action
+    const unsigned int e = expanded;
+    MCTS_node *new_node = expand_next();
+    // rollout, updating its stats. The result is backed up through this node rather than the new node's parent:
+    // a node shared through the transposition table points to the parent it was first reached from.
+    double w;
+    int n;
+    new_node->simulate(w, n);
+    new_node->score += w;
+    new_node->number_of_simulations += n;
+    child_scores[e] += w;
+    child_visits[e] += n;
+    size++;
+    backpropagate(w, n);
+}
+
+MCTS_node *MCTS_node::expand_next() {
+    MCTS_edge &edge = edges[expanded];
+    MCTS_state *next_state = state->next_state(edge.move);
+    uint64_t next_key;
+    lock_guard<mutex> lock(tree->expansion_mutex);      // the arena and the table are shared by all search threads
+    MCTS_node *new_node = tree->find_transposition(next_state, depth + 1, next_key);
+    if (new_node != NULL) {           // same position reached through another move order: share its node
+        delete next_state;
+        edge.transposition = true;
+    } else {
+        new_node = tree->arena.create(this, next_state, edge.move, true, child_priors[expanded]);  // adopts next_state
+        tree->nodes_created++;
+        new_node->index_in_parent = expanded;
+        if (next_key != 0) {
+            new_node->key = next_key;
+            tree->table.insert(next_key, new_node->depth, new_node);
+        }
+    }
+    edge.child = new_node;
+    expanded++;                       // publishes the child to concurrent selection
+    return new_node;
+}
+
+MCTS_node *MCTS_node::get_child(unsigned int i) {
+    if (edges[i].child != NULL) return edges[i].child;
+    // Selection descended into an edge of an evaluated node for the first time. The child only gets the move
+    // and the prior here: computing its state may need Python, so that is left to whoever evaluates it.
+    lock_guard<mutex> lock(tree->expansion_mutex);
+    if (edges[i].child == NULL) {      // another search thread may have created it meanwhile
+        MCTS_node *new_node = tree->arena.create(this, (MCTS_state *) NULL, edges[i].move, true, child_priors[i]);
+        new_node->index_in_parent = i;
+        edges[i].child = new_node;
+        expanded++;
+        tree->nodes_created++;
+    }
+    return edges[i].child;
+}
+
+MCTS_node *MCTS_node::materialize() {
+    if (state != NULL) {
+        // a node left behind by a transposition (see below) redirects to the node its edge now points to
+        return (parent != NULL) ? parent->edges[index_in_parent].child : this;
+    }
+    MCTS_state *next_state = parent->state->next_state(move);      // fresh state, adopted rather than cloned
+    terminal = next_state->is_terminal();
+    if (tree->table.enabled()) {
+        next_state->hash();           // SerializedPythonState caches it: no Python call is made under the lock below
+    }
+    lock_guard<mutex> lock(tree->expansion_mutex);      // search threads may be in get_child or expand_next meanwhile
+    state = next_state;
+    owns_state = true;
+    MCTS_node *existing = tree->find_transposition(state, depth, key);
+    if (existing != NULL) {
+        // Transposition: point the edge at the existing node, which keeps its statistics and subtree. This node
+        // is left unreachable (the arena reclaims it on the next compaction) and hands its move back to the edge.
+        MCTS_edge &edge = parent->edges[index_in_parent];
+        edge.child = existing;
+        edge.transposition = true;
+        move = NULL;
+        key = 0;
+        return existing;
+    }
+    tree->table.insert(key, depth, this);
+    return this;
+}
+
+vector<MCTS_node *> MCTS_node::get_children() const {
+    vector<MCTS_node *> children;
+    children.reserve(expanded);
+    for (size_t i = 0 ; i < edges.size() ; i++) {
+        if (edges[i].child != NULL) {
+            children.push_back(edges[i].child);
+        }
+    }
+    return children;
+}
+
+void MCTS_node::collect_subtree(MCTS_arrays &out) const {
+    /** The rows double as the breadth-first queue: nodes[i] is the node of row i. Only edges that own their child
+     * are followed, so that every node is reached once even if transpositions make the tree a graph. */
+    vector<const MCTS_node *> nodes;
+    nodes.reserve(tree->arena.size());  // at least the nodes of the subtree
+    nodes.push_back(this);
+    out.parent.assign(1, -1);
+    out.move_id.assign(1, 0);
+    out.depth.assign(1, 0);
+    for (size_t row = 0 ; row < nodes.size() ; row++) {
+        const MCTS_node *node = nodes[row];
+        for (size_t i = 0 ; i < node->edges.size() ; i++) {
+            const MCTS_edge &edge = node->edges[i];
+            if (edge.child == NULL || edge.transposition) continue;
+            nodes.push_back(edge.child);
+            out.parent.push_back((int64_t) row);
+            out.move_id.push_back(edge.move->get_id());
+            out.depth.push_back(out.depth[row] + 1);
+        }
+    }
+    const size_t n = nodes.size();
+    out.visits.resize(n);
+    out.value_sum.resize(n);
+    out.prior.resize(n);
+    for (size_t row = 0 ; row < n ; row++) {
+        out.visits[row] = nodes[row]->number_of_simulations;
+        out.value_sum[row] = nodes[row]->score;
+        out.prior[row] = nodes[row]->prior_probability;
+    }
+}
+
+void MCTS_node::collect_edges(MCTS_arrays &out) const {
+    const size_t n = edges_generated ? edges.size() : 0;
+    out.parent.clear();
+    out.depth.clear();
+    out.move_id.resize(n);
+    out.visits.resize(n);
+    out.value_sum.resize(n);
+    out.prior.resize(n);
+    for (size_t i = 0 ; i < n ; i++) {
+        out.move_id[i] = edges[i].move->get_id();
+        out.visits[i] = (uint32_t) child_visits[i];
+        out.value_sum[i] = child_scores[i];
+        out.prior[i] = child_priors[i];
+    }
+}
+
+void MCTS_node::add_stats(double w, int n) {
+    score += w;
+    number_of_simulations += n;
+    if (parent != NULL) {
+        parent->child_scores[index_in_parent] += w;
+        parent->child_visits[index_in_parent] += n;
     }
-    
-    MCTS_state *next_state = state->next_state(next_move);
-    // build a new MCTS node from it
-    MCTS_node *new_node = new MCTS_node(this, next_state, next_move, true, prob);  // Try to own, constructor will decide
-    delete next_state; // Prevent memory leak since MCTS_node constructor clones it
-    // rollout, updating its stats
-    new_node->rollout();
-    // add new node to tree
-    children.push_back(new_node);
 }
 
 void MCTS_node::rollout() {
+    double w;
+    int n;
+    simulate(w, n);
+    backpropagate(w, n);
+}
+
+void MCTS_node::simulate(double &w, int &n) const {
 #ifdef PARALLEL_ROLLOUTS
     // Use std::thread for parallel rollouts
     if (num_rollout_threads <= 1) {
         // Single-threaded fallback
-        double w = state->rollout();
-        backpropagate(w, 1);
+        w = state->rollout();
+        n = 1;
         return;
     }
     
@@ -146,22 +326,22 @@ void MCTS_node::rollout() {
     // Ensure we have at least one successful rollout
     if (successful_rollouts == 0) {
         cerr << "Warning: All parallel rollouts failed, falling back to single rollout" << endl;
-        double w = state->rollout();
-        backpropagate(w, 1);
+        w = state->rollout();
+        n = 1;
     } else {
-        backpropagate(score_sum, successful_rollouts);
+        w = score_sum;
+        n = successful_rollouts;
     }
     
 #else
     // Single-threaded rollouts
-    double w = state->rollout();
-    backpropagate(w, 1);
+    w = state->rollout();
+    n = 1;
 #endif
 }
 
 void MCTS_node::backpropagate(double w, int n) {
-    score += w;
-    number_of_simulations += n;
+    add_stats(w, n);
     if (parent != NULL) {
         parent->size++;
         parent->backpropagate(w, n);
@@ -169,7 +349,7 @@ void MCTS_node::backpropagate(double w, int n) {
 }
 
 bool MCTS_node::is_fully_expanded() const {
-    return is_terminal() || untried_actions.empty();
+    return is_terminal() || (edges_generated && (is_evaluated || expanded == edges.size()));
 }
 
 bool MCTS_node::is_terminal() const {
@@ -180,57 +360,90 @@ unsigned int MCTS_node::get_size() const {
     return size;
 }
 
-MCTS_node *MCTS_node::select_best_child(double c) const {
-    /** selects best child based on the winrate of whose turn it is to play */
-    if (children.empty()) return NULL;
-    else if (children.size() == 1) return children[0];
-    else {
-        double score, max = -1e20;
-        MCTS_node *argmax = NULL;
-        for (auto *child : children) {
-            double winrate = 0.5;
-            if (child->number_of_simulations > 0) {
-                winrate = child->score / ((double) child->number_of_simulations);
-            }
-            // If it's not the self side's turn, apply UCT based on opponent winrate (our loss rate)
-            if (!state->is_self_side_turn()){
-                winrate = 1.0 - winrate;
-            }
-            if (c > 0) {
-                // PUCT formula: Q + C * P * sqrt(ParentN) / (1 + ChildN)
-                double exploration = c * child->prior_probability * sqrt((double)this->number_of_simulations) / (1.0 + (double)child->number_of_simulations);
-                score = winrate + exploration;
-            } else {
-                score = winrate;
-            }
-            if (score > max) {
-                max = score;
-                argmax = child;
+/** Scores m children: offset + sign * Q + c_sqrt_n * P / (1 + N), where unvisited children count as even (Q = 0.5).
+ * Deliberately branch-free (the ternary only selects between constants) so that the compiler can vectorize it. */
+static inline void score_children(const double *s, const double *v, const double *p, size_t m,
+                                  double offset, double sign, double c_sqrt_n, double *values) {
+    for (size_t i = 0 ; i < m ; i++) {
+        double unvisited = (v[i] > 0.0) ? 0.0 : 1.0;
+        double winrate = (s[i] + 0.5 * unvisited) / (v[i] + unvisited);
+        values[i] = offset + sign * winrate + c_sqrt_n * p[i] / (1.0 + v[i]);
+    }
+}
+
+/** PUCT/UCT argmax over the struct-of-arrays child statistics. Children are scored a block at a time into a
+ * stack buffer and the argmax is taken afterwards. Full blocks use a compile-time trip count, which is what
+ * lets the compiler vectorize the scoring loop even at -O2. The atomic statistics are first loaded into plain
+ * buffers so that the scoring loop itself stays vectorizable. */
+static size_t select_argmax(const AtomicStat<double> *scores, const AtomicStat<double> *visits, const double *priors,
+                            size_t n, double c, double parent_visits, bool self_side_turn) {
+    double values[SELECTION_BLOCK_SIZE];
+    double s[SELECTION_BLOCK_SIZE];
+    double v[SELECTION_BLOCK_SIZE];
+    // If it's not the self side's turn, use the opponent winrate (our loss rate): q' = 1 - q
+    const double offset = self_side_turn ? 0.0 : 1.0;
+    const double sign = self_side_turn ? 1.0 : -1.0;
+    // PUCT formula: Q + C * P * sqrt(ParentN) / (1 + ChildN)
+    const double c_sqrt_n = (c > 0) ? c * sqrt(parent_visits) : 0.0;
+    double max = -1e20;
+    size_t argmax = 0;
+    for (size_t start = 0 ; start < n ; start += SELECTION_BLOCK_SIZE) {
+        const size_t m = min(n - start, (size_t) SELECTION_BLOCK_SIZE);
+        for (size_t i = 0 ; i < m ; i++) {
+            s[i] = scores[start + i];
+            v[i] = visits[start + i];
+        }
+        if (m == SELECTION_BLOCK_SIZE) {
+            score_children(s, v, priors + start, SELECTION_BLOCK_SIZE, offset, sign, c_sqrt_n, values);
+        } else {
+            score_children(s, v, priors + start, m, offset, sign, c_sqrt_n, values);
+        }
+        for (size_t i = 0 ; i < m ; i++) {
+            if (values[i] > max) {
+                max = values[i];
+                argmax = start + i;
             }
         }
-        return argmax;
     }
+    return argmax;
+}
+
+int MCTS_node::select_best_edge(double c) const {
+    /** selects best edge based on the winrate of whose turn it is to play */
+    // evaluated nodes select among all their edges, the others among the children expanded so far
+    size_t n = is_evaluated ? edges.size() : (size_t) expanded.load();
+    if (n == 0) return -1;
+    else if (n == 1) return 0;
+    return (int) select_argmax(child_scores.data(), child_visits.data(), child_priors.data(), n,
+                               c, (double) number_of_simulations, state->is_self_side_turn());
+}
+
+MCTS_node *MCTS_node::select_best_child(double c) {
+    int best = select_best_edge(c);
+    if (best < 0) return NULL;
+    return get_child((unsigned int) best)->materialize();
 }
 
 MCTS_node *MCTS_node::advance_tree(const MCTS_move *m) {
-    // Find child with this m and delete all others
+    // Find child with this m. The others are not deleted here: they stay in the arena until the tree compacts it.
     MCTS_node *next = NULL;
-    for (auto *child: children) {
-        if (child->move->get_id() == m->get_id() && *(child->move) == *(m)) {
-            next = child;
-        } else {
-            delete child;
+    for (unsigned int i = 0 ; i < edges.size() ; i++) {
+        if (edges[i].child != NULL && edges[i].move->get_id() == m->get_id() && *(edges[i].move) == *(m)) {
+            next = edges[i].child;
+            break;
         }
     }
-    // remove children from queue so that they won't be re-deleted by the destructor when this node dies (!)
-    children.clear();
     // if not found then we have to create a new node
     if (next == NULL) {
         // Note: UCT may lead to not fully explored tree even for short-term children due to terminal nodes being chosen
         cout << "INFO: Didn't find child node. Had to start over." << endl;
         MCTS_state *next_state = state->next_state(m);
-        next = new MCTS_node(NULL, next_state, NULL, true, 1.0);  // Try to own, constructor will decide
+        next = tree->arena.create((MCTS_node *) NULL, next_state, (const MCTS_move *) NULL, true, 1.0);  // adopts next_state
+        next->tree = tree;
+        next->depth = depth + 1;
+        tree->nodes_created++;
     } else {
+        next = next->materialize();     // needs the parent's state, so before detaching it
         next->parent = NULL;     // make parent NULL
         // IMPORTANT: m and next->move can be the same here if we pass the move from select_best_child()
         // (which is what we will typically be doing). If not then it's the caller's responsibility to delete m (!)
@@ -240,69 +453,363 @@ MCTS_node *MCTS_node::advance_tree(const MCTS_move *m) {
 }
 
 /*** MCTS TREE ***/
-MCTS_node *MCTS_tree::select(double c) {
+MCTS_node *MCTS_tree::select(double c, MCTS_path *path) {
     MCTS_node *node = root;
     while (!node->is_terminal()) {
         if (!node->is_fully_expanded()) {
             return node;
         } else {
-            node = node->select_best_child(c);
+            // children reached for the first time come back without a state, the leaf is returned as is
+            int best = node->select_best_edge(c);
+            if (best < 0) {
+                return NULL;
+            }
+            if (path != NULL) {
+                path->push_back(MCTS_step{node, (unsigned int) best});
+            }
+            node = node->get_child((unsigned int) best);
+            if (!node->is_materialized()) {
+                return node;
+            }
+        }
+    }
+    return node;
+}
+
+MCTS_node *MCTS_tree::expand(MCTS_node *leaf, MCTS_path &path) {
+    /** Returns NULL if leaf has no edge left to expand, e.g. because another search thread took the last one. */
+    if (leaf->is_terminal()) {        // can legitimately happen in end-game situations: simulate from it again
+        return leaf;
+    }
+    // several search threads may select the same leaf: one at a time generates its moves and takes the next edge
+    while (leaf->expanding.exchange(true, memory_order_acquire)) {
+        this_thread::yield();
+    }
+    leaf->generate_edges();
+    MCTS_node *child = NULL;
+    if (!leaf->is_fully_expanded()) {
+        path.push_back(MCTS_step{leaf, leaf->expanded.load()});
+        child = leaf->expand_next();
+    }
+    leaf->expanding.store(false, memory_order_release);
+    return child;
+}
+
+void MCTS_tree::backpropagate(const MCTS_path &path, MCTS_node *leaf, double w, int n) {
+    /** Like MCTS_node::backpropagate() but along the path that selection took rather than the parent pointers,
+     * which is what tells apart the parents of a node shared through the transposition table. */
+    leaf->score += w;
+    leaf->number_of_simulations += n;
+    for (size_t i = path.size() ; i-- > 0 ;) {
+        MCTS_node *node = path[i].node;
+        node->child_scores[path[i].edge] += w;
+        node->child_visits[path[i].edge] += n;
+        node->score += w;
+        node->number_of_simulations += n;
+        node->size++;
+    }
+}
+
+void MCTS_tree::apply_virtual_loss(const MCTS_path &path, MCTS_node *leaf, double v) {
+    /** Path version of MCTS_node::apply_virtual_loss(): every node on the path (and the edges taken) counts one
+     * more visit that looks like a loss for the side choosing it, which steers other search threads elsewhere. */
+    for (size_t i = path.size() + 1 ; i-- > 0 ;) {
+        MCTS_node *node = (i == path.size()) ? leaf : path[i].node;
+        MCTS_node *chooser = (i > 0) ? path[i - 1].node : NULL;
+        double w = (chooser != NULL && !chooser->state->is_self_side_turn()) ? v : -v;
+        node->score += w;
+        node->number_of_simulations += 1;
+        if (chooser != NULL) {
+            chooser->child_scores[path[i - 1].edge] += w;
+            chooser->child_visits[path[i - 1].edge] += 1;
+        }
+    }
+}
+
+void MCTS_tree::remove_virtual_loss(const MCTS_path &path, MCTS_node *leaf, double v) {
+    // inverse of apply_virtual_loss()
+    for (size_t i = path.size() + 1 ; i-- > 0 ;) {
+        MCTS_node *node = (i == path.size()) ? leaf : path[i].node;
+        MCTS_node *chooser = (i > 0) ? path[i - 1].node : NULL;
+        double w = (chooser != NULL && !chooser->state->is_self_side_turn()) ? v : -v;
+        node->score -= w;
+        node->number_of_simulations -= 1;
+        if (chooser != NULL) {
+            chooser->child_scores[path[i - 1].edge] -= w;
+            chooser->child_visits[path[i - 1].edge] -= 1;
+        }
+    }
+}
+
+bool MCTS_tree::supports_tree_parallelism() const {
+    // Python states (wrapped or subclassing MCTS_state directly) need the GIL for every call
+    const MCTS_state *s = root->get_current_state();
+    return dynamic_cast<const SerializedPythonState *>(s) == NULL && dynamic_cast<const PyMCTS_state *>(s) == NULL;
+}
+
+bool MCTS_tree::needs_gil() const {
+    // Native states never call into Python and SerializedPythonState takes the GIL for each call itself, so both can
+    // be searched without it. Python subclasses of MCTS_state are owned through their Python objects: keep it.
+    return dynamic_cast<const PyMCTS_state *>(root->get_current_state()) != NULL;
+}
+
+unsigned long MCTS_tree::grow_tree_parallel(BudgetController &controller, double exploration_constant,
+                                            uint64_t search_seed) {
+    /** Tree parallelism: every search thread (the calling one included) runs whole iterations on the shared tree.
+     * Statistics are atomic, expansion is guarded per node and a virtual loss keeps the threads on different paths
+     * while they simulate. Thread i seeds its generator with stream i of search_seed. Every thread checks the
+     * budget with its own copy of the controller, the first one to stop ends the search and reports why. */
+    atomic<unsigned long> iterations(0);      // reserved
+    atomic<unsigned long> completed(0);
+    atomic<bool> stop(false);
+    StopReason reason = StopReason::NONE;     // written by the thread that set stop
+    auto search = [&](unsigned int index) {
+        thread_rng().seed(mix_seed(search_seed, index));
+        BudgetController budget(controller);
+        MCTS_path path;
+        double w;
+        int n;
+        while (!stop.load(memory_order_relaxed)) {
+            size_t nodes = 0, bytes = 0;
+            if (budget.limits_size()) {
+                lock_guard<mutex> guard(expansion_mutex);
+                nodes = arena.size();
+                bytes = get_memory_bytes();
+            }
+            unsigned long reserved = iterations.fetch_add(1);
+            if (budget.should_stop(reserved, nodes, bytes)) break;
+            if (index == 0 && early_stop(budget, reserved)) break;      // one thread watches the root
+            MCTS_node *leaf, *node = NULL;
+            do {                      // expand() fails if another thread took the last edge of the leaf meanwhile
+                path.clear();
+                leaf = select(exploration_constant, &path);
+                if (leaf != NULL) node = expand(leaf, path);
+            } while (leaf != NULL && node == NULL);
             if (node == NULL) {
+                budget.stop(StopReason::EXHAUSTED);
                 break;
             }
+            apply_virtual_loss(path, node, virtual_loss);
+            node->simulate(w, n);
+            remove_virtual_loss(path, node, virtual_loss);
+            backpropagate(path, node, w, n);
+            completed++;
+        }
+        if (!stop.exchange(true)) reason = budget.get_reason();
+    };
+    vector<thread> threads;
+    for (int i = 1 ; i < num_search_threads ; i++) {
+        threads.emplace_back(search, (unsigned int) i);
+    }
+    search(0);
+    for (size_t i = 0 ; i < threads.size() ; i++) {
+        threads[i].join();
+    }
+    controller.stop(reason);
+    return completed;
+}
+
+void MCTS_tree::merge_root_statistics(const MCTS_tree &other) {
+    /** Root-parallel merge: the visits and scores of other's root edges are added to the edges of our root with
+     * the same move (get_id() and operator==), so that select_best_child() decides on the statistics of both
+     * trees. Only our root's edge arrays change, its subtrees keep their own statistics. */
+    const MCTS_node *theirs = other.root;
+    if (!theirs->edges_generated || theirs->expanded == 0) return;
+    root->generate_edges();
+    for (unsigned int j = 0 ; j < theirs->expanded ; j++) {
+        const MCTS_move *move = theirs->edges[j].move;
+        for (unsigned int i = 0 ; i < root->edges.size() ; i++) {
+            if (root->edges[i].move->get_id() != move->get_id() || !(*root->edges[i].move == *move)) continue;
+            while (root->expanded <= i) {     // keep "edges [0, expanded) have a child" true for select_best_child
+                root->expand_next();
+            }
+            root->child_scores[i] += theirs->child_scores[j];
+            root->child_visits[i] += theirs->child_visits[j];
+            root->score += theirs->child_scores[j];
+            root->number_of_simulations += (unsigned int) theirs->child_visits[j];
+            root->size += (unsigned int) theirs->child_visits[j];      // the helper's iterations through this edge
+            break;
         }
     }
+}
+
+MCTS_node *MCTS_tree::find_transposition(const MCTS_state *state, unsigned int depth, uint64_t &key) {
+    key = 0;
+    if (!table.enabled()) return NULL;
+    key = state->hash();
+    MCTS_node *node = table.find(key, depth);
+    if (node != NULL) transposition_hits++;
     return node;
 }
 
+void MCTS_tree::set_transposition_table_size(size_t max_entries) {
+    table.resize(max_entries);
+    if (table.enabled()) {            // register the nodes already in the tree
+        compact();
+    }
+}
+
 MCTS_tree::MCTS_tree(MCTS_state *starting_state)
-    : batch_size(64), num_search_threads(4), virtual_loss(1.0) {
+    : transposition_hits(0), nodes_created(1), move_generations(0), seed(random_seed()), searches(0),
+      stop_reason(StopReason::NONE), search_iterations(0), search_iterations_saved(0), search_seconds(0.0), batch_size(64), num_search_threads(4), virtual_loss(1.0) {
     assert(starting_state != NULL);
-    root = new MCTS_node(NULL, starting_state, NULL, false);
+    root = arena.create((MCTS_node *) NULL, starting_state, (const MCTS_move *) NULL, false);
+    root->tree = this;
 }
 
 MCTS_tree::~MCTS_tree() {
-    delete root;
+    arena.clear();         // frees every node in bulk
+}
+
+void MCTS_tree::compact() {
+    /** Moves the subtree under root into a fresh arena in breadth-first order (so siblings end up next to each other)
+     * and then releases the old arena at once, which destroys every node that was not reachable from root. */
+    NodeArena<MCTS_node> fresh;
+    unordered_map<MCTS_node *, MCTS_node *> relocated;       // old -> new address of nodes shared by several parents
+    const bool shared = transposition_hits > 0;                // otherwise every node has a single parent
+    table.clear();                     // its pointers are about to go stale, surviving nodes are registered again
+    MCTS_node *new_root = fresh.create(std::move(*root));
+    new_root->parent = NULL;
+    if (shared) {
+        relocated[root] = new_root;
+    }
+    queue<MCTS_node *> Q;
+    Q.push(new_root);
+    while (!Q.empty()) {
+        MCTS_node *node = Q.front();
+        Q.pop();
+        if (table.enabled() && node->state != NULL) {
+            if (node->key == 0) {
+                node->key = node->state->hash();
+            }
+            table.insert(node->key, node->depth, node);
+        }
+        for (unsigned int i = 0 ; i < node->edges.size() ; i++) {
+            if (node->edges[i].child == NULL) continue;
+            if (shared) {
+                auto it = relocated.find(node->edges[i].child);
+                if (it != relocated.end()) {
+                    node->edges[i].child = it->second;
+                    continue;
+                }
+            }
+            MCTS_node *child = fresh.create(std::move(*node->edges[i].child));
+            if (shared) {
+                relocated[node->edges[i].child] = child;
+                if (node->edges[i].transposition) {
+                    // Not reached through the edge that created it: this parent becomes its first parent, so the
+                    // node takes over this edge's move and the creating edge (if it survives) keeps the old one.
+                    MCTS_node *creator = child->parent;
+                    auto it = relocated.find(creator);
+                    if (it != relocated.end()) {
+                        creator = it->second;
+                    }
+                    creator->edges[child->index_in_parent].transposition = true;
+                    child->move = node->edges[i].move;
+                    node->edges[i].transposition = false;
+                }
+            }
+            child->parent = node;      // the first parent reached breadth-first
+            child->index_in_parent = i;
+            node->edges[i].child = child;
+            Q.push(child);
+        }
+    }
+    arena.swap(fresh);
+    root = new_root;
+    fresh.clear();         // old nodes: discarded subtrees are destroyed here, relocated ones are empty shells
 }
 
 void MCTS_tree::grow_tree(int max_iter, double max_time_in_seconds, double exploration_constant) {
+    grow_tree(SearchBudget(max_iter, max_time_in_seconds), exploration_constant);
+}
+
+void MCTS_tree::grow_tree(const SearchBudget &budget, double exploration_constant) {
     // Check if the root state supports batch evaluation
-    bool has_batch_support = false;
     SerializedPythonState* root_sps_check = dynamic_cast<SerializedPythonState*>(root->get_state());
-    if (root_sps_check != nullptr) {
-        has_batch_support = py::hasattr(root_sps_check->get_python_state(), "evaluate_batch");
-    }
+    bool has_batch_support = root_sps_check != nullptr && root_sps_check->has_evaluate_batch();
     
-    if (!has_batch_support) {
+    BudgetController controller(budget);
+    const uint64_t search_seed = next_search_seed();
+    unsigned long iterations = 0;
+    search_iterations_saved = 0;
+    if (has_batch_support) {
+        thread_rng().seed(search_seed);
+        iterations = grow_tree_batched(controller, exploration_constant);
+    } else if (num_search_threads > 1 && supports_tree_parallelism()) {
+        iterations = grow_tree_parallel(controller, exploration_constant, search_seed);
+    } else {
         // Graceful fallback: use legacy sequential loop
+        thread_rng().seed(search_seed);
         MCTS_node *node;
-        time_t start_t, now_t;
-        time(&start_t);
-        for (int i = 0; i < max_iter; i++) {
-            node = select(exploration_constant);
-            node->expand();
-            time(&now_t);
-            if (difftime(now_t, start_t) > max_time_in_seconds) break;
+        MCTS_path path;
+        double w;
+        int n;
+        while (!controller.should_stop(iterations, arena.size(), get_memory_bytes()) && !early_stop(controller, iterations)) {
+            path.clear();
+            node = select(exploration_constant, &path);
+            if (node != NULL) {
+                node = expand(node, path);
+                if (node == NULL) {
+                    cerr << "Warning: Cannot expanded this node any more!" << endl;
+                }
+            }
+            if (node == NULL) {
+                controller.stop(StopReason::EXHAUSTED);
+                break;
+            }
+            node->simulate(w, n);
+            backpropagate(path, node, w, n);
+            iterations++;
         }
-        return;
     }
-    
-    // Batched state machine loop
-    // max_iter = total number of leaf evaluations
-    int total_evaluated = 0;
-    time_t start_t, now_t;
-    time(&start_t);
+    stop_reason = controller.get_reason();
+    search_iterations = iterations;
+    search_seconds = controller.elapsed_seconds();
+}
+
+bool MCTS_tree::early_stop(BudgetController &controller, unsigned long iterations) {
+    if (!controller.early_stop_due(iterations) || root->is_terminal() || !root->is_fully_expanded()) return false;
+    // evaluated roots have statistics for every edge, the others for their children (all of them once fully expanded)
+    size_t n = root->is_evaluated ? root->edges.size() : (size_t) root->expanded.load();
+    long remaining = controller.remaining_iterations(iterations);
+    if (root->edges.size() == 1) {
+        controller.stop(StopReason::FORCED);
+    } else if (best_move_decided(root->child_scores.data(), root->child_visits.data(), n,
+                                 root->state->is_self_side_turn(), remaining, controller.get_early_stop_confidence())) {
+        controller.stop(StopReason::DECIDED);
+    } else {
+        return false;
+    }
+    search_iterations_saved = (unsigned long) max(remaining, 0L);
+    return true;
+}
+
+unsigned long MCTS_tree::grow_tree_batched(BudgetController &controller, double exploration_constant) {
+    // Batched state machine loop, an iteration is a leaf evaluation
+    unsigned long total_evaluated = 0, rounds = 0;
     
     // Spawn search threads with configured count
     SearchThreadPool pool(this, exploration_constant, num_search_threads);
     pool.start();
     
-    while (total_evaluated < max_iter) {
-        time(&now_t);
-        if (difftime(now_t, start_t) > max_time_in_seconds) break;
+    while (true) {
+        size_t tree_nodes = 0, tree_bytes = 0;
+        if (controller.limits_size()) {
+            lock_guard<mutex> guard(expansion_mutex);
+            tree_nodes = arena.size();
+            tree_bytes = get_memory_bytes();
+        }
+        if (controller.should_stop(total_evaluated, tree_nodes, tree_bytes)) break;
+        if (early_stop(controller, total_evaluated)) break;
+        // a round may evaluate nothing (e.g. all leaves were terminal), so do not wait for the stride to read the clock
+        if (rounds++ > 0 && controller.interrupted()) break;
         
-        // Wait for the queue to fill up or all threads to be parked
-        pool.wait_all_parked(5000);
+        // Wait for the queue to fill up or all threads to be parked, but not past the deadline
+        int wait_ms = 5000;
+        double remaining = controller.remaining_seconds();
+        if (remaining >= 0.0) wait_ms = max(1, min(wait_ms, (int) ceil(remaining * 1000.0)));
+        pool.wait_all_parked(wait_ms);
         
         // Pause all threads to freeze the queue during evaluation
         pool.pause();
@@ -320,10 +827,28 @@ void MCTS_tree::grow_tree(int max_iter, double max_time_in_seconds, double explo
         std::vector<std::pair<double, std::vector<double>>> results;
         {
             py::gil_scoped_acquire gil;
+            // Leaves reached through a new edge have no state yet: compute it now that we hold the GIL.
+            // The ones that turn out to be terminal need no evaluation and are resolved right away, and so are
+            // transpositions of nodes that were already evaluated (their mean value is backed up this path).
+            std::vector<SearchLeaf> leaves;
+            leaves.swap(nodes);
+            for (SearchLeaf& leaf : leaves) {
+                this->remove_virtual_loss(leaf.path, leaf.node, this->get_virtual_loss());
+                leaf.node = leaf.node->materialize();
+                if (leaf.node->is_terminal()) {
+                    this->backpropagate(leaf.path, leaf.node, leaf.node->state->rollout(), 1);
+                } else if (leaf.node->is_evaluated) {
+                    int n = leaf.node->get_number_of_simulations();
+                    this->backpropagate(leaf.path, leaf.node, (n > 0) ? leaf.node->get_score() / n : 0.5, 1);
+                } else {
+                    nodes.push_back(leaf);
+                }
+            }
+            
             // Build SerializedPythonStates for the batch
             std::vector<MCTS_state*> batch_states;
             for (size_t ni = 0; ni < nodes.size(); ni++) {
-                MCTS_node* node = nodes[ni];
+                MCTS_node* node = nodes[ni].node;
                 SerializedPythonState* sps = dynamic_cast<SerializedPythonState*>(node->get_state());
                 if (sps != nullptr) {
                     batch_states.push_back(sps);
@@ -345,19 +870,17 @@ void MCTS_tree::grow_tree(int max_iter, double max_time_in_seconds, double explo
             // Backpropagate & expand phase
             size_t min_size = std::min(nodes.size(), results.size());
             for (size_t i = 0; i < min_size; i++) {
-                MCTS_node* node = nodes[i];
+                MCTS_node* node = nodes[i].node;
                 if (i < results.size()) {
                     double value = results[i].first;
                     const auto& priors = results[i].second;
                     
-                    // Undo virtual loss first
-                    node->remove_virtual_loss(this->get_virtual_loss());
-                    
-                    // Expand with priors (AlphaZero-style, calls state->next_state which requires GIL)
+                    // Virtual loss was undone above. Expand with priors (AlphaZero-style, calls
+                    // state->actions_to_try which requires GIL)
                     node->expand_with_priors(priors);
                     
                     // Backpropagate the true neural value
-                    node->backpropagate(value, 1);
+                    this->backpropagate(nodes[i].path, node, value, 1);
                 }
             }
             total_evaluated += min_size;
@@ -369,12 +892,20 @@ void MCTS_tree::grow_tree(int max_iter, double max_time_in_seconds, double explo
     
   // Stop the pool
     pool.stop_threads();
+    return total_evaluated;
 }
 
+
 unsigned int MCTS_tree::get_size() const {
     return root->get_size();
 }
 
+MCTS_arrays MCTS_tree::to_arrays() const {
+    MCTS_arrays arrays;
+    root->collect_subtree(arrays);
+    return arrays;
+}
+
 const MCTS_move *MCTS_node::get_move() const {
     return move;
 }
@@ -398,11 +929,10 @@ void MCTS_node::apply_virtual_loss(double v) {
     // Flip sign based on parent's turn to restore proper thread repulsion at MIN nodes
     MCTS_node* node = this;
     while (node != NULL) {
-        node->number_of_simulations += 1;
         if (node->parent != NULL && !node->parent->state->is_self_side_turn()) {
-            node->score += v;
+            node->add_stats(v, 1);
         } else {
-            node->score -= v;
+            node->add_stats(-v, 1);
         }
         node = node->parent;
     }
@@ -412,11 +942,10 @@ void MCTS_node::remove_virtual_loss(double v) {
     // Remove virtual loss along the entire root->leaf path (inverse of apply)
     MCTS_node* node = this;
     while (node != NULL) {
-        node->number_of_simulations -= 1;
         if (node->parent != NULL && !node->parent->state->is_self_side_turn()) {
-            node->score -= v;
+            node->add_stats(-v, -1);
         } else {
-            node->score += v;
+            node->add_stats(v, -1);
         }
         node = node->parent;
     }
@@ -424,24 +953,20 @@ void MCTS_node::remove_virtual_loss(double v) {
 
 void MCTS_node::expand_with_priors(const vector<double>& priors) {
     is_evaluated = true;
+    generate_edges();
     
-    if (!untried_actions.empty()) {
-        size_t i = 0;
-        while (!untried_actions.empty()) {
-            MCTS_move* next_move = untried_actions.front();
-            untried_actions.pop();
-            
-            double prob = 1.0;
-            if (i < priors.size()) {
-                prob = priors[i];
-            }
-            
-            MCTS_state* next_state = state->next_state(next_move);
-            MCTS_node* child = new MCTS_node(this, next_state, next_move, true, prob);
-            delete next_state;
-            
-            children.push_back(child);
-            i++;
+    // priors are given in actions_to_try() order, which is the edge order for nodes of batched search (see generate_edges),
+    // or per action index. No child is created here: selection creates them edge by edge (get_child) and the evaluation
+    // materializes them.
+    double total = 0.0;
+    for (size_t i = 0 ; i < edges.size() ; i++) {
+        child_priors[i] = prior_of(edges[i].move, i, priors);
+        total += child_priors[i];
+    }
+    if (!edges.empty() && edges[0].move->action_index() >= 0) {
+        // a row of the whole action space: normalized over the legal actions, uniform if they were given nothing
+        for (size_t i = 0 ; i < edges.size() ; i++) {
+            child_priors[i] = (total > 0.0) ? child_priors[i] / total : 1.0 / edges.size();
         }
     }
 }
@@ -455,23 +980,37 @@ void MCTS_node::print_stats() const {
     cout << "___ INFO _______________________" << endl
          << "Tree size: " << size << endl
          << "Number of simulations: " << number_of_simulations << endl
-         << "Branching factor at root: " << children.size() << endl
-         << "Chances of self side winning: " << setprecision(4) << 100.0 * (score / number_of_simulations) << "%" << endl;
+         << "Branching factor at root: " << expanded << endl
+         << "Nodes that never generated moves: " << tree->get_nodes_without_moves() << " / " << tree->get_nodes_created() << endl;
+    if (tree->table.enabled()) {
+        cout << "Transposition hits: " << tree->get_transposition_hits() << " (" << tree->get_transposition_entries()
+             << " / " << tree->get_transposition_table_size() << " entries)" << endl;
+    }
+    if (tree->get_stop_reason() != StopReason::NONE) {
+        cout << "Last search: " << tree->get_search_iterations() << " iterations in " << setprecision(4)
+             << 1000.0 * tree->get_search_seconds() << " ms, stopped by " << stop_reason_name(tree->get_stop_reason());
+        if (tree->get_search_iterations_saved() > 0) {
+            cout << " (about " << tree->get_search_iterations_saved() << " iterations saved)";
+        }
+        cout << endl;
+    }
+    cout << "Chances of self side winning: " << setprecision(4) << 100.0 * (score / number_of_simulations) << "%" << endl;
     // sort children based on winrate of current player's turn for this node
+    vector<MCTS_node *> sorted_children = get_children();
     if (state->is_self_side_turn()) {
-        std::sort(children.begin(), children.end(), [](const MCTS_node *n1, const MCTS_node *n2){
+        std::sort(sorted_children.begin(), sorted_children.end(), [](const MCTS_node *n1, const MCTS_node *n2){
             return n1->calculate_winrate(true) > n2->calculate_winrate(true);
         });
     } else {
-        std::sort(children.begin(), children.end(), [](const MCTS_node *n1, const MCTS_node *n2){
+        std::sort(sorted_children.begin(), sorted_children.end(), [](const MCTS_node *n1, const MCTS_node *n2){
             return n1->calculate_winrate(false) > n2->calculate_winrate(false);
         });
     }
     // print TOPK of them along with their winrates
     cout << "Best moves:" << endl;
-    for (int i = 0 ; i < children.size() && i < TOPK ; i++) {
-        cout << "  " << i + 1 << ". " << children[i]->move->sprint() << "  -->  "
-             << setprecision(4) << 100.0 * children[i]->calculate_winrate(state->is_self_side_turn()) << "%" << endl;
+    for (int i = 0 ; i < sorted_children.size() && i < TOPK ; i++) {
+        cout << "  " << i + 1 << ". " << sorted_children[i]->move->sprint() << "  -->  "
+             << setprecision(4) << 100.0 * sorted_children[i]->calculate_winrate(state->is_self_side_turn()) << "%" << endl;
     }
     cout << "________________________________" << endl;
 }
@@ -485,9 +1024,8 @@ double MCTS_node::calculate_winrate(bool player1turn) const {
 }
 
 void MCTS_tree::advance_tree(const MCTS_move *move) {
-    MCTS_node *old_root = root;
     root = root->advance_tree(move);
-    delete old_root;       // this won't delete the new root since we have emptied old_root's children
+    compact();             // reclaims the old root and all discarded siblings at once
 }
 
 const MCTS_state *MCTS_tree::get_current_state() const { return root->get_current_state(); }
@@ -520,27 +1058,28 @@ void SearchThreadPool::search_thread_func() {
         if (stop_flag.load()) break;
         
         // Search phase: walk the tree, find a leaf to evaluate
-        MCTS_node* node = tree->select(exploration_constant);
+        SearchLeaf leaf;
+        leaf.node = tree->select(exploration_constant, &leaf.path);
         
-        if (node == NULL) {
+        if (leaf.node == NULL) {
             std::this_thread::sleep_for(std::chrono::milliseconds(1));
             continue;
         }
         
         // If terminal, backpropagate immediately and continue
-        if (node->is_terminal()) {
+        if (leaf.node->is_terminal()) {
             // Terminal node: compute true value and backpropagate
-            double true_value = node->state->rollout();
-            node->backpropagate(true_value, 1);
+            double true_value = leaf.node->state->rollout();
+            tree->backpropagate(leaf.path, leaf.node, true_value, 1);
             continue;
         }
         
         // Unexplored leaf: apply virtual loss and enqueue
-        node->apply_virtual_loss(tree->get_virtual_loss());
+        tree->apply_virtual_loss(leaf.path, leaf.node, tree->get_virtual_loss());
         
         {
             std::lock_guard<std::mutex> lock(queue_mutex);
-            evaluation_queue.push_back(node);
+            evaluation_queue.push_back(std::move(leaf));
             if (evaluation_queue.size() >= (size_t)tree->get_batch_size()) {
                 paused.store(true);
             }
@@ -604,16 +1143,16 @@ void SearchThreadPool::stop_threads() {
     threads.clear();
 }
 
-std::vector<MCTS_node*> SearchThreadPool::take_queue() {
+std::vector<SearchLeaf> SearchThreadPool::take_queue() {
     std::lock_guard<std::mutex> lock(queue_mutex);
-    std::vector<MCTS_node*> result = evaluation_queue;
-    evaluation_queue.clear();
+    std::vector<SearchLeaf> result;
+    result.swap(evaluation_queue);
     return result;
 }
 
-void SearchThreadPool::add_to_queue(MCTS_node* node) {
+void SearchThreadPool::add_to_queue(const SearchLeaf& leaf) {
     std::lock_guard<std::mutex> lock(queue_mutex);
-    evaluation_queue.push_back(node);
+    evaluation_queue.push_back(leaf);
 }
 
 bool SearchThreadPool::is_stopped() {
@@ -628,20 +1167,241 @@ int SearchThreadPool::get_num_threads() {
     return num_threads;
 }
 
+/*** Multi-tree batched search ***/
+
+MultiTreeSearch::MultiTreeSearch(const vector<MCTS_tree *> &trees, size_t batch_size)
+        : trees(trees), batch_size(max((size_t) 1, batch_size)), batches(0), evaluations(0), occupancy(0.0),
+          search_seconds(0.0) {
+    for (MCTS_tree *tree : trees) {
+        SerializedPythonState *sps = dynamic_cast<SerializedPythonState *>(tree->root->get_state());
+        if (sps == NULL || !sps->has_evaluate_batch()) {
+            throw invalid_argument("MultiTreeSearch: every tree must hold a SerializedPythonState with evaluate_batch");
+        }
+    }
+}
+
+unsigned long MultiTreeSearch::search(const SearchBudget &budget, double exploration_constant) {
+    struct PendingLeaf {
+        size_t tree;
+        SearchLeaf leaf;
+    };
+    const size_t n = trees.size();
+    BudgetController overall(budget);        // deadline and cancellation, for all the trees at once
+    vector<BudgetController> controllers(n, overall);
+    vector<unsigned long> iterations(n, 0), pending(n, 0);
+    vector<bool> done(n, false), blocked(n, false);
+    batches = 0;
+    evaluations = 0;
+    occupancy = 0.0;
+    if (n == 0) return 0;
+    for (MCTS_tree *tree : trees) tree->search_iterations_saved = 0;
+    // thread_rng() stands in turn for the generator of the tree being worked on, and for the batch's
+    vector<Xoshiro256> tree_rngs;
+    uint64_t batch_seed = 0;
+    for (MCTS_tree *tree : trees) {
+        const uint64_t search_seed = tree->next_search_seed();
+        tree_rngs.emplace_back(search_seed);
+        batch_seed ^= mix_seed(search_seed, 0);
+    }
+    Xoshiro256 batch_rng(batch_seed);
+    Xoshiro256 *active_rng = NULL;
+    auto use_rng = [&active_rng](Xoshiro256 &rng) {
+        if (&rng == active_rng) return;
+        if (active_rng != NULL) *active_rng = thread_rng();
+        thread_rng() = rng;
+        active_rng = &rng;
+    };
+    // evaluate_batch is called on the first tree's root, it is given the states of all trees
+    SerializedPythonState *evaluator = dynamic_cast<SerializedPythonState *>(trees[0]->root->get_state());
+
+    for (unsigned long rounds = 0 ; ; rounds++) {
+        // the clock is read every round whatever the stride: a round may make no progress
+        if (rounds > 0 && overall.interrupted()) {
+            for (size_t t = 0 ; t < n ; t++) controllers[t].stop(overall.get_reason());
+            break;
+        }
+
+        // Selection: one leaf per tree and pass until the batch is full or no tree can give more
+        vector<PendingLeaf> batch;
+        fill(pending.begin(), pending.end(), 0);
+        fill(blocked.begin(), blocked.end(), false);
+        bool progress = true;
+        while (progress && batch.size() < batch_size) {
+            progress = false;
+            for (size_t t = 0 ; t < n && batch.size() < batch_size ; t++) {
+                if (done[t] || blocked[t]) continue;
+                MCTS_tree *tree = trees[t];
+                use_rng(tree_rngs[t]);
+                // pending leaves count against the iteration limit: they are backed up after this round. The smart
+                // stop only looks at the root before the tree's virtual losses distort its statistics
+                if (controllers[t].should_stop(iterations[t] + pending[t], tree->arena.size(), tree->get_memory_bytes())
+                    || (pending[t] == 0 && tree->early_stop(controllers[t], iterations[t]))) {
+                    blocked[t] = true;
+                    done[t] = pending[t] == 0;
+                    continue;
+                }
+                SearchLeaf leaf;
+                leaf.node = tree->select(exploration_constant, &leaf.path);
+                if (leaf.node == NULL) {
+                    controllers[t].stop(StopReason::EXHAUSTED);
+                    blocked[t] = true;
+                    done[t] = pending[t] == 0;
+                    continue;
+                }
+                if (leaf.node->is_terminal()) {
+                    tree->backpropagate(leaf.path, leaf.node, leaf.node->state->rollout(), 1);
+                    iterations[t]++;
+                    progress = true;
+                    continue;
+                }
+                bool duplicate = false;
+                for (size_t i = batch.size() ; i-- > 0 && !duplicate ;) {
+                    duplicate = batch[i].leaf.node == leaf.node;
+                }
+                if (duplicate) {        // the virtual losses did not steer selection elsewhere: wait for the batch
+                    blocked[t] = true;
+                    continue;
+                }
+                tree->apply_virtual_loss(leaf.path, leaf.node, tree->get_virtual_loss());
+                batch.push_back(PendingLeaf{t, std::move(leaf)});
+                pending[t]++;
+                progress = true;
+            }
+        }
+        if (batch.empty()) {
+            if (find(done.begin(), done.end(), false) == done.end()) break;
+            continue;
+        }
+
+        // Leaves reached through a new edge get their state now. Terminal ones and transpositions of evaluated
+        // nodes are resolved right away, as in MCTS_tree::grow_tree_batched
+        vector<PendingLeaf> to_evaluate;
+        vector<MCTS_state *> states;
+        for (PendingLeaf &pending_leaf : batch) {
+            MCTS_tree *tree = trees[pending_leaf.tree];
+            SearchLeaf &leaf = pending_leaf.leaf;
+            use_rng(tree_rngs[pending_leaf.tree]);
+            tree->remove_virtual_loss(leaf.path, leaf.node, tree->get_virtual_loss());
+            leaf.node = leaf.node->materialize();
+            if (leaf.node->is_terminal()) {
+                tree->backpropagate(leaf.path, leaf.node, leaf.node->state->rollout(), 1);
+                iterations[pending_leaf.tree]++;
+            } else if (leaf.node->is_evaluated) {
+                int visits = leaf.node->get_number_of_simulations();
+                tree->backpropagate(leaf.path, leaf.node, (visits > 0) ? leaf.node->get_score() / visits : 0.5, 1);
+                iterations[pending_leaf.tree]++;
+            } else {
+                states.push_back(leaf.node->get_state());
+                to_evaluate.push_back(std::move(pending_leaf));
+            }
+        }
+
+        // Evaluation of the whole batch, results scattered back to their trees
+        if (!states.empty()) {
+            use_rng(batch_rng);
+            vector<pair<double, vector<double> > > results = evaluator->evaluate_batch(states);
+            if (results.size() < states.size()) {
+                throw runtime_error("MultiTreeSearch: evaluate_batch returned " + to_string(results.size()) +
+                                    " results for " + to_string(states.size()) + " states");
+            }
+            for (size_t i = 0 ; i < to_evaluate.size() ; i++) {
+                MCTS_tree *tree = trees[to_evaluate[i].tree];
+                SearchLeaf &leaf = to_evaluate[i].leaf;
+                use_rng(tree_rngs[to_evaluate[i].tree]);
+                leaf.node->expand_with_priors(results[i].second);
+                tree->backpropagate(leaf.path, leaf.node, results[i].first, 1);
+                iterations[to_evaluate[i].tree]++;
+            }
+            batches++;
+            evaluations += states.size();
+        }
+        for (size_t t = 0 ; t < n ; t++) {
+            if (blocked[t] && controllers[t].get_reason() != StopReason::NONE) done[t] = true;
+        }
+    }
+
+    search_seconds = overall.elapsed_seconds();
+    occupancy = (batches > 0) ? (double) evaluations / ((double) batches * (double) batch_size) : 0.0;
+    for (size_t t = 0 ; t < n ; t++) {
+        trees[t]->stop_reason = controllers[t].get_reason();
+        trees[t]->search_iterations = iterations[t];
+        trees[t]->search_seconds = search_seconds;
+    }
+    return evaluations;
+}
+
 /*** MCTS agent ***/
-MCTS_agent::MCTS_agent(MCTS_state *starting_state, int max_iter, int max_seconds, double exploration_constant)
-: max_iter(max_iter), max_seconds(max_seconds), exploration_constant(exploration_constant),
-  batch_size(64), num_search_threads(4) {
+MCTS_agent::MCTS_agent(MCTS_state *starting_state, int max_iter, double max_seconds, double exploration_constant)
+: max_iter(max_iter), max_seconds(max_seconds), max_nodes(0), max_memory_bytes(0), early_stop(false),
+  early_stop_confidence(0.0), exploration_constant(exploration_constant),
+  batch_size(64), num_search_threads(4), parallel_mode("tree"), ponder_cancel(false), ponder_running(false),
+  ponder_seconds(0.0), ponder_iterations(0), reuse_ratio(0.0), search_cancel(false) {
     tree = new MCTS_tree(starting_state);
 }
 
+void MCTS_agent::set_parallel_mode(const string &mode) {
+    if (mode != "tree" && mode != "root") {
+        throw invalid_argument("parallel_mode must be \"tree\" or \"root\", got \"" + mode + "\"");
+    }
+    parallel_mode = mode;
+}
+
+void MCTS_agent::grow_root_parallel(const SearchBudget &budget) {
+    /** Root parallelism: every search thread grows its own tree from a copy of the root state, sharing nothing
+     * with the others, and the root statistics of all trees are merged into ours (which keeps its subtree for
+     * the next move) before picking the move. The iterations are split between the trees. */
+    const int trees = num_search_threads;
+    const long total = budget.max_iterations;
+    const uint64_t search_seed = tree->next_search_seed();
+    vector<MCTS_tree *> helpers(trees - 1, (MCTS_tree *) NULL);
+    vector<thread> threads;
+    for (int i = 1 ; i < trees ; i++) {
+        const long iterations = (total < 0) ? -1 : total / trees + ((i < total % trees) ? 1 : 0);
+        threads.emplace_back([this, &helpers, &budget, i, iterations, search_seed]() {
+            // MCTS_tree clones the state it is given, so each tree works on its own copy
+            MCTS_tree *helper = new MCTS_tree(const_cast<MCTS_state *>(tree->get_current_state()));
+            helper->set_num_search_threads(1);
+            helper->set_seed(mix_seed(search_seed, (uint64_t) i));
+            helper->set_transposition_table_size(tree->get_transposition_table_size());
+            SearchBudget share = budget;
+            share.max_iterations = iterations;
+            helper->grow_tree(share, exploration_constant);
+            helpers[i - 1] = helper;
+        });
+    }
+    tree->set_num_search_threads(1);
+    SearchBudget share = budget;
+    share.max_iterations = (total < 0) ? -1 : total / trees + ((total % trees > 0) ? 1 : 0);
+    tree->grow_tree(share, exploration_constant);
+    for (size_t i = 0 ; i < threads.size() ; i++) {
+        threads[i].join();
+    }
+    for (size_t i = 0 ; i < helpers.size() ; i++) {
+        tree->merge_root_statistics(*helpers[i]);
+        delete helpers[i];
+    }
+}
+
 const MCTS_move *MCTS_agent::genmove(const MCTS_move *enemy_move) {
+    return genmove(enemy_move, get_budget());
+}
+
+const MCTS_move *MCTS_agent::genmove(const MCTS_move *enemy_move, const SearchBudget &budget) {
+    if (!search(enemy_move, budget)) return NULL;
+    return play_best_move();
+}
+
+bool MCTS_agent::search(const MCTS_move *enemy_move, const SearchBudget &budget) {
+    stop_pondering();
+    search_cancel = false;             // a cancel_search() made while no search was running is void
     if (enemy_move != NULL) {
+        double visits = tree->get_root()->get_number_of_simulations();
         tree->advance_tree(enemy_move);
+        reuse_ratio = (visits > 0) ? tree->get_root()->get_number_of_simulations() / visits : 0.0;
     }
     // If game ended from opponent move, we can't do anything
     if (tree->get_current_state()->is_terminal()) {
-        return NULL;
+        return false;
     }
     // Pass batch config to tree
     tree->set_batch_size(batch_size);
@@ -650,11 +1410,26 @@ const MCTS_move *MCTS_agent::genmove(const MCTS_move *enemy_move) {
     cout << "___ DEBUG ______________________" << endl
          << "Growing tree..." << endl;
     #endif
-    tree->grow_tree(max_iter, max_seconds, exploration_constant);
+    SearchBudget cancellable = budget;
+    if (cancellable.cancel == NULL) cancellable.cancel = &search_cancel;
+    if (parallel_mode == "root" && num_search_threads > 1 && tree->supports_tree_parallelism()) {
+        grow_root_parallel(cancellable);
+    } else {
+        tree->grow_tree(cancellable, exploration_constant);
+    }
+    search_cancel = false;
     #ifdef DEBUG
     cout << "Tree size: " << tree->get_size() << endl
          << "________________________________" << endl;
     #endif
+    return true;
+}
+
+void MCTS_agent::cancel_search() {
+    search_cancel = true;
+}
+
+const MCTS_move *MCTS_agent::play_best_move() {
     MCTS_node *best_child = tree->select_best_child();
     if (best_child == NULL) {
         cerr << "Warning: Tree root has no children! Possibly terminal node!" << endl;
@@ -666,9 +1441,56 @@ const MCTS_move *MCTS_agent::genmove(const MCTS_move *enemy_move) {
 }
 
 MCTS_agent::~MCTS_agent() {
+    stop_pondering();
     delete tree;
 }
 
+void MCTS_agent::start_pondering() {
+    if (ponder_thread.joinable() || tree->get_current_state()->is_terminal()) return;
+    tree->set_batch_size(batch_size);
+    tree->set_num_search_threads(num_search_threads);
+    ponder_cancel = false;
+    ponder_running = true;
+    ponder_thread = thread(&MCTS_agent::ponder, this);
+}
+
+void MCTS_agent::stop_pondering() {
+    if (!ponder_thread.joinable()) return;
+    ponder_cancel = true;
+    if (PyGILState_Check()) {
+        py::gil_scoped_release release;       // the pondering thread may be waiting for the GIL
+        ponder_thread.join();
+    } else {
+        ponder_thread.join();
+    }
+}
+
+void MCTS_agent::ponder() {
+    /** Trees that can do without the GIL are searched in one search that runs until it is cancelled. The others
+     * need it throughout, so they are searched in short slices and the GIL is released between them for the other
+     * Python threads. */
+    SearchBudget budget(-1, -1.0, max_nodes, max_memory_bytes);
+    budget.cancel = &ponder_cancel;
+    const chrono::steady_clock::time_point start = chrono::steady_clock::now();
+    unsigned long iterations = 0;
+    if (!tree->needs_gil()) {
+        tree->grow_tree(budget, exploration_constant);
+        iterations = tree->get_search_iterations();
+    } else {
+        budget.max_seconds = PONDER_SLICE_SECONDS;
+        bool more = true;
+        while (more && !ponder_cancel) {
+            py::gil_scoped_acquire gil;
+            tree->grow_tree(budget, exploration_constant);
+            iterations += tree->get_search_iterations();
+            more = tree->get_stop_reason() == StopReason::TIME;      // else the tree cannot grow any further
+        }
+    }
+    ponder_iterations = iterations;
+    ponder_seconds = chrono::duration<double>(chrono::steady_clock::now() - start).count();
+    ponder_running = false;
+}
+
 const MCTS_state *MCTS_agent::get_current_state() const { return tree->get_current_state(); }
 
 void MCTS_agent::set_rollout_threads(unsigned int num_threads) {
@@ -2,6 +2,10 @@
 #define MCTS_PYTHON_H
 
 #include "state.h"
+#include "NodeArena.h"
+#include "TranspositionTable.h"
+#include "AtomicStat.h"
+#include "SearchBudget.h"
 #include <vector>
 #include <queue>
 #include <iomanip>
@@ -12,37 +16,92 @@
 #include <condition_variable>
 #include <atomic>
 #include <functional>
+#include <string>
 
-#define STARTING_NUMBER_OF_CHILDREN 32   // expected number so that we can preallocate this many pointers
+#define SELECTION_BLOCK_SIZE 64          // children scored per block in select_best_child (stack buffer size)
 // #define PARALLEL_ROLLOUTS                // Enable parallel rollouts with std::thread (DISABLED due to destructor issues)
 #define DEFAULT_NUMBER_OF_THREADS 1      // Default number of parallel rollout threads (disabled)
+#define PONDER_SLICE_SECONDS 0.01        // states that need the GIL ponder in slices of this long, releasing it in between
 
 using namespace std;
 
 /** Ideas for improvements:
  * - state should probably be const like move is (currently problematic because of Quoridor's example)
- * - Instead of a FIFO Queue use a Priority Queue with priority on most probable (better) actions to be explored first
-  or maybe this should just be an iterable and we let the implementation decide but these have no superclasses in C++ it seems
  * - vectors, queues and these structures allocate data on the heap anyway so there is little point in using the heap for them
  * so use stack instead?
  */
 
 class SearchThreadPool;
 
+class MCTS_node;
+class MCTS_tree;
+
+struct MCTS_edge {                      // a legal move out of a node
+    MCTS_move *move;                    // owned by the edge while untried, then by the child node (as its move)
+    MCTS_node *child;                   // NULL while untried
+    bool transposition;                 // child was found in the transposition table: the edge keeps owning its move
+    unsigned int action_order;          // index of the move in actions_to_try(), the edges being sorted by prior
+};
+
+struct MCTS_step {                      // one step of a selection path: a node and the edge followed out of it
+    MCTS_node *node;
+    unsigned int edge;
+};
+typedef vector<MCTS_step> MCTS_path;    // with transpositions a node has several parents, so backpropagation follows the path
+
+/**
+ * Statistics of many nodes (or edges) in struct-of-arrays form, entry i of every column belongs to row i. Filled in
+ * one pass by MCTS_node::collect_subtree (one row per node, parent and depth included) or
+ * MCTS_node::collect_edges (one row per edge of a node, parent and depth left empty).
+ */
+struct MCTS_arrays {
+    vector<int64_t> parent;             // row of the parent node, -1 for the first row
+    vector<uint64_t> move_id;           // get_id() of the move leading there (0 for the first row)
+    vector<uint32_t> visits;
+    vector<double> value_sum;           // score
+    vector<double> prior;
+    vector<uint32_t> depth;             // plies below the first row
+};
+
+
 class MCTS_node {
     bool terminal;
-    unsigned int size;
-    unsigned int number_of_simulations;
-    double score;                       // e.g. number of wins (could be int but double is more general if we use evaluation functions)
+    // Statistics are updated concurrently by the search threads (tree-parallel and batched search)
+    AtomicStat<unsigned int> size;
+    AtomicStat<unsigned int> number_of_simulations;
+    AtomicStat<double> score;           // e.g. number of wins (could be int but double is more general if we use evaluation functions)
     double prior_probability;           // prior probability for PUCT
     MCTS_state *state;                  // current state
     const MCTS_move *move;              // move to get here from parent node's state
-    mutable vector<MCTS_node *> children;
-    MCTS_node *parent;
-    queue<MCTS_move *> untried_actions;
-    vector<double> action_probabilities; // stored probabilities for untried actions
+    // One edge per legal move, sorted by prior (highest first). Edges [0, expanded) have a child node,
+    // the rest are untried and are expanded in order by advancing the cursor.
+    // Edges are only generated (actions_to_try()) once the node is first selected for expansion.
+    // Evaluated nodes (expand_with_priors) are the exception: every edge is selectable and a child
+    // is only created, without a state, once selection descends into its edge (see get_child).
+    // Both flags below publish the edges to concurrent selection, so they are only set once these are complete.
+    vector<MCTS_edge> edges;
+    atomic<bool> edges_generated;
+    atomic<unsigned int> expanded;      // expansion cursor (number of children for evaluated nodes)
+    atomic<bool> expanding;             // per-node expansion guard of tree-parallel search (see MCTS_tree::expand)
+    // Struct-of-arrays copy of the children's statistics (entry i belongs to edges[i]) so that
+    // selection scans contiguous memory instead of chasing child pointers.
+    vector<AtomicStat<double> > child_scores;
+    vector<AtomicStat<double> > child_visits;   // double so that the selection loop needs no int -> double conversions
+    vector<double> child_priors;
+    unsigned int index_in_parent;       // position of this node in parent's edges (and child_* arrays)
+    unsigned int depth;                 // plies from the tree's first root
+    uint64_t key;                       // state->hash() if the node is in the transposition table, else 0
+    MCTS_node *parent;                  // with transpositions: the parent the node was first reached from
     bool owns_state;                    // true if this node should delete the state in destructor
     bool is_evaluated;                  // true if this node has received its neural network evaluation (AlphaZero-style)
+    MCTS_tree *tree;                    // tree the node belongs to, children are allocated from its arena
+    void generate_edges();              // calls actions_to_try() (and priors) the first time, no-op afterwards
+    void init_edges(queue<MCTS_move *> *actions, const vector<double> &probs);
+    MCTS_node *expand_next();           // creates (or finds) the child of edges[expanded] and advances the cursor
+    int select_best_edge(double c) const;   // index of the edge selection should follow, -1 if there is none
+    MCTS_node *get_child(unsigned int i);   // child of edges[i], created without a state if it does not exist yet
+    void simulate(double &w, int &n) const;     // rollout(s) from this node's state
+    void add_stats(double w, int n);    // update own statistics and the parent's copy of them
     void backpropagate(double w, int n);
     
     // Configuration for parallel rollouts
@@ -50,10 +109,14 @@ class MCTS_node {
     
     friend class SearchThreadPool;
     friend class MCTS_tree;
+    friend class MultiTreeSearch;
+    friend class SelfPlayRunner;
     
 public:
+    // owns_state: adopt state (e.g. fresh from next_state()) instead of cloning it. Only user-supplied roots are cloned.
     MCTS_node(MCTS_node *parent, MCTS_state *state, const MCTS_move *move, bool owns_state = true, double prior_probability = 1.0);
-    ~MCTS_node();
+    MCTS_node(MCTS_node &&other);       // relocation (used when compacting the tree), leaves other empty
+    ~MCTS_node();                       // does not touch children, the arena destroys them
     bool is_fully_expanded() const;
     bool is_terminal() const;
     const MCTS_move *get_move() const;
@@ -62,13 +125,23 @@ public:
     unsigned int get_number_of_simulations() const { return number_of_simulations; }
     double get_score() const { return score; }
     MCTS_node *get_parent() const { return parent; }
-    const vector<MCTS_node *> &get_children() const { return children; }
+    vector<MCTS_node *> get_children() const;
+    // Breadth-first, starting with this node. With transpositions a node is listed once, under the parent it was
+    // first reached from. Not to be called during a search.
+    void collect_subtree(MCTS_arrays &out) const;
+    void collect_edges(MCTS_arrays &out) const;     // every edge, tried or not, in edge order (sorted by prior)
+    unsigned int get_number_of_children() const { return expanded.load(); }
+    unsigned int get_number_of_edges() const { return (unsigned int) edges.size(); }
     void expand();
     void rollout();
-    MCTS_node *select_best_child(double c) const;
+    MCTS_node *select_best_child(double c);     // the returned child always has its state
     MCTS_node *advance_tree(const MCTS_move *m);
     const MCTS_state *get_current_state() const;
     MCTS_state *get_state() { return state; }
+    bool is_materialized() const { return state != NULL; }
+    // Computes the state of a child created by get_child (needs the GIL). Returns the node to use from now on:
+    // itself, or the node it turned out to be a transposition of.
+    MCTS_node *materialize();
     void print_stats() const;
     double calculate_winrate(bool player1turn) const;
     
@@ -84,10 +157,13 @@ public:
     void expand_with_priors(const std::vector<double>& priors);
 };
 
-class MCTS_tree;
-
 class SearchThreadPool;
 
+struct SearchLeaf {                     // a leaf waiting for evaluation and the path selection took to it
+    MCTS_node *node;
+    MCTS_path path;
+};
+
 /**
  * SearchThreadPool: manages T search threads for batched MCTS.
  * Threads walk the tree, apply virtual losses, and push leaves to evaluation_queue.
@@ -98,7 +174,7 @@ class SearchThreadPool {
     std::mutex queue_mutex;
     std::condition_variable cv;
     std::condition_variable all_parked_cv;
-    std::vector<MCTS_node*> evaluation_queue;
+    std::vector<SearchLeaf> evaluation_queue;
     
     // State
     MCTS_tree* tree;
@@ -128,9 +204,9 @@ public:
     // Stop all threads
     void stop_threads();
     // Get the evaluation queue (thread-safe copy)
-    std::vector<MCTS_node*> take_queue();
-    // Add a node to the queue (thread-safe)
-    void add_to_queue(MCTS_node* node);
+    std::vector<SearchLeaf> take_queue();
+    // Add a leaf to the queue (thread-safe)
+    void add_to_queue(const SearchLeaf& leaf);
     // Check if all threads are stopped
     bool is_stopped();
     int get_parked_count();
@@ -139,21 +215,66 @@ public:
 
 class MCTS_tree {
     MCTS_node *root;
+    NodeArena<MCTS_node> arena;              // owns every node of the tree
+    TranspositionTable<MCTS_node> table;     // disabled (size 0) unless set_transposition_table_size() is called
+    AtomicStat<unsigned long> transposition_hits;
+    AtomicStat<unsigned long> nodes_created;         // nodes created since the tree was built
+    AtomicStat<unsigned long> move_generations;      // how many of them had to generate their moves
+    uint64_t seed;                           // search threads seed thread_rng() from it, random unless set_seed()
+    uint64_t searches;                       // searches started since the seed was set
+    StopReason stop_reason;                  // outcome of the last search
+    unsigned long search_iterations;
+    unsigned long search_iterations_saved;   // estimate of what the smart stop left of the budget
+    double search_seconds;
+    std::mutex expansion_mutex;              // guards child creation (arena and transposition table) by concurrent search threads
+    void compact();                          // relocate the tree rooted at root into a fresh arena
+    MCTS_node *find_transposition(const MCTS_state *state, unsigned int depth, uint64_t &key);
+    unsigned long grow_tree_parallel(BudgetController &controller, double exploration_constant, uint64_t search_seed);
+    unsigned long grow_tree_batched(BudgetController &controller, double exploration_constant);   // evaluate_batch states
+    bool early_stop(BudgetController &controller, unsigned long iterations);   // smart stop, see best_move_decided
+    friend class MCTS_node;
     int batch_size;
     int num_search_threads;
     double virtual_loss;
     friend class SearchThreadPool;
+    friend class MultiTreeSearch;
 public:
     MCTS_tree(MCTS_state *starting_state);
     ~MCTS_tree();
-    MCTS_node *select(double c=1.41);        // select child node to expand according to tree policy (UCT)
+    MCTS_node *select(double c=1.41, MCTS_path *path = NULL);   // select child node to expand according to tree policy (UCT)
+    MCTS_node *expand(MCTS_node *leaf, MCTS_path &path);        // expands leaf (extending path), returns the node to simulate from
+    void backpropagate(const MCTS_path &path, MCTS_node *leaf, double w, int n);
+    void apply_virtual_loss(const MCTS_path &path, MCTS_node *leaf, double v);
+    void remove_virtual_loss(const MCTS_path &path, MCTS_node *leaf, double v);
     MCTS_node *select_best_child();          // select the most promising child of the root node
+    void merge_root_statistics(const MCTS_tree &other);     // add other's root edge statistics to ours (same root state)
+    bool supports_tree_parallelism() const;  // true if the states never call into Python (no GIL needed)
+    bool needs_gil() const;                  // true if the search must hold the GIL throughout (see definition)
     void grow_tree(int max_iter, double max_time_in_seconds, double exploration_constant = 1.41);
+    void grow_tree(const SearchBudget &budget, double exploration_constant = 1.41);
     void advance_tree(const MCTS_move *move);      // if the move is applicable advance the tree, else start over
     unsigned int get_size() const;
     const MCTS_state *get_current_state() const;
     void print_stats() const;
     MCTS_node *get_root() const { return root; }
+    MCTS_arrays to_arrays() const;           // statistics of every node, see MCTS_node::collect_subtree
+    size_t get_arena_size() const { return arena.size(); }      // nodes allocated (including discarded ones until compaction)
+    size_t get_arena_bytes() const { return arena.bytes(); }
+    size_t get_memory_bytes() const { return arena.bytes() + table.bytes(); }   // what max_memory_bytes limits
+    unsigned long get_nodes_created() const { return nodes_created; }
+    unsigned long get_move_generations() const { return move_generations; }
+    unsigned long get_nodes_without_moves() const { return nodes_created - move_generations; }  // never called actions_to_try()
+    void set_transposition_table_size(size_t max_entries);      // 0 disables transpositions
+    size_t get_transposition_table_size() const { return table.capacity(); }
+    size_t get_transposition_entries() const { return table.size(); }
+    unsigned long get_transposition_hits() const { return transposition_hits; }
+    void set_seed(uint64_t s) { seed = s; searches = 0; }     // makes the following searches reproducible
+    uint64_t get_seed() const { return seed; }
+    uint64_t next_search_seed() { return mix_seed(seed, searches++); }  // base seed of the next search
+    StopReason get_stop_reason() const { return stop_reason; }
+    unsigned long get_search_iterations() const { return search_iterations; }
+    unsigned long get_search_iterations_saved() const { return search_iterations_saved; }
+    double get_search_seconds() const { return search_seconds; }
     
     // Batched search configuration
     void set_batch_size(int size) { batch_size = size; }
@@ -166,24 +287,110 @@ public:
     double get_virtual_loss() const { return this->virtual_loss; }
 };
 
+/**
+ * MultiTreeSearch: batched search over many trees at once (e.g. the games of a self-play run), for states with
+ * evaluate_batch. Every round selects leaves from all the trees, round robin, into one batch, evaluates it with a
+ * single evaluate_batch call and hands each result back to its own tree (expand_with_priors and backpropagation).
+ * Notes:
+ * - Each tree applies its own virtual loss to the leaves it has in the batch, so a tree can give several leaves per
+ * round. A tree stops giving leaves for the round when selection returns one that is already in the batch.
+ * - Every tree has its own copy of the budget. An iteration of a tree is a leaf backed up in it, evaluated or
+ * terminal. The trees' stop_reason, search_iterations and search_time describe their part of the last search.
+ * - The trees are not owned, nor used from other threads meanwhile. Python is only entered through the states, which
+ * take the GIL themselves.
+ * - The work of a tree (its states' next_state(), actions_to_try()...) draws from its own stream of thread_rng(),
+ * seeded from the tree's seed as in MCTS_tree::grow_tree, wherever the tree is in the list. evaluate_batch, which is
+ * given the states of all the trees, draws from a stream of all their seeds (in any order).
+ */
+class MultiTreeSearch {
+    vector<MCTS_tree *> trees;
+    size_t batch_size;                       // leaves per evaluate_batch call, at most
+    // outcome of the last search
+    unsigned long batches;                   // evaluate_batch calls
+    unsigned long evaluations;               // leaves evaluated by them
+    double occupancy;                        // mean share of the batch they filled
+    double search_seconds;
+public:
+    MultiTreeSearch(const vector<MCTS_tree *> &trees, size_t batch_size = 256);
+    unsigned long search(const SearchBudget &budget, double exploration_constant = 1.41);   // returns evaluations
+    const vector<MCTS_tree *> &get_trees() const { return trees; }
+    void set_batch_size(size_t size) { batch_size = max((size_t) 1, size); }
+    size_t get_batch_size() const { return batch_size; }
+    unsigned long get_batches() const { return batches; }
+    unsigned long get_evaluations() const { return evaluations; }
+    double get_search_seconds() const { return search_seconds; }
+    double get_occupancy() const { return occupancy; }
+    double get_evaluations_per_second() const {
+        return (search_seconds > 0.0) ? (double) evaluations / search_seconds : 0.0;
+    }
+};
+
 class MCTS_agent {                           // example of an agent based on the MCTS_tree. One can also use the tree directly.
     MCTS_tree *tree;
-    int max_iter, max_seconds;
+    int max_iter;
+    double max_seconds;
+    size_t max_nodes, max_memory_bytes;      // 0: unlimited
+    bool early_stop;                         // smart stop (see SearchBudget)
+    double early_stop_confidence;
     double exploration_constant;
     
     // Batched search configuration
     int batch_size;
     int num_search_threads;
+    string parallel_mode;                    // "tree": threads share one tree, "root": one independent tree per thread
+    void grow_root_parallel(const SearchBudget &budget);
+
+    // Pondering: a background thread grows the tree during the opponent's turn (see start_pondering)
+    thread ponder_thread;
+    atomic<bool> ponder_cancel;
+    atomic<bool> ponder_running;
+    double ponder_seconds;                   // of the last pondering session
+    unsigned long ponder_iterations;
+    double reuse_ratio;                      // share of the root's visits kept when advancing to the enemy's last move
+    void ponder();                           // body of the pondering thread
+    atomic<bool> search_cancel;              // raised by cancel_search(), unless the budget brings its own flag
     
 public:
-    MCTS_agent(MCTS_state *starting_state, int max_iter = 100000, int max_seconds = 30, double exploration_constant = 1.41);
+    MCTS_agent(MCTS_state *starting_state, int max_iter = 100000, double max_seconds = 30, double exploration_constant = 1.41);
     ~MCTS_agent();
-    const MCTS_move *genmove(const MCTS_move *enemy_move);
+    const MCTS_move *genmove(const MCTS_move *enemy_move);      // stops pondering first
+    const MCTS_move *genmove(const MCTS_move *enemy_move, const SearchBudget &budget);
+    // genmove() in two steps: search() applies the enemy move and grows the tree (false if the game is over),
+    // play_best_move() picks the move and advances the tree to it
+    bool search(const MCTS_move *enemy_move, const SearchBudget &budget);
+    const MCTS_move *play_best_move();
+    void cancel_search();                    // from another thread: end the running search, its best move stands
     const MCTS_state *get_current_state() const;
     MCTS_tree *get_tree() const { return tree; }
     void feedback() const { tree->print_stats(); }
     void set_exploration_constant(double c);
     double get_exploration_constant() const;
+
+    // Search budget: the search stops at the first limit reached
+    void set_max_iter(int n) { max_iter = n; }
+    int get_max_iter() const { return max_iter; }
+    void set_max_seconds(double s) { max_seconds = s; }
+    double get_max_seconds() const { return max_seconds; }
+    void set_max_nodes(size_t n) { max_nodes = n; }
+    size_t get_max_nodes() const { return max_nodes; }
+    void set_max_memory_bytes(size_t b) { max_memory_bytes = b; }
+    size_t get_max_memory_bytes() const { return max_memory_bytes; }
+    void set_early_stop(bool enabled) { early_stop = enabled; }
+    bool get_early_stop() const { return early_stop; }
+    void set_early_stop_confidence(double confidence) { early_stop_confidence = confidence; }
+    double get_early_stop_confidence() const { return early_stop_confidence; }
+    SearchBudget get_budget() const {
+        return SearchBudget(max_iter, max_seconds, max_nodes, max_memory_bytes, early_stop, early_stop_confidence);
+    }
+
+    // Pondering: grow the tree from the current root in the background until genmove() or stop_pondering(), e.g.
+    // while the opponent thinks. The tree must not be used meanwhile. Only the node and memory limits apply.
+    void start_pondering();
+    void stop_pondering();                   // releases the GIL while it waits for the pondering thread
+    bool is_pondering() const { return ponder_running; }
+    double get_ponder_seconds() const { return ponder_seconds; }
+    unsigned long get_ponder_iterations() const { return ponder_iterations; }
+    double get_reuse_ratio() const { return reuse_ratio; }
     
     // Configure parallel rollouts for this agent's tree
     void set_rollout_threads(unsigned int num_threads);
@@ -194,10 +401,18 @@ public:
     int get_batch_size() const { return batch_size; }
    void set_num_search_threads(int n) { num_search_threads = n; }
     int get_num_search_threads() const { return num_search_threads; }
+    void set_parallel_mode(const string &mode);      // "tree" or "root", see parallel_mode
+    const string &get_parallel_mode() const { return parallel_mode; }
 
     // Virtual loss configuration (delegated to tree)
     void set_virtual_loss(double v) { tree->set_virtual_loss(v); }
     double get_virtual_loss() const { return tree->get_virtual_loss(); }
+
+    // Transposition table configuration (delegated to tree)
+    void set_transposition_table_size(size_t max_entries) { tree->set_transposition_table_size(max_entries); }
+    size_t get_transposition_table_size() const { return tree->get_transposition_table_size(); }
+    void set_seed(uint64_t s) { tree->set_seed(s); }
+    uint64_t get_seed() const { return tree->get_seed(); }
 };
 
 // Utility functions for parallel rollouts
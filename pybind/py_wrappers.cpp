@@ -1,20 +1,230 @@
 #include "py_wrappers.h"
+#include <pybind11/numpy.h>
 #include <iostream>
 #include <stdexcept>
+#include <cstring>
+
+std::atomic<unsigned long> python_crossings(0);
+
+uint64_t python_state_key(py::handle key) {
+    uint64_t k;
+    if (py::isinstance<py::int_>(key)) {
+        k = (uint64_t) PyLong_AsUnsignedLongLongMask(key.ptr());
+    } else {
+        k = (uint64_t) py::hash(key);
+    }
+    return (k != 0) ? k : 1;
+}
+
+namespace {
+
+/**
+ * Read-only view of a 1-D or 2-D buffer (NumPy array, memoryview...) of float32, float64, bool or integers, with any
+ * strides. Elements are read in place, nothing is copied or converted up front. name prefixes the error messages.
+ */
+class BufferView {
+    py::buffer_info info;
+    char kind;                              // 'f' float32, 'd' float64, '?' bool, 'i' signed or 'u' unsigned integer
+public:
+    BufferView(py::handle object, py::ssize_t ndim, const std::string &name) {
+        if (!py::isinstance<py::buffer>(object)) {
+            throw std::invalid_argument(name + " does not support the buffer protocol");
+        }
+        info = py::reinterpret_borrow<py::buffer>(object).request();
+        std::string format = info.format;
+        if (format.size() == 2 && (format[0] == '<' || format[0] == '=' || format[0] == '@')) format = format.substr(1);
+        const bool integer_size = info.itemsize == 1 || info.itemsize == 2 || info.itemsize == 4 || info.itemsize == 8;
+        if (format == "f") kind = 'f';
+        else if (format == "d") kind = 'd';
+        else if (format == "?") kind = '?';
+        else if (format.size() == 1 && std::string("bhilq").find(format[0]) != std::string::npos && integer_size) kind = 'i';
+        else if (format.size() == 1 && std::string("BHILQ").find(format[0]) != std::string::npos && integer_size) kind = 'u';
+        else throw std::invalid_argument(name + " has format '" + info.format + "', expected float32, float64, bool "
+                                         "or integers");
+        if (info.ndim != ndim) {
+            throw std::invalid_argument(name + " has " + std::to_string(info.ndim) + " dimensions, expected " +
+                                        std::to_string(ndim));
+        }
+    }
+    py::ssize_t rows() const { return info.shape[0]; }
+    py::ssize_t columns() const { return (info.ndim == 2) ? info.shape[1] : 1; }
+    bool is_bool() const { return kind == '?'; }
+    double at(py::ssize_t i, py::ssize_t j = 0) const {
+        const char *p = (const char *) info.ptr + i * info.strides[0] + ((info.ndim == 2) ? j * info.strides[1] : 0);
+        switch (kind) {
+            case 'f': return *(const float *) p;
+            case 'd': return *(const double *) p;
+            case '?': return (*(const uint8_t *) p != 0) ? 1.0 : 0.0;
+            case 'i':
+                switch (info.itemsize) {
+                    case 1: return *(const int8_t *) p;
+                    case 2: return *(const int16_t *) p;
+                    case 4: return *(const int32_t *) p;
+                    default: return (double) *(const int64_t *) p;
+                }
+            default:
+                switch (info.itemsize) {
+                    case 1: return *(const uint8_t *) p;
+                    case 2: return *(const uint16_t *) p;
+                    case 4: return *(const uint32_t *) p;
+                    default: return (double) *(const uint64_t *) p;
+                }
+        }
+    }
+};
+
+/** Priors given as a 1-D buffer or a sequence of numbers. */
+std::vector<double> read_priors(py::handle priors) {
+    std::vector<double> result;
+    if (py::isinstance<py::buffer>(priors)) {
+        BufferView view(priors, 1, "priors");
+        result.resize((size_t) view.rows());
+        for (py::ssize_t i = 0 ; i < view.rows() ; i++) result[(size_t) i] = view.at(i);
+        return result;
+    }
+    for (auto item : priors) {
+        result.push_back(item.cast<double>());
+    }
+    return result;
+}
+
+}
+
+// BatchEncoder implementation
+BatchEncoder::BatchEncoder() : buffer(py::none()), data(NULL), capacity(0), row_size(0) {}
+
+BatchEncoder::~BatchEncoder() {
+    if (!Py_IsInitialized()) {
+        buffer.release();                   // the interpreter is gone, nothing left to decref
+        return;
+    }
+    py::gil_scoped_acquire gil;
+    buffer = py::object();
+}
+
+py::object BatchEncoder::encode(const std::vector<MCTS_state*>& states, const std::vector<py::ssize_t>& row_shape,
+                                bool python_encode_into) {
+    size_t size = 1;
+    for (py::ssize_t dimension : row_shape) {
+        size *= (size_t) dimension;
+    }
+    const size_t n = states.size();
+    if (buffer.is_none() || n > capacity || row_shape != shape) {
+        capacity = std::max(n, (row_shape == shape) ? 2 * capacity : (size_t) 0);
+        shape = row_shape;
+        row_size = size;
+        std::vector<py::ssize_t> buffer_shape(1, (py::ssize_t) capacity);
+        buffer_shape.insert(buffer_shape.end(), shape.begin(), shape.end());
+        py::array_t<float> array(buffer_shape);
+        data = array.mutable_data();
+        buffer = array;
+    }
+    memset(data, 0, n * row_size * sizeof(float));
+    for (size_t i = 0 ; i < n ; i++) {
+        const SerializedPythonState *sps = dynamic_cast<const SerializedPythonState*>(states[i]);
+        if (sps != NULL && python_encode_into) {
+            count_python_crossing();
+            sps->get_python_state().attr("encode_into")(buffer, i);
+        } else if (!states[i]->encode_into(data + i * row_size, row_size)) {
+            throw std::invalid_argument("evaluate_batch: a state could not be encoded into " +
+                                        std::to_string(row_size) + " values (encoding_shape)");
+        }
+    }
+    return buffer[py::slice(0, (py::ssize_t) n, 1)];
+}
+
+PythonGame::~PythonGame() {
+    if (!Py_IsInitialized()) {
+        for (auto &move : moves) move.second.release();     // the interpreter is gone, nothing left to decref
+        return;
+    }
+    py::gil_scoped_acquire gil;
+    moves.clear();
+}
+
+const PythonStateClass &PythonStateClass::of(py::handle python_state) {
+    // never destroyed: the classes it keeps alive must not be released after the interpreter is gone
+    static auto *classes = new std::unordered_map<PyObject *, std::pair<py::object, PythonStateClass>>();
+    py::handle type = (PyObject *) Py_TYPE(python_state.ptr());
+    auto found = classes->find(type.ptr());
+    if (found != classes->end()) {
+        return found->second.second;
+    }
+    py::object defaults = py::type::of<MCTS_state>();
+    auto defines = [&](const char *name) {
+        count_python_crossing();
+        py::object method = py::getattr(type, name, py::none());
+        return !method.is_none() && !method.is(py::getattr(defaults, name, py::none()));
+    };
+    PythonStateClass methods;
+    methods.describe = defines("describe");
+    methods.evaluate_batch = defines("evaluate_batch");
+    methods.get_action_probabilities = defines("get_action_probabilities");
+    methods.state_key = defines("state_key");
+    methods.encode = defines("encode");
+    methods.encode_into = defines("encode_into");
+    count_python_crossing();
+    py::object shape = py::getattr(type, "encoding_shape", py::none());
+    methods.encoding_shape = !shape.is_none();
+    if (methods.encoding_shape) {
+        for (auto dimension : shape) {
+            methods.row_shape.push_back(dimension.cast<py::ssize_t>());
+        }
+    }
+    // emplace keeps the first entry if a probe let another thread register the class meanwhile
+    return classes->emplace(type.ptr(), std::make_pair(py::reinterpret_borrow<py::object>(type), methods))
+        .first->second.second;
+}
 
 // SerializedPythonState implementation
-SerializedPythonState::SerializedPythonState(py::object python_state) 
-    : python_state(python_state) {
+SerializedPythonState::SerializedPythonState(py::object python_state, std::shared_ptr<PythonGame> game)
+    : python_state(python_state), has_cached_key(false), cached_key(0),
+      game(game ? game : std::make_shared<PythonGame>()) {
     // Acquire the GIL since we are calling python methods to cache values
     py::gil_scoped_acquire gil;
+    methods = &PythonStateClass::of(python_state);
+    cached_has_evaluate_batch = methods->evaluate_batch;
+    
+    if (methods->describe) {
+        try {
+            count_python_crossing();
+            py::tuple described = python_state.attr("describe")();
+            if (described.size() != 5) {
+                throw std::invalid_argument("describe() returned " + std::to_string(described.size()) +
+                                            " values, expected (terminal, self_turn, terminal_value, actions, priors)");
+            }
+            cached_is_terminal = described[0].cast<bool>();
+            cached_is_self_side_turn = described[1].cast<bool>();
+            cached_rollout_value = 0.5;
+            if (cached_is_terminal) {
+                py::object value = described[2];
+                if (!value.is_none()) {
+                    cached_rollout_value = value.cast<double>();
+                } else {
+                    count_python_crossing();
+                    cached_rollout_value = python_state.attr("rollout")().cast<double>();
+                }
+            } else {
+                described_actions = described[3];
+                described_priors = described[4];
+            }
+            return;
+        } catch (const std::exception& e) {
+            std::cerr << "Error in SerializedPythonState::describe: " << e.what() << std::endl;
+            described_actions = py::object();
+            described_priors = py::object();
+        }
+    }
     
     try {
+        count_python_crossing();
         cached_is_terminal = python_state.attr("is_terminal")().cast<bool>();
     } catch (const std::exception& e) {
         cached_is_terminal = true;
     }
     
     try {
+        count_python_crossing();
         cached_is_self_side_turn = python_state.attr("is_self_side_turn")().cast<bool>();
     } catch (const std::exception& e) {
         cached_is_self_side_turn = true;
@@ -22,6 +232,7 @@ SerializedPythonState::SerializedPythonState(py::object python_state)
     
     if (cached_is_terminal) {
         try {
+            count_python_crossing();
             cached_rollout_value = python_state.attr("rollout")().cast<double>();
         } catch (const std::exception& e) {
             cached_rollout_value = 0.5;
@@ -31,20 +242,98 @@ SerializedPythonState::SerializedPythonState(py::object python_state)
     }
 }
 
+SerializedPythonState::~SerializedPythonState() {
+    if (!Py_IsInitialized()) {
+        python_state.release();             // the interpreter is gone, nothing left to decref
+        described_actions.release();
+        described_priors.release();
+        return;
+    }
+    py::gil_scoped_acquire gil;
+    python_state = py::object();
+    described_actions = py::object();
+    described_priors = py::object();
+}
+
+size_t SerializedPythonState::action_space_size() const {
+    if (game->action_space_size < 0) {
+        py::gil_scoped_acquire gil;
+        long size = 0;
+        try {
+            count_python_crossing();
+            py::object attribute = py::getattr(python_state, "action_space_size", py::none());
+            if (!attribute.is_none()) size = std::max(0L, attribute.cast<long>());
+        } catch (const std::exception& e) {
+            std::cerr << "Error in SerializedPythonState::action_space_size: " << e.what() << std::endl;
+        }
+        game->action_space_size = size;
+    }
+    return (size_t) game->action_space_size;
+}
+
+std::queue<MCTS_move*>* SerializedPythonState::legal_actions(py::handle legal) const {
+    /** legal: what legal_actions() gives, action indices or a mask of action_space_size bools, as a buffer or a
+     * sequence. */
+    const long size = (long) action_space_size();
+    std::vector<long> actions;
+    if (py::isinstance<py::buffer>(legal)) {
+        BufferView view(legal, 1, "legal_actions()");
+        const bool mask = view.is_bool();
+        for (py::ssize_t i = 0 ; i < view.rows() ; i++) {
+            if (!mask) {
+                actions.push_back((long) view.at(i));
+            } else if (view.at(i) != 0.0) {
+                actions.push_back((long) i);
+            }
+        }
+    } else {
+        long i = 0;
+        for (auto item : legal) {
+            if (!py::isinstance<py::bool_>(item)) {
+                actions.push_back(item.cast<long>());
+            } else if (item.cast<bool>()) {
+                actions.push_back(i);
+            }
+            i++;
+        }
+    }
+    std::queue<MCTS_move*>* queue = new std::queue<MCTS_move*>();
+    for (long action : actions) {
+        if (action < 0 || action >= size) {
+            while (!queue->empty()) {
+                delete queue->front();
+                queue->pop();
+            }
+            delete queue;
+            throw std::out_of_range("legal_actions(): action " + std::to_string(action) + " is outside the action "
+                                    "space of " + std::to_string(size));
+        }
+        queue->push(new ActionMove(action));
+    }
+    return queue;
+}
+
 std::queue<MCTS_move*>* SerializedPythonState::actions_to_try() const {
+    py::gil_scoped_acquire gil;
     try {
-        py::list py_moves = python_state.attr("actions_to_try")();
-        
-        // Clear previous cache and rebuild it
-        cached_python_moves.clear();
+        const bool described = described_actions && !described_actions.is_none();
+        if (action_space_size() > 0) {
+            if (described) {
+                return legal_actions(described_actions);
+            }
+            count_python_crossing();
+            return legal_actions(python_state.attr("legal_actions")());
+        }
+        py::object py_moves = described_actions;
+        if (!described) {
+            count_python_crossing();
+            py_moves = python_state.attr("actions_to_try")();
+        }
         
         std::queue<MCTS_move*>* queue = new std::queue<MCTS_move*>();
         for (auto item : py_moves) {
-            // Create C++ wrapper for each Python move
-            PythonMoveWrapper* cpp_move = new PythonMoveWrapper(py::reinterpret_borrow<py::object>(item));
-            queue->push(cpp_move);
-            // Cache the Python object to keep it alive
-            cached_python_moves.push_back(py::reinterpret_borrow<py::object>(item));
+            // Create C++ wrapper for each Python move, it keeps the Python object (or the interned one) alive
+            queue->push(new PythonMoveWrapper(py::reinterpret_borrow<py::object>(item), &game->moves));
         }
         return queue;
     } catch (const std::exception& e) {
@@ -54,23 +343,27 @@ std::queue<MCTS_move*>* SerializedPythonState::actions_to_try() const {
 }
 
 MCTS_state* SerializedPythonState::next_state(const MCTS_move* move) const {
+    py::gil_scoped_acquire gil;
     try {
         // Extract the Python move from the wrapper
         const PythonMoveWrapper* wrapper = dynamic_cast<const PythonMoveWrapper*>(move);
         py::object py_move;
         
-        if (wrapper) {
+        if (move->action_index() >= 0) {
+            py_move = py::int_(move->action_index());      // fixed action space: the action index
+        } else if (wrapper) {
             py_move = wrapper->get_python_move();
         } else {
             // Fallback for non-wrapper moves (shouldn't happen in normal usage)
             py_move = py::cast(move, py::return_value_policy::reference);
         }
         
+        count_python_crossing();
         py::object new_py_state = python_state.attr("next_state")(py_move);
-        return new SerializedPythonState(new_py_state);
+        return new SerializedPythonState(new_py_state, game);
     } catch (const std::exception& e) {
         std::cerr << "Error in SerializedPythonState::next_state: " << e.what() << std::endl;
-        return new SerializedPythonState(python_state);
+        return new SerializedPythonState(python_state, game);
     }
 }
 
@@ -83,7 +376,9 @@ bool SerializedPythonState::is_terminal() const {
 }
 
 void SerializedPythonState::print() const {
+    py::gil_scoped_acquire gil;
     try {
+        count_python_crossing();
         python_state.attr("print")();
     } catch (const std::exception& e) {
         std::cout << "SerializedPythonState (print error: " << e.what() << ")" << std::endl;
@@ -94,25 +389,57 @@ bool SerializedPythonState::is_self_side_turn() const {
     return cached_is_self_side_turn;
 }
 
+uint64_t SerializedPythonState::hash() const {
+    if (!has_cached_key) {
+        py::gil_scoped_acquire gil;
+        cached_key = 0;           // states without state_key() never share nodes
+        try {
+            if (methods->state_key) {
+                count_python_crossing();
+                cached_key = python_state_key(python_state.attr("state_key")());
+            }
+        } catch (const std::exception& e) {
+            std::cerr << "Error in SerializedPythonState::hash: " << e.what() << std::endl;
+        }
+        has_cached_key = true;
+    }
+    return cached_key;
+}
+
+std::vector<double> SerializedPythonState::encode() const {
+    py::gil_scoped_acquire gil;
+    try {
+        if (methods->encode) {
+            count_python_crossing();
+            return python_state.attr("encode")().cast<std::vector<double>>();
+        }
+    } catch (const std::exception& e) {
+        std::cerr << "Error in SerializedPythonState::encode: " << e.what() << std::endl;
+    }
+    return std::vector<double>();
+}
+
 MCTS_state* SerializedPythonState::clone() const {
+    py::gil_scoped_acquire gil;
     try {
+        count_python_crossing();
         py::object cloned = python_state.attr("clone")();
-        return new SerializedPythonState(cloned);
+        return new SerializedPythonState(cloned, game);
     } catch (const std::exception& e) {
         std::cerr << "Error in SerializedPythonState::clone: " << e.what() << std::endl;
-        return new SerializedPythonState(python_state);
+        return new SerializedPythonState(python_state, game);
     }
 }
 
 std::vector<double> SerializedPythonState::get_action_probabilities() const {
+    py::gil_scoped_acquire gil;
     try {
-        if (py::hasattr(python_state, "get_action_probabilities")) {
-            py::list py_probs = python_state.attr("get_action_probabilities")();
-            std::vector<double> result;
-            for (auto item : py_probs) {
-                result.push_back(item.cast<double>());
-            }
-            return result;
+        if (described_priors && !described_priors.is_none()) {
+            return read_priors(described_priors);
+        }
+        if (methods->get_action_probabilities) {
+            count_python_crossing();
+            return read_priors(python_state.attr("get_action_probabilities")());
         }
     } catch (const std::exception& e) {
         std::cerr << "Error in SerializedPythonState::get_action_probabilities: " << e.what() << std::endl;
@@ -120,14 +447,56 @@ std::vector<double> SerializedPythonState::get_action_probabilities() const {
     return std::vector<double>();
 }
 
+namespace {
+
+/** Results of the array protocol: (values[N], priors[N, A]) or (values, priors, legal[N, A]). The priors of a row
+ * are normalized over its legal columns (all of them without a mask), uniform if they sum to zero. */
+std::vector<std::pair<double, std::vector<double>>> read_batch_arrays(const py::tuple &arrays, size_t n) {
+    BufferView values(arrays[0], 1, "evaluate_batch: values");
+    BufferView priors(arrays[1], 2, "evaluate_batch: priors");
+    const bool masked = arrays.size() == 3 && !arrays[2].is_none();
+    BufferView legal(arrays[masked ? 2 : 1], 2, "evaluate_batch: legal");      // unused without a mask
+    const py::ssize_t a = priors.columns();
+    if (values.rows() != (py::ssize_t) n || priors.rows() != (py::ssize_t) n ||
+        (masked && (legal.rows() != (py::ssize_t) n || legal.columns() != a))) {
+        throw std::invalid_argument("evaluate_batch: expected values[" + std::to_string(n) + "] and priors[" +
+                                    std::to_string(n) + ", A] (and legal of the shape of priors)");
+    }
+    std::vector<std::pair<double, std::vector<double>>> results(n);
+    for (size_t i = 0 ; i < n ; i++) {
+        results[i].first = values.at((py::ssize_t) i);
+        std::vector<double> &row = results[i].second;
+        row.resize((size_t) a);
+        double total = 0.0, legal_count = 0.0;
+        for (py::ssize_t j = 0 ; j < a ; j++) {
+            const double is_legal = (!masked || legal.at((py::ssize_t) i, j) != 0.0) ? 1.0 : 0.0;
+            row[j] = is_legal * priors.at((py::ssize_t) i, j);
+            total += row[j];
+            legal_count += is_legal;
+        }
+        for (py::ssize_t j = 0 ; j < a ; j++) {
+            if (total > 0.0) {
+                row[j] /= total;
+            } else {
+                const bool is_legal = !masked || legal.at((py::ssize_t) i, j) != 0.0;
+                row[j] = (legal_count > 0.0 && is_legal) ? 1.0 / legal_count : 0.0;
+            }
+        }
+    }
+    return results;
+}
+
+}
+
 std::vector<std::pair<double, std::vector<double>>> SerializedPythonState::evaluate_batch(const std::vector<MCTS_state*>& states) const {
     std::vector<std::pair<double, std::vector<double>>> results;
     if (states.empty()) {
         return results;
     }
+    py::gil_scoped_acquire gil;
     
     // Check if the Python state object has evaluate_batch method
-    if (!py::hasattr(python_state, "evaluate_batch")) {
+    if (!cached_has_evaluate_batch) {
         return results;
     }
     
@@ -143,10 +512,26 @@ std::vector<std::pair<double, std::vector<double>>> SerializedPythonState::evalu
             }
         }
         
-        // Call the Python batch method
-        py::list py_results = python_state.attr("evaluate_batch")(py_states);
+        // Call the Python batch method, with the input tensor if the states declare the shape of their encoding
+        py::object py_output;
+        count_python_crossing();
+        if (!methods->encoding_shape) {
+            py_output = python_state.attr("evaluate_batch")(py_states);
+        } else {
+            py::object inputs = game->encoder.encode(states, methods->row_shape, methods->encode_into);
+            py_output = python_state.attr("evaluate_batch")(py_states, inputs);
+        }
+        
+        // Array protocol: a tuple of arrays, read through the buffer protocol
+        if (py::isinstance<py::tuple>(py_output)) {
+            py::tuple arrays = py_output.cast<py::tuple>();
+            if ((arrays.size() == 2 || arrays.size() == 3) && py::isinstance<py::buffer>(arrays[0])) {
+                return read_batch_arrays(arrays, states.size());
+            }
+        }
         
         // Parse results: each element is a tuple (value, [priors])
+        py::list py_results = py_output.cast<py::list>();
         for (auto item : py_results) {
             py::tuple entry = item.cast<py::tuple>();
             double value = entry[0].cast<double>();
@@ -166,19 +551,15 @@ std::vector<std::pair<double, std::vector<double>>> SerializedPythonState::evalu
 }
 
 py::object SerializedPythonState::find_python_move(const MCTS_move* cpp_move) const {
-    // Search through cached Python moves to find the one that matches using value comparison
-    for (const auto& py_move : cached_python_moves) {
-        try {
-            MCTS_move* cached_cpp_move = py_move.cast<MCTS_move*>();
-            // Short-circuit: compare cached IDs first, then fall back to operator== on match
-            if (cached_cpp_move && cpp_move) {
-                if (cached_cpp_move->get_id() == cpp_move->get_id() && *cached_cpp_move == *cpp_move) {
-                    return py_move;
-                }
-            }
-        } catch (const std::exception& e) {
-            // Skip this move if casting fails
-            continue;
+    py::gil_scoped_acquire gil;
+    const PythonMoveWrapper* wrapper = dynamic_cast<const PythonMoveWrapper*>(cpp_move);
+    if (wrapper != NULL) {
+        return wrapper->get_python_move();
+    }
+    if (cpp_move != NULL) {
+        auto found = game->moves.find(cpp_move->get_id());
+        if (found != game->moves.end()) {
+            return found->second;
         }
     }
     
@@ -209,16 +590,101 @@ std::queue<MCTS_move*>* vector_to_queue(const std::vector<MCTS_move*>& vec) {
     return q;
 }
 
-SafeMCTS_agent::SafeMCTS_agent(MCTS_state* starting_state, int max_iter, int max_seconds, double exploration_constant)
-    : max_iter(max_iter), max_seconds(max_seconds) {
+SafeMCTS_agent::SafeMCTS_agent(MCTS_state* starting_state, int max_iter, double max_seconds, double exploration_constant) {
     agent = new MCTS_agent(starting_state, max_iter, max_seconds, exploration_constant);
 }
 
 SafeMCTS_agent::~SafeMCTS_agent() {
+    if (async_running()) {
+        async_search->abandoned = true;
+        async_search->cancel = true;
+    }
+    join_async_search();
     delete agent;
 }
 
+void SafeMCTS_agent::join_async_search() {
+    if (!async_thread.joinable()) return;
+    if (PyGILState_Check()) {
+        py::gil_scoped_release release;     // the search thread needs the GIL to resolve the future
+        async_thread.join();
+    } else {
+        async_thread.join();
+    }
+}
+
+py::object SafeMCTS_agent::genmove_async(py::object enemy_move, py::object budget) {
+    if (async_running()) {
+        throw std::runtime_error("genmove_async: this agent is already searching");
+    }
+    join_async_search();
+    py::object loop = py::module_::import("asyncio").attr("get_running_loop")();
+    auto search = std::make_shared<AsyncSearch>(budget.is_none() ? agent->get_budget() : budget.cast<SearchBudget>());
+    search->loop = loop;
+    search->future = loop.attr("create_future")();
+    search->enemy_move = enemy_move;
+    const MCTS_move *enemy = enemy_move.is_none() ? nullptr : enemy_move.cast<const MCTS_move *>();
+    search->future.attr("add_done_callback")(py::cpp_function([search](py::object future) {
+        if (future.attr("cancelled")().cast<bool>()) {
+            search->abandoned = true;
+            search->cancel = true;
+        }
+    }));
+    async_search = search;
+    MCTS_agent *searcher = agent;
+    async_thread = std::thread([search, searcher, enemy]() {
+        const MCTS_move *move = nullptr;
+        std::string error;
+        try {
+            std::unique_ptr<py::gil_scoped_acquire> gil;
+            if (searcher->get_tree()->needs_gil()) gil.reset(new py::gil_scoped_acquire());
+            if (searcher->search(enemy, search->budget) && !search->abandoned) {
+                move = searcher->play_best_move();
+            }
+        } catch (const std::exception &e) {
+            error = e.what();
+        }
+        py::gil_scoped_acquire gil;
+        try {
+            py::object resolve = py::cpp_function([](py::object future, py::object result, py::object exception) {
+                if (future.attr("done")().cast<bool>()) return;       // cancelled meanwhile
+                if (exception.is_none()) {
+                    future.attr("set_result")(result);
+                } else {
+                    future.attr("set_exception")(exception);
+                }
+            });
+            py::object exception = error.empty() ? py::none()
+                                                 : py::module_::import("builtins").attr("RuntimeError")(error);
+            search->loop.attr("call_soon_threadsafe")(resolve, search->future,
+                                                      py::cast(move, py::return_value_policy::reference), exception);
+        } catch (py::error_already_set &e) {
+            // the event loop is closed: nobody is waiting for the move any more
+        }
+        search->loop = py::object();
+        search->future = py::object();
+        search->enemy_move = py::object();
+        search->running = false;
+    });
+    return search->future;
+}
+
+void SafeMCTS_agent::cancel_search() {
+    if (async_running()) {
+        async_search->cancel = true;
+    } else {
+        agent->cancel_search();
+    }
+}
+
 const MCTS_move* SafeMCTS_agent::genmove(const MCTS_move* enemy_move) {
+    if (async_running()) {
+        throw std::runtime_error("genmove: this agent is already searching (genmove_async)");
+    }
+    if (agent->get_tree()->needs_gil()) {
+        return agent->genmove(enemy_move);
+    }
+    py::gil_scoped_release release;         // other Python threads (e.g. other agents) run meanwhile
     return agent->genmove(enemy_move);
 }
 
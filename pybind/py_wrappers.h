@@ -9,8 +9,10 @@
 
 #include <vector>
 #include <memory>
+#include <unordered_map>
 #include <queue>
 #include <functional>
+#include <atomic>
 
 // Forward declaration of RolloutStrategy
 enum class RolloutStrategy {
@@ -22,43 +24,92 @@ enum class RolloutStrategy {
 
 namespace py = pybind11;
 
+/**
+ * Converts the result of a Python state_key() to a transposition table key: ints are used as they are,
+ * anything else (tuples, bytes, strings...) through its Python hash. Never returns 0 (reserved for "no key").
+ */
+uint64_t python_state_key(py::handle key);
+
+/**
+ * Calls from C++ into the methods of Python states and moves (is_terminal(), describe(), __eq__()...), probes of
+ * what a state class supports included. Identifying a move (its move_id or hash) is not counted. Updated under the
+ * GIL, see pymcts.get_python_crossings().
+ */
+extern std::atomic<unsigned long> python_crossings;
+inline void count_python_crossing() { python_crossings.fetch_add(1, std::memory_order_relaxed); }
+
+// Python moves of a game by move_id, see PythonMoveWrapper. Only used under the GIL.
+typedef std::unordered_map<uint64_t, py::object> PythonMoveTable;
+
 /**
  * Internal C++ move wrapper that stores Python move data
  * This allows C++ MCTS to work with moves without exposing Python objects
+ * Search threads may not hold the GIL: every method that touches Python (the destructor included) acquires it
+ *
+ * The id of a move is its move_id attribute if it has one, else its Python hash, else the hash of its sprint().
+ * Moves with a move_id are identified by it: two of them are equal if their ids are (no __eq__ call), and a game's
+ * moves are interned, every wrapper of an id shares the first Python object given for it. sprint() is only asked for
+ * when it is used.
  */
 class PythonMoveWrapper : public MCTS_move {
 private:
     py::object python_move;  // Keep the Python move alive
-    std::string move_string; // Cached string representation
+    mutable std::string move_string; // Cached string representation, see sprint()
+    mutable bool has_move_string;
     uint64_t cached_id_;     // Cached native integer ID for fast comparison
+    bool has_move_id;        // cached_id_ is the move's move_id
     
 public:
-    PythonMoveWrapper(py::object py_move) : python_move(py_move) {
-        try {
-            move_string = py_move.attr("sprint")().cast<std::string>();
-        } catch (const std::exception& e) {
-            move_string = "PythonMove";
-        }
+    // Needs the GIL. interned: the game's table, the wrapper then keeps the interned object of its move_id
+    PythonMoveWrapper(py::object py_move, PythonMoveTable *interned = NULL)
+            : python_move(py_move), has_move_string(false), cached_id_(0), has_move_id(false) {
         // Compute cached_id_ once using the fallback chain
         try {
             // 1. Try explicit move_id attribute
-            if (py::hasattr(py_move, "move_id")) {
-                cached_id_ = py_move.attr("move_id").cast<uint64_t>();
+            py::object move_id = py::getattr(py_move, "move_id", py::none());
+            if (!move_id.is_none()) {
+                cached_id_ = move_id.cast<uint64_t>();
+                has_move_id = true;
             } else {
                 // 2. Fall back to Python hash
                 cached_id_ = static_cast<uint64_t>(py::hash(py_move));
             }
         } catch (const std::exception& e) {
             // 3. Last resort: hash of sprint() string
-            cached_id_ = std::hash<std::string>{}(move_string);
+            cached_id_ = std::hash<std::string>{}(sprint());
+        }
+        if (has_move_id && interned != NULL) {
+            auto found = interned->find(cached_id_);
+            if (found != interned->end()) {
+                python_move = found->second;
+            } else {
+                interned->emplace(cached_id_, python_move);
+            }
+        }
+    }
+
+    ~PythonMoveWrapper() override {
+        if (!Py_IsInitialized()) {
+            python_move.release();          // the interpreter is gone, nothing left to decref
+            return;
         }
+        py::gil_scoped_acquire gil;
+        python_move = py::object();
     }
     
     bool operator==(const MCTS_move& other) const override {
         const PythonMoveWrapper* other_wrapper = dynamic_cast<const PythonMoveWrapper*>(&other);
         if (other_wrapper) {
+            if (has_move_id && other_wrapper->has_move_id) {
+                return cached_id_ == other_wrapper->cached_id_;
+            }
+            if (python_move.is(other_wrapper->python_move)) {
+                return true;
+            }
+            py::gil_scoped_acquire gil;
             try {
                 // Use Python's __eq__ method for comparison
+                count_python_crossing();
                 return python_move.attr("__eq__")(other_wrapper->python_move).cast<bool>();
             } catch (const std::exception& e) {
                 return false;
@@ -68,6 +119,16 @@ public:
     }
     
     std::string sprint() const override {
+        py::gil_scoped_acquire gil;
+        if (!has_move_string) {
+            try {
+                count_python_crossing();
+                move_string = python_move.attr("sprint")().cast<std::string>();
+            } catch (const std::exception& e) {
+                move_string = "PythonMove";
+            }
+            has_move_string = true;
+        }
         return move_string;
     }
     
@@ -76,8 +137,10 @@ public:
     }
     
     std::vector<double> to_numpy() const override {
+        py::gil_scoped_acquire gil;
         try {
             // Call Python move's to_numpy() method
+            count_python_crossing();
             py::list py_result = python_move.attr("to_numpy")();
             std::vector<double> result;
             for (auto item : py_result) {
@@ -91,8 +154,10 @@ public:
     }
     
     std::vector<int> to_env_action() const override {
+        py::gil_scoped_acquire gil;
         try {
             // Call Python move's to_env_action() method
+            count_python_crossing();
             py::list py_result = python_move.attr("to_env_action")();
             std::vector<int> result;
             for (auto item : py_result) {
@@ -105,26 +170,116 @@ public:
         }
     }
     
-    py::object get_python_move() const {
+    py::object get_python_move() const {        // needs the GIL
         return python_move;
     }
 };
 
+/**
+ * Move of a game with a fixed action space (see SerializedPythonState): only the index of the action, no Python
+ * object. The state's next_state() is given the index as an int, and the move becomes a pymcts.ActionMove only when
+ * it is returned to Python.
+ */
+class ActionMove : public MCTS_move {
+    long action;
+public:
+    explicit ActionMove(long action) : action(action) {}
+    bool operator==(const MCTS_move& other) const override {
+        const ActionMove* other_action = dynamic_cast<const ActionMove*>(&other);
+        return other_action != NULL && other_action->action == action;
+    }
+    std::string sprint() const override { return std::to_string(action); }
+    uint64_t get_id() const override { return (uint64_t) action; }
+    long action_index() const override { return action; }
+    std::vector<double> to_numpy() const override { return std::vector<double>(1, (double) action); }
+    std::vector<int> to_env_action() const override { return std::vector<int>(1, (int) action); }
+};
+
+/**
+ * Input tensor of evaluate_batch, for games whose states declare encoding_shape (the shape of one state's encoding):
+ * a float32 NumPy array [capacity, *encoding_shape] allocated once and reused by every batch, it is only reallocated
+ * to grow. Row i is zeroed, then filled by python_state.encode_into(buffer, i) if the states have it, else by
+ * MCTS_state::encode_into (C++ states write their row without calling into Python). One per game (see PythonGame),
+ * every method needs the GIL.
+ */
+class BatchEncoder {
+    py::object buffer;                      // None until the first batch
+    float *data;
+    size_t capacity;                        // rows of the buffer
+    std::vector<py::ssize_t> shape;         // of one row
+    size_t row_size;
+public:
+    BatchEncoder();
+    ~BatchEncoder();
+    // Encodes the states into rows [0, states.size()) and returns a view of these rows
+    py::object encode(const std::vector<MCTS_state*>& states, const std::vector<py::ssize_t>& row_shape,
+                      bool python_encode_into);
+};
+
+/**
+ * The optional methods (and encoding_shape) a Python state class defines, probed once per class (by the first state of the class) and then
+ * read from a cache that keeps the classes alive. Methods inherited from pymcts.MCTS_state do not count: they are
+ * the C++ defaults. Attributes added to a class after its first state was wrapped are not seen.
+ */
+struct PythonStateClass {
+    bool describe;
+    bool evaluate_batch;
+    bool get_action_probabilities;
+    bool state_key;
+    bool encode;
+    bool encode_into;
+    bool encoding_shape;                    // the class declares encoding_shape, the shape of one state's encoding:
+    std::vector<py::ssize_t> row_shape;     // read into here
+    static const PythonStateClass &of(py::handle python_state);     // needs the GIL
+};
+
+/**
+ * What the states of one game share: the input tensor of evaluate_batch and what the game was found to support,
+ * probed once per game by the first state that needs it (under the GIL). next_state() and clone() hand it down.
+ */
+struct PythonGame {
+    BatchEncoder encoder;
+    PythonMoveTable moves;                  // moves with a move_id, interned (see PythonMoveWrapper)
+    long action_space_size;                 // python_state.action_space_size, 0 if it has none, -1 until probed
+    PythonGame() : action_space_size(-1) {}
+    ~PythonGame();
+};
+
 /**
  * C++ state class that holds a Python game state object
  * This enables full C++ ownership while preserving Python game logic
+ * Like PythonMoveWrapper it acquires the GIL itself, so it can be searched from threads that do not hold it
+ *
+ * Fixed action space (opt-in): a state class with an action_space_size attribute gives its legal moves with
+ * legal_actions(), either the indices of the legal actions (ints) or a mask of action_space_size bools, as a NumPy
+ * array (any buffer) or a list. The moves are ActionMoves, next_state() is given the action index (an int), and
+ * priors, from get_action_probabilities() or evaluate_batch, have one entry per action index.
+ *
+ * Single-call introspection (opt-in): a state class with describe() is asked for everything about a state at once,
+ * describe() returning (terminal, self_turn, terminal_value, actions, priors), instead of is_terminal(),
+ * is_self_side_turn(), rollout() (terminal states), actions_to_try() (legal_actions() in a fixed action space) and
+ * get_action_probabilities(). terminal_value is only read for terminal states, actions and priors only for the
+ * others; any of the three may be None, the separate method is then called when the value is needed. actions and
+ * priors are kept with the state until its node is expanded.
  */
 class SerializedPythonState : public MCTS_state {
 private:
     py::object python_state;  // Store the Python state object
-    mutable std::vector<py::object> cached_python_moves; // Keep Python moves alive
     bool cached_is_terminal;
     bool cached_is_self_side_turn;
     double cached_rollout_value;
+    bool cached_has_evaluate_batch;
+    const PythonStateClass *methods;     // what the class of python_state defines
+    py::object described_actions;        // from describe(), None if not described
+    py::object described_priors;
+    mutable bool has_cached_key;
+    mutable uint64_t cached_key;         // state_key() is only asked for when transpositions are enabled
+    std::shared_ptr<PythonGame> game;    // shared by the states of the game
+    std::queue<MCTS_move*>* legal_actions(py::handle legal) const;     // fixed action space, needs the GIL
     
 public:
-    SerializedPythonState(py::object python_state);
-    ~SerializedPythonState() override = default;
+    SerializedPythonState(py::object python_state, std::shared_ptr<PythonGame> game = nullptr);
+    ~SerializedPythonState() override;
     
     // MCTS_state interface
     std::queue<MCTS_move*>* actions_to_try() const override;
@@ -135,14 +290,24 @@ public:
     bool is_self_side_turn() const override;
     MCTS_state* clone() const override;
     std::vector<double> get_action_probabilities() const override;
+    uint64_t hash() const override;
+    std::vector<double> encode() const override;     // python_state.encode(), empty if it has none
+    size_t action_space_size() const override;       // python_state.action_space_size, 0 if it has none
     
-    // Batch evaluation: crosses Python boundary once for a batch of states
+    // Batch evaluation: crosses Python boundary once for a batch of states. python_state.evaluate_batch(states)
+    // returns either a list of (value, [priors]) tuples, or arrays read through the buffer protocol: a tuple
+    // (values[N], priors[N, A]) or (values, priors, legal[N, A]) of float32 (or float64, the mask may be bool). The
+    // array priors come back normalized over the legal columns (all of them without a mask). Either way the priors
+    // of a state are aligned with its actions_to_try() (with its action indices in a fixed action space, then the
+    // priors of the legal actions are normalized when the node is expanded). If python_state has encoding_shape the states are encoded
+    // into a reused input tensor first (see BatchEncoder) and the call is evaluate_batch(states, inputs).
     std::vector<std::pair<double, std::vector<double>>> evaluate_batch(const std::vector<MCTS_state*>& states) const;
     
-    // Accessor for python_state (needed by batched MCTS)
+    // Accessor for python_state (needed by batched MCTS), needs the GIL
     py::object get_python_state() const { return python_state; }
+    bool has_evaluate_batch() const { return cached_has_evaluate_batch; }      // batched search
     
-    // Helper to find original Python move from C++ pointer
+    // Helper to find original Python move from C++ pointer: the wrapped object, or the interned move of its id
     py::object find_python_move(const MCTS_move* cpp_move) const;
 };
 
@@ -274,6 +439,25 @@ public:
                                       /* No arguments */
         );
     }
+
+    std::vector<double> encode() const override {
+        PYBIND11_OVERRIDE(
+            std::vector<double>,      /* Return type */
+            MCTS_state,               /* Parent class */
+            encode,                   /* Name of function in C++ */
+                                      /* No arguments */
+        );
+    }
+
+    uint64_t hash() const override {
+        // Python states expose their key as state_key(), which may return any hashable value
+        py::gil_scoped_acquire gil;
+        py::function override = py::get_override(this, "state_key");
+        if (override) {
+            return python_state_key(override());
+        }
+        return MCTS_state::hash();
+    }
 };
 
 /**
@@ -288,28 +472,64 @@ std::vector<MCTS_move*> queue_to_vector(std::queue<MCTS_move*>* q);
  */
 std::queue<MCTS_move*>* vector_to_queue(const std::vector<MCTS_move*>& vec);
 
+/**
+ * A search started by SafeMCTS_agent::genmove_async. Shared by the search thread and the future's done callback.
+ * Its Python objects are only touched with the GIL held, and dropped by the search thread when it is done.
+ */
+struct AsyncSearch {
+    SearchBudget budget;                     // its cancel flag points at cancel below
+    std::atomic<bool> cancel;                // end the search, the best move found so far is played
+    std::atomic<bool> abandoned;             // the future was cancelled: do not play a move at all
+    std::atomic<bool> running;
+    py::object loop, future, enemy_move;     // enemy_move keeps the move alive until the search has applied it
+    AsyncSearch(const SearchBudget &budget) : budget(budget), cancel(false), abandoned(false), running(true) {
+        this->budget.cancel = &cancel;
+    }
+};
+
 /**
  * Safe wrapper for MCTS_agent that handles move ownership
  */
 class SafeMCTS_agent {
 private:
     MCTS_agent* agent;
+    std::thread async_thread;                // the thread of the last genmove_async() search
+    std::shared_ptr<AsyncSearch> async_search;
+    bool async_running() const { return async_search && async_search->running; }
+    void join_async_search();                // releases the GIL while it waits
     
 public:
-    int max_iter;
-    int max_seconds;
-    
-    SafeMCTS_agent(MCTS_state* starting_state, int max_iter = 100000, int max_seconds = 30, double exploration_constant = 1.41);
+    SafeMCTS_agent(MCTS_state* starting_state, int max_iter = 100000, double max_seconds = 30, double exploration_constant = 1.41);
     ~SafeMCTS_agent();
     
     // Returns nullptr if no move available (game ended)
     const MCTS_move* genmove(const MCTS_move* enemy_move = nullptr);
+    // Searches on a native thread without the GIL (Python states take it for each call) and returns an asyncio
+    // future of the move, resolved on the running event loop. Cancelling the future stops the search and plays no
+    // move; cancel_search() stops it and resolves the future with the best move found so far.
+    py::object genmove_async(py::object enemy_move, py::object budget);
+    void cancel_search();
+    bool is_searching() const { return async_running(); }
     const MCTS_state* get_current_state() const;
     void feedback() const;
     void set_exploration_constant(double c) { agent->set_exploration_constant(c); }
     double get_exploration_constant() const { return agent->get_exploration_constant(); }
     MCTS_agent* get_agent() const { return agent; }
     MCTS_tree* get_tree() const { return agent->get_tree(); }
+
+    // Search budget (delegated to underlying agent)
+    void set_max_iter(int n) { agent->set_max_iter(n); }
+    int get_max_iter() const { return agent->get_max_iter(); }
+    void set_max_seconds(double s) { agent->set_max_seconds(s); }
+    double get_max_seconds() const { return agent->get_max_seconds(); }
+    void set_max_nodes(size_t n) { agent->set_max_nodes(n); }
+    size_t get_max_nodes() const { return agent->get_max_nodes(); }
+    void set_max_memory_bytes(size_t b) { agent->set_max_memory_bytes(b); }
+    size_t get_max_memory_bytes() const { return agent->get_max_memory_bytes(); }
+    void set_early_stop(bool enabled) { agent->set_early_stop(enabled); }
+    bool get_early_stop() const { return agent->get_early_stop(); }
+    void set_early_stop_confidence(double confidence) { agent->set_early_stop_confidence(confidence); }
+    double get_early_stop_confidence() const { return agent->get_early_stop_confidence(); }
     
     // Batched search configuration (delegated to underlying agent)
     void set_batch_size(int size) { agent->set_batch_size(size); }
@@ -320,6 +540,26 @@ public:
     // Virtual loss configuration
     void set_virtual_loss(double v) { agent->set_virtual_loss(v); }
     double get_virtual_loss() const { return agent->get_virtual_loss(); }
+
+    // Parallel search mode ("tree" or "root")
+    void set_parallel_mode(const std::string& mode) { agent->set_parallel_mode(mode); }
+    std::string get_parallel_mode() const { return agent->get_parallel_mode(); }
+
+    // Transposition table configuration
+    void set_transposition_table_size(size_t max_entries) { agent->set_transposition_table_size(max_entries); }
+    size_t get_transposition_table_size() const { return agent->get_transposition_table_size(); }
+
+    // Pondering (delegated to underlying agent)
+    void start_pondering() { agent->start_pondering(); }
+    void stop_pondering() { agent->stop_pondering(); }
+    bool is_pondering() const { return agent->is_pondering(); }
+    double get_ponder_seconds() const { return agent->get_ponder_seconds(); }
+    unsigned long get_ponder_iterations() const { return agent->get_ponder_iterations(); }
+    double get_reuse_ratio() const { return agent->get_reuse_ratio(); }
+
+    // Seed of the search threads' random generators
+    void set_seed(uint64_t seed) { agent->set_seed(seed); }
+    uint64_t get_seed() const { return agent->get_seed(); }
 };
 
 #endif // PY_WRAPPERS_H
\ No newline at end of file
@@ -2,15 +2,36 @@
 #include <pybind11/stl.h>
 #include <pybind11/functional.h>
 #include <pybind11/operators.h>
+#include <pybind11/numpy.h>
 #include <sstream>
 #include <thread>
 #include "py_wrappers.h"
 #include "../mcts/include/state.h"
 #include "mcts_python.h"  // Use Python-specific header
+#include "self_play.h"
 #include "../examples/TicTacToe/TicTacToe.h"
 
 namespace py = pybind11;
 
+// Hands the vector's buffer over to a NumPy array without copying it: the array owns it through a capsule
+template <typename T>
+static py::array_t<T> adopt_array(vector<T> &&values) {
+    vector<T> *owned = new vector<T>(std::move(values));
+    py::capsule free_when_done(owned, [](void *p) { delete reinterpret_cast<vector<T> *>(p); });
+    return py::array_t<T>((py::ssize_t) owned->size(), owned->data(), free_when_done);
+}
+
+static py::dict arrays_to_dict(MCTS_arrays &&arrays, bool structure) {
+    py::dict result;
+    if (structure) result["parent"] = adopt_array(std::move(arrays.parent));
+    result["move_id"] = adopt_array(std::move(arrays.move_id));
+    result["visits"] = adopt_array(std::move(arrays.visits));
+    result["value_sum"] = adopt_array(std::move(arrays.value_sum));
+    result["prior"] = adopt_array(std::move(arrays.prior));
+    if (structure) result["depth"] = adopt_array(std::move(arrays.depth));
+    return result;
+}
+
 PYBIND11_MODULE(pymcts, m, py::mod_gil_not_used()) {
     m.doc() = "Python bindings for Monte Carlo Tree Search C++ library with smart_holder support";
 
@@ -23,6 +44,12 @@ PYBIND11_MODULE(pymcts, m, py::mod_gil_not_used()) {
         .def("to_numpy", &MCTS_move::to_numpy, "Convert move to numpy array representation")
         .def("to_env_action", &MCTS_move::to_env_action, "Convert move to environment action format");
 
+    py::class_<ActionMove, MCTS_move, py::smart_holder>(m, "ActionMove")
+        .def(py::init<long>(), "Move of a game with a fixed action space (a state with action_space_size), given by "
+             "the index of its action", py::arg("action"))
+        .def_property_readonly("action", &ActionMove::action_index, "Index of the action")
+        .def("__repr__", [](const ActionMove &move) { return "ActionMove(" + move.sprint() + ")"; });
+
     py::class_<MCTS_state, PyMCTS_state, py::smart_holder>(m, "MCTS_state")
         .def(py::init<>())
         .def("actions_to_try", [](const MCTS_state& self) {
@@ -39,7 +66,22 @@ PYBIND11_MODULE(pymcts, m, py::mod_gil_not_used()) {
         .def("print", &MCTS_state::print, "Print the current state")
         .def("is_self_side_turn", &MCTS_state::is_self_side_turn, "Check if it's the self side's turn")
         .def("clone", &MCTS_state::clone, "Create a deep copy of this state", py::return_value_policy::take_ownership)
-        .def("get_action_probabilities", &MCTS_state::get_action_probabilities, "Get prior probabilities for possible moves");
+        .def("get_action_probabilities", &MCTS_state::get_action_probabilities, "Get prior probabilities for possible moves")
+        .def("encode", &MCTS_state::encode,
+             "Encoding of the position for training data, from the point of view of the side to move (optional)");
+
+    py::class_<SearchBudget>(m, "SearchBudget")
+        .def(py::init<long, double, size_t, size_t, bool, double>(),
+             "Limits of one search, it stops at the first one reached (see MCTS_tree.grow_tree for their meaning)",
+             py::arg("max_iter") = -1, py::arg("max_seconds") = -1.0, py::arg("max_nodes") = 0,
+             py::arg("max_memory_bytes") = 0, py::arg("early_stop") = false, py::arg("early_stop_confidence") = 0.0)
+        .def_readwrite("max_iter", &SearchBudget::max_iterations, "Iterations (< 0: unlimited)")
+        .def_readwrite("max_seconds", &SearchBudget::max_seconds, "Wall clock seconds (< 0: no deadline)")
+        .def_readwrite("max_nodes", &SearchBudget::max_nodes, "Nodes in the tree's arena (0: unlimited)")
+        .def_readwrite("max_memory_bytes", &SearchBudget::max_memory_bytes, "Bytes of tree memory (0: unlimited)")
+        .def_readwrite("early_stop", &SearchBudget::early_stop, "Smart stop")
+        .def_readwrite("early_stop_confidence", &SearchBudget::early_stop_confidence,
+                       "Smart stop confidence level in (0, 1) (0: off)");
 
     // Core MCTS classes
     py::class_<MCTS_node>(m, "MCTS_node")
@@ -52,20 +94,31 @@ PYBIND11_MODULE(pymcts, m, py::mod_gil_not_used()) {
         .def_property_readonly("prior_probability", &MCTS_node::get_prior_probability, "Get the prior probability for PUCT")
         .def_property_readonly("visit_count", &MCTS_node::get_number_of_simulations, "Get the number of simulations for this node")
         .def_property_readonly("score", &MCTS_node::get_score, "Get the total score (wins) for this node")
-        .def("get_children", [](const MCTS_node& self) {
+        .def("get_children", [](MCTS_node& self) {
             const auto& children = self.get_children();
             py::list result;
             for (auto* child : children) {
-                result.append(py::cast(child, py::return_value_policy::reference));
+                // children that a batched search descended into but did not evaluate get their state first
+                result.append(py::cast(child->materialize(), py::return_value_policy::reference));
             }
             return result;
         }, "Get list of child nodes")
+        .def("children_stats", [](const MCTS_node &self) {
+            MCTS_arrays arrays;
+            {
+                py::gil_scoped_release release;
+                self.collect_edges(arrays);
+            }
+            return arrays_to_dict(std::move(arrays), false);
+        }, "Statistics of every move of the node (tried or not, sorted by prior) as a dict of NumPy arrays: move_id "
+           "(uint64, the move's get_id()), visits (uint32), value_sum (float64, as score) and prior (float64). Empty "
+           "until the node has generated its moves. Needs NumPy")
         .def("get_parent", &MCTS_node::get_parent, 
              "Get the parent node", py::return_value_policy::reference)
         .def("expand", &MCTS_node::expand, "Expand this node by adding a new child")
         .def("rollout", &MCTS_node::rollout, "Perform a rollout simulation from this node")
         .def("select_best_child", &MCTS_node::select_best_child, 
-             "Select the best child using UCT", py::arg("c"))
+             "Select the best child using UCT", py::arg("c"), py::return_value_policy::reference)
         .def("get_current_state", &MCTS_node::get_current_state, 
              "Get the game state represented by this node", py::return_value_policy::reference)
         .def("print_stats", &MCTS_node::print_stats, "Print statistics about this node")
@@ -79,13 +132,32 @@ PYBIND11_MODULE(pymcts, m, py::mod_gil_not_used()) {
     py::class_<MCTS_tree>(m, "MCTS_tree")
         .def(py::init<MCTS_state*>(), "Create a new MCTS tree with the given starting state",
              py::arg("starting_state"))
-        .def("select", &MCTS_tree::select, 
-             "Select a node to expand using UCT", py::arg("c") = 1.41)
+        .def("select", [](MCTS_tree &tree, double c) {
+                MCTS_node *node = tree.select(c);
+                return (node != NULL) ? node->materialize() : node;    // a child selected for the first time has no state
+             },
+             "Select a node to expand using UCT", py::arg("c") = 1.41, py::return_value_policy::reference)
         .def("select_best_child", &MCTS_tree::select_best_child, 
-             "Select the best child of the root node")
-      .def("grow_tree", &MCTS_tree::grow_tree, 
-              "Grow the tree for the specified iterations or time",
-              py::arg("max_iter"), py::arg("max_time_in_seconds"), py::arg("c") = 1.41)
+             "Select the best child of the root node", py::return_value_policy::reference)
+      .def("grow_tree", [](MCTS_tree &tree, long max_iter, double max_time_in_seconds, double c, size_t max_nodes,
+                           size_t max_memory_bytes, bool early_stop, double early_stop_confidence) {
+                SearchBudget budget(max_iter, max_time_in_seconds, max_nodes, max_memory_bytes, early_stop,
+                                    early_stop_confidence);
+                if (tree.needs_gil()) {
+                    tree.grow_tree(budget, c);
+                } else {
+                    py::gil_scoped_release release;
+                    tree.grow_tree(budget, c);
+                }
+              },
+              "Grow the tree until the first limit is reached: iterations (< 0: unlimited), seconds (< 0: no "
+              "deadline), nodes in the arena or bytes of tree memory (0: unlimited). With early_stop the search also "
+              "ends once the remaining budget can no longer change the best root move, or when the root has a single "
+              "legal move; early_stop_confidence in (0, 1) also ends it once the best move is that certain. The GIL "
+              "is released during the search, except for Python subclasses of MCTS_state (SerializedPythonState "
+              "takes it for each call into Python)",
+              py::arg("max_iter"), py::arg("max_time_in_seconds"), py::arg("c") = 1.41, py::arg("max_nodes") = 0,
+              py::arg("max_memory_bytes") = 0, py::arg("early_stop") = false, py::arg("early_stop_confidence") = 0.0)
         .def("advance_tree", &MCTS_tree::advance_tree, 
              "Advance the tree by applying the given move", py::arg("move"))
         .def("get_size", &MCTS_tree::get_size, "Get the total number of nodes in the tree")
@@ -93,33 +165,204 @@ PYBIND11_MODULE(pymcts, m, py::mod_gil_not_used()) {
              "Get the current root state", py::return_value_policy::reference)
         .def("print_stats", &MCTS_tree::print_stats, "Print tree statistics")
         .def_property_readonly("root", &MCTS_tree::get_root, 
-             "Get the root node of the tree", py::return_value_policy::reference);
+             "Get the root node of the tree", py::return_value_policy::reference)
+        .def("to_arrays", [](const MCTS_tree &tree) {
+            MCTS_arrays arrays;
+            {
+                py::gil_scoped_release release;
+                arrays = tree.to_arrays();
+            }
+            return arrays_to_dict(std::move(arrays), true);
+        }, "Statistics of every node of the tree as a dict of NumPy arrays, one row per node in breadth-first order "
+           "(row 0 is the root): parent (int64, row of the parent, -1 for the root), move_id (uint64, get_id() of the "
+           "move leading to the node, 0 for the root), visits (uint32), value_sum (float64, as score), prior "
+           "(float64) and depth (uint32, plies below the root). Gathered in one pass without Python objects, the arrays "
+           "own the buffers they were gathered in. With transpositions a node appears once, under the parent it was "
+           "first reached from. Not to be called while the tree is searched. Needs NumPy")
+        .def_property_readonly("arena_size", &MCTS_tree::get_arena_size,
+             "Number of nodes held by the tree's node arena")
+        .def_property_readonly("arena_bytes", &MCTS_tree::get_arena_bytes,
+             "Bytes reserved by the tree's node arena")
+        .def_property_readonly("nodes_created", &MCTS_tree::get_nodes_created,
+             "Number of nodes created since the tree was built")
+        .def_property_readonly("move_generations", &MCTS_tree::get_move_generations,
+             "Number of nodes that called actions_to_try() (generation is deferred until first expansion)")
+        .def_property_readonly("nodes_without_moves", &MCTS_tree::get_nodes_without_moves,
+             "Number of nodes that never needed to generate their moves")
+        .def_property("num_search_threads", &MCTS_tree::get_num_search_threads, &MCTS_tree::set_num_search_threads,
+             "Search threads: tree-parallel search for native states, batched search for evaluate_batch states")
+        .def_property("virtual_loss", &MCTS_tree::get_virtual_loss, &MCTS_tree::set_virtual_loss,
+             "Virtual loss applied to the path of a simulation in progress (default: 1.0)")
+        .def_property("transposition_table_size", &MCTS_tree::get_transposition_table_size,
+             &MCTS_tree::set_transposition_table_size,
+             "Maximum number of transposition table entries, 0 (default) disables transpositions")
+        .def_property_readonly("transposition_entries", &MCTS_tree::get_transposition_entries,
+             "Number of nodes currently in the transposition table")
+        .def_property_readonly("transposition_hits", &MCTS_tree::get_transposition_hits,
+             "Number of times a new position was found in the transposition table and its node shared")
+        .def_property_readonly("memory_bytes", &MCTS_tree::get_memory_bytes,
+             "Bytes held by the node arena and the transposition table (what max_memory_bytes limits)")
+        .def_property_readonly("stop_reason", [](const MCTS_tree &tree) { return stop_reason_name(tree.get_stop_reason()); },
+             "Why the last search stopped: \"iterations\", \"time\", \"nodes\", \"memory\", \"exhausted\", "
+             "\"decided\", \"forced\", \"cancelled\" (or \"none\")")
+        .def_property_readonly("search_iterations", &MCTS_tree::get_search_iterations,
+             "Iterations made by the last search")
+        .def_property_readonly("search_iterations_saved", &MCTS_tree::get_search_iterations_saved,
+             "Estimate of the iterations the last search had left when the early stop ended it (0 if it did not, or "
+             "if neither an iteration limit nor a deadline bounded it)")
+        .def_property_readonly("search_time", &MCTS_tree::get_search_seconds,
+             "Wall clock seconds taken by the last search")
+        .def_property("seed", &MCTS_tree::get_seed, &MCTS_tree::set_seed,
+             "Seed of the search threads' random generators (random by default), setting it makes searches reproducible");
+
+    py::class_<MultiTreeSearch>(m, "MultiTreeSearch")
+        .def(py::init<const vector<MCTS_tree *> &, size_t>(),
+             "Batched search over many trees at once (e.g. the games of a self-play run): every round gathers leaves "
+             "from all the trees into one evaluate_batch call. The trees must hold SerializedPythonState with "
+             "evaluate_batch",
+             py::arg("trees"), py::arg("batch_size") = 256, py::keep_alive<1, 2>())
+        .def("search", [](MultiTreeSearch &search, long max_iter, double max_time_in_seconds, double c,
+                          size_t max_nodes, size_t max_memory_bytes, bool early_stop, double early_stop_confidence) {
+                SearchBudget budget(max_iter, max_time_in_seconds, max_nodes, max_memory_bytes, early_stop,
+                                    early_stop_confidence);
+                py::gil_scoped_release release;         // the states take the GIL for each call into Python
+                return search.search(budget, c);
+             },
+             "Grow every tree, each with its own copy of the budget (see MCTS_tree.grow_tree for the limits). "
+             "Returns the number of leaves evaluated",
+             py::arg("max_iter"), py::arg("max_time_in_seconds") = -1.0, py::arg("c") = 1.41,
+             py::arg("max_nodes") = 0, py::arg("max_memory_bytes") = 0, py::arg("early_stop") = false,
+             py::arg("early_stop_confidence") = 0.0)
+        .def_property_readonly("trees", &MultiTreeSearch::get_trees, "The trees searched",
+             py::return_value_policy::reference)
+        .def_property("batch_size", &MultiTreeSearch::get_batch_size, &MultiTreeSearch::set_batch_size,
+             "Maximum number of leaves per evaluate_batch call")
+        .def_property_readonly("batches", &MultiTreeSearch::get_batches,
+             "Number of evaluate_batch calls made by the last search")
+        .def_property_readonly("evaluations", &MultiTreeSearch::get_evaluations,
+             "Number of leaves evaluated by the last search")
+        .def_property_readonly("occupancy", &MultiTreeSearch::get_occupancy,
+             "Mean share of batch_size filled by the evaluate_batch calls of the last search")
+        .def_property_readonly("evaluations_per_second", &MultiTreeSearch::get_evaluations_per_second,
+             "Leaves evaluated per wall clock second by the last search")
+        .def_property_readonly("search_time", &MultiTreeSearch::get_search_seconds,
+             "Wall clock seconds taken by the last search");
+
+    py::class_<SelfPlayRunner>(m, "SelfPlayRunner")
+        .def(py::init<MCTS_state *, const std::string &, long, double, size_t, size_t, double>(),
+             "Self-play data generation: an agent plays games against itself and every position it searched is "
+             "written to .npy shards in directory, with its encode(), the share of the root's visits of every move "
+             "(by action index for states with a fixed action space, else in actions_to_try() order, zero padded to "
+             "policy_size, 0: the action space or the number of moves of starting_state) and "
+             "the game's outcome for the side to move (1 win, 0 loss). Needs NumPy",
+             py::arg("starting_state"), py::arg("directory"), py::arg("max_iter") = 800, py::arg("max_seconds") = -1.0,
+             py::arg("shard_size") = SELF_PLAY_DEFAULT_SHARD_SIZE, py::arg("policy_size") = 0,
+             py::arg("exploration_constant") = 1.41, py::keep_alive<1, 2>())
+        .def("play", [](SelfPlayRunner &runner, unsigned long games) {
+                if (runner.needs_gil()) return runner.play(games);
+                py::gil_scoped_release release;         // taken back to write the positions of every game
+                return runner.play(games);
+             },
+             "Play games, returns the number of positions recorded", py::arg("games") = 1)
+        .def("close", &SelfPlayRunner::close,
+             "Cut the open shard down to the positions written so far, the next game opens a new shard")
+        .def_property_readonly("games", &SelfPlayRunner::get_games, "Games played")
+        .def_property_readonly("positions", [](SelfPlayRunner &runner) { return runner.get_writer().get_positions(); },
+             "Positions recorded")
+        .def_property_readonly("shards", [](SelfPlayRunner &runner) { return runner.get_writer().get_shards(); },
+             "Shards opened")
+        .def_property_readonly("policy_size", &SelfPlayRunner::get_policy_size, "Width of the policy rows")
+        .def_property("num_search_threads", &SelfPlayRunner::get_num_search_threads,
+             &SelfPlayRunner::set_num_search_threads, "Search threads of the agent (default: 1)")
+        .def_property("sample_moves", &SelfPlayRunner::get_sample_moves, &SelfPlayRunner::set_sample_moves,
+             "Opening moves of every game drawn in proportion to the root's visits instead of the best move "
+             "(default: 0)")
+        .def_property("seed", &SelfPlayRunner::get_seed, &SelfPlayRunner::set_seed,
+             "Seed of the games (random by default), with one search thread a new runner with the same seed "
+             "replays the same games");
+
+    py::class_<SelfPlayReader>(m, "SelfPlayReader")
+        .def(py::init<const std::string &, size_t>(),
+             "Iterator over the positions of a SelfPlayRunner directory in chunks of (states, policies, values) "
+             "arrays. The shards are memory mapped one at a time and the chunks are views of them",
+             py::arg("directory"), py::arg("chunk_size") = SELF_PLAY_READ_CHUNK)
+        .def("__iter__", [](SelfPlayReader &reader) -> SelfPlayReader & { return reader; },
+             py::return_value_policy::reference_internal)
+        .def("__next__", &SelfPlayReader::next)
+        .def_property_readonly("num_shards", &SelfPlayReader::get_num_shards, "Number of shards found")
+        .def_property_readonly("positions", &SelfPlayReader::get_positions,
+             "Positions in all the shards (reads their headers only)");
 
     // High-level agent interface (recommended for most users)
     py::class_<SafeMCTS_agent>(m, "MCTS_agent")
-        .def(py::init<MCTS_state*, int, int, double>(), 
+        .def(py::init<MCTS_state*, int, double, double>(), 
              "Create an MCTS agent with the given starting state and parameters",
              py::arg("starting_state"), py::arg("max_iter") = 100000, py::arg("max_seconds") = 30, py::arg("exploration_constant") = 1.41)
         .def("genmove", &SafeMCTS_agent::genmove, 
-             "Generate the next move, optionally considering an enemy move first",
+             "Generate the next move, optionally considering an enemy move first. Like MCTS_tree.grow_tree, the "
+             "search runs without the GIL, so agents in other Python threads search at the same time",
              py::arg("enemy_move") = nullptr, py::return_value_policy::reference)
+        .def("genmove_async", &SafeMCTS_agent::genmove_async,
+             "Awaitable genmove for asyncio: the search runs on a native thread without holding the GIL, so the "
+             "event loop keeps running. budget (a SearchBudget) replaces the agent's own limits for this move. "
+             "Cancelling the awaiting task stops the search and plays no move; cancel_search() stops it and "
+             "resolves the awaitable with the best move found so far",
+             py::arg("enemy_move") = py::none(), py::arg("budget") = py::none())
+        .def("cancel_search", &SafeMCTS_agent::cancel_search,
+             "End the running search early (e.g. from another task), the best move found so far is played")
+        .def_property_readonly("searching", &SafeMCTS_agent::is_searching,
+             "Whether a genmove_async search is still running (it outlives an awaitable that was cancelled)")
         .def("get_current_state", &SafeMCTS_agent::get_current_state, 
              "Get the current game state", py::return_value_policy::reference)
         .def("feedback", &SafeMCTS_agent::feedback, "Print feedback about the agent's thinking")
+        .def("start_pondering", &SafeMCTS_agent::start_pondering,
+             "Keep growing the tree from the current position in a background thread (e.g. during the opponent's "
+             "turn) until genmove() or stop_pondering(). Searched without the GIL like genmove(). Do not use the "
+             "tree meanwhile")
+        .def("stop_pondering", &SafeMCTS_agent::stop_pondering, "Stop pondering (genmove() does it too)")
+        .def_property_readonly("pondering", &SafeMCTS_agent::is_pondering,
+             "Whether the pondering thread is still searching")
+        .def_property_readonly("ponder_time", &SafeMCTS_agent::get_ponder_seconds,
+             "Wall clock seconds of the last pondering session")
+        .def_property_readonly("ponder_iterations", &SafeMCTS_agent::get_ponder_iterations,
+             "Iterations made by the last pondering session")
+        .def_property_readonly("reuse_ratio", &SafeMCTS_agent::get_reuse_ratio,
+             "Share of the root's visits kept by the subtree of the enemy move given to the last genmove()")
         .def_property("exploration_constant", 
                      &SafeMCTS_agent::get_exploration_constant,
                      &SafeMCTS_agent::set_exploration_constant,
                      "PUCT exploration constant (c)")
        .def_property_readonly("tree", &SafeMCTS_agent::get_tree, 
               "Get the MCTS_tree used by this agent", py::return_value_policy::reference)
-        .def_readwrite("max_iter", &SafeMCTS_agent::max_iter, "Maximum number of iterations")
-        .def_readwrite("max_seconds", &SafeMCTS_agent::max_seconds, "Maximum time in seconds")
+        .def_property("max_iter", &SafeMCTS_agent::get_max_iter, &SafeMCTS_agent::set_max_iter,
+                      "Maximum number of iterations per move (< 0: unlimited)")
+        .def_property("max_seconds", &SafeMCTS_agent::get_max_seconds, &SafeMCTS_agent::set_max_seconds,
+                      "Maximum time per move in seconds, fractions allowed (< 0: no deadline)")
+        .def_property("max_nodes", &SafeMCTS_agent::get_max_nodes, &SafeMCTS_agent::set_max_nodes,
+                      "Stop a search once the tree holds this many nodes (0: unlimited)")
+        .def_property("max_memory_bytes", &SafeMCTS_agent::get_max_memory_bytes, &SafeMCTS_agent::set_max_memory_bytes,
+                      "Stop a search once the tree's memory reaches this many bytes (0: unlimited)")
+        .def_property("early_stop", &SafeMCTS_agent::get_early_stop, &SafeMCTS_agent::set_early_stop,
+                      "End searches once the remaining budget can no longer change the move, or when there is only "
+                      "one legal move (default: False)")
+        .def_property("early_stop_confidence", &SafeMCTS_agent::get_early_stop_confidence,
+                      &SafeMCTS_agent::set_early_stop_confidence,
+                      "With early_stop, also end searches once the best move is this certain, in (0, 1) (0: off)")
         .def_property("batch_size", &SafeMCTS_agent::get_batch_size, &SafeMCTS_agent::set_batch_size, 
                       "Batch size for parallel leaf evaluations (default: 64)")
         .def_property("num_search_threads", &SafeMCTS_agent::get_num_search_threads, &SafeMCTS_agent::set_num_search_threads,
                       "Number of search threads for batched MCTS (default: 4)")
         .def_property("virtual_loss", &SafeMCTS_agent::get_virtual_loss, &SafeMCTS_agent::set_virtual_loss,
-                      "Virtual loss applied during batched MCTS (default: 1.0)");
+                      "Virtual loss applied during batched MCTS (default: 1.0)")
+        .def_property("parallel_mode", &SafeMCTS_agent::get_parallel_mode, &SafeMCTS_agent::set_parallel_mode,
+                      "How native states use num_search_threads: \"tree\" (default) grows one shared tree, "
+                      "\"root\" grows one independent tree per thread and merges their root statistics")
+        .def_property("transposition_table_size", &SafeMCTS_agent::get_transposition_table_size,
+                      &SafeMCTS_agent::set_transposition_table_size,
+                      "Maximum number of transposition table entries, 0 (default) disables transpositions")
+        .def_property("seed", &SafeMCTS_agent::get_seed, &SafeMCTS_agent::set_seed,
+                      "Seed of the search threads' random generators (random by default), setting it makes "
+                      "single threaded searches reproducible");
 
     // TicTacToe example implementation with py::smart_holder
     py::class_<TicTacToe_move, MCTS_move, py::smart_holder>(m, "TicTacToe_move")
@@ -185,6 +428,14 @@ PYBIND11_MODULE(pymcts, m, py::mod_gil_not_used()) {
         return MCTS_node::get_rollout_threads();
     }, "Get the current number of parallel rollout threads");
     
+    m.def("get_python_crossings", []() {
+        return python_crossings.load();
+    }, "Calls made from C++ into the methods of Python states and moves so far (class probes included)");
+
+    m.def("reset_python_crossings", []() {
+        python_crossings = 0;
+    }, "Reset the count of get_python_crossings() to 0");
+
     m.def("get_optimal_thread_count", []() {
         return ParallelRollouts::get_optimal_thread_count();
     }, "Get the optimal number of threads based on hardware");
@@ -192,4 +443,14 @@ PYBIND11_MODULE(pymcts, m, py::mod_gil_not_used()) {
     m.def("get_hardware_concurrency", []() {
         return std::thread::hardware_concurrency();
     }, "Get the number of concurrent threads supported by the hardware");
+
+    // The calling thread's generator, seeded by the tree during a search (for rollouts of Python states)
+    m.def("random", []() {
+        return thread_rng().uniform();
+    }, "Random float in [0, 1) from the search thread's generator");
+
+    m.def("randrange", [](uint64_t n) {
+        if (n == 0) throw py::value_error("randrange() needs n > 0");
+        return thread_rng().below(n);
+    }, "Random integer in [0, n) from the search thread's generator", py::arg("n"));
 }
\ No newline at end of file
@@ -0,0 +1,282 @@
+#include "self_play.h"
+#include "py_wrappers.h"
+#include <cstring>
+#include <cstdio>
+#include <stdexcept>
+
+using namespace pybind11::literals;
+
+
+/*** SelfPlayWriter ***/
+
+SelfPlayWriter::SelfPlayWriter(const std::string &directory, size_t shard_size, const std::string &prefix)
+        : directory(directory), prefix(prefix), shard_size(std::max((size_t) 1, shard_size)), encoding_size(0),
+          policy_size(0), next_shard(0), states(py::none()), policies(py::none()), values(py::none()),
+          states_data(NULL), policies_data(NULL), values_data(NULL), rows(0), positions(0), shards(0) {
+    py::module_::import("os").attr("makedirs")(directory, "exist_ok"_a = true);
+    // continue after the shards already in the directory
+    py::list existing = py::module_::import("glob").attr("glob")(directory + "/" + prefix + "-*.values.npy");
+    next_shard = (unsigned int) existing.size();
+}
+
+SelfPlayWriter::~SelfPlayWriter() {
+    if (!Py_IsInitialized()) {              // the interpreter is gone, nothing left to close or decref
+        states.release();
+        policies.release();
+        values.release();
+        return;
+    }
+    py::gil_scoped_acquire gil;
+    try {
+        close_shard();
+    } catch (const std::exception &e) {
+        std::cerr << "Error in SelfPlayWriter::~SelfPlayWriter: " << e.what() << std::endl;
+    }
+    states = py::object();
+    policies = py::object();
+    values = py::object();
+}
+
+std::string SelfPlayWriter::shard_path(unsigned int index, const char *array) const {
+    char number[16];
+    snprintf(number, sizeof(number), "%05u", index);
+    return directory + "/" + prefix + "-" + number + "." + array + ".npy";
+}
+
+void SelfPlayWriter::open_shard() {
+    py::object open_memmap = py::module_::import("numpy.lib.format").attr("open_memmap");
+    const unsigned int index = next_shard++;
+    states = open_memmap(shard_path(index, "states"), "mode"_a = "w+", "dtype"_a = "float32",
+                         "shape"_a = py::make_tuple(shard_size, encoding_size));
+    policies = open_memmap(shard_path(index, "policies"), "mode"_a = "w+", "dtype"_a = "float32",
+                           "shape"_a = py::make_tuple(shard_size, policy_size));
+    values = open_memmap(shard_path(index, "values"), "mode"_a = "w+", "dtype"_a = "float32",
+                         "shape"_a = py::make_tuple(shard_size));
+    states_data = (float *) py::buffer(states).request(true).ptr;
+    policies_data = (float *) py::buffer(policies).request(true).ptr;
+    values_data = (float *) py::buffer(values).request(true).ptr;
+    rows = 0;
+    shards++;
+}
+
+void SelfPlayWriter::close_shard() {
+    if (states.is_none()) return;
+    const unsigned int index = next_shard - 1;
+    py::object arrays[3] = {states, policies, values};
+    const char *names[3] = {"states", "policies", "values"};
+    states = policies = values = py::none();
+    states_data = policies_data = values_data = NULL;
+    py::module_ numpy = py::module_::import("numpy");
+    for (int i = 0 ; i < 3 ; i++) {
+        arrays[i].attr("flush")();
+        if (rows < shard_size) {
+            // cut the preallocated shard down to the rows written: copy them and drop the mapping before rewriting
+            py::object kept = numpy.attr("array")(arrays[i][py::slice(0, (py::ssize_t) rows, 1)]);
+            arrays[i] = py::none();
+            numpy.attr("save")(shard_path(index, names[i]), kept);
+        }
+    }
+}
+
+void SelfPlayWriter::append(size_t n, size_t encoding_width, const float *states_rows, size_t policy_width,
+                            const float *policies_rows, const float *values_rows) {
+    if (n == 0) return;
+    if (encoding_width == 0 || policy_width == 0) {
+        throw std::invalid_argument("SelfPlayWriter: rows must hold an encoding and a policy");
+    }
+    if (encoding_size == 0) {               // the first rows fix the widths
+        encoding_size = encoding_width;
+        policy_size = policy_width;
+    } else if (encoding_width != encoding_size || policy_width != policy_size) {
+        throw std::invalid_argument("SelfPlayWriter: rows of " + std::to_string(encoding_width) + " + " +
+                                    std::to_string(policy_width) + " values, the shards hold " +
+                                    std::to_string(encoding_size) + " + " + std::to_string(policy_size));
+    }
+    for (size_t written = 0 ; written < n ;) {
+        if (states.is_none() || rows == shard_size) {
+            close_shard();
+            open_shard();
+        }
+        const size_t k = std::min(n - written, shard_size - rows);
+        memcpy(states_data + rows * encoding_size, states_rows + written * encoding_size,
+               k * encoding_size * sizeof(float));
+        memcpy(policies_data + rows * policy_size, policies_rows + written * policy_size,
+               k * policy_size * sizeof(float));
+        memcpy(values_data + rows, values_rows + written, k * sizeof(float));
+        rows += k;
+        written += k;
+        positions += k;
+    }
+}
+
+void SelfPlayWriter::close() {
+    close_shard();
+}
+
+
+/*** SelfPlayRunner ***/
+
+SelfPlayRunner::SelfPlayRunner(MCTS_state *starting_state, const std::string &directory, long max_iter,
+                               double max_seconds, size_t shard_size, size_t policy_size,
+                               double exploration_constant)
+        : starting_state(starting_state), writer(directory, shard_size), max_iter(max_iter),
+          max_seconds(max_seconds), exploration_constant(exploration_constant), policy_size(policy_size),
+          num_search_threads(1), sample_moves(0), seed(random_seed()), games(0) {
+    if (this->policy_size == 0) {
+        this->policy_size = starting_state->action_space_size();
+    }
+    if (this->policy_size == 0) {
+        std::queue<MCTS_move *> *actions = starting_state->actions_to_try();
+        this->policy_size = actions->size();
+        while (!actions->empty()) {
+            delete actions->front();
+            actions->pop();
+        }
+        delete actions;
+    }
+}
+
+unsigned long SelfPlayRunner::play(unsigned long n) {
+    const unsigned long before = writer.get_positions();
+    for (unsigned long i = 0 ; i < n ; i++) {
+        play_game();
+    }
+    return writer.get_positions() - before;
+}
+
+bool SelfPlayRunner::needs_gil() const {
+    return dynamic_cast<const PyMCTS_state *>(starting_state) != NULL;
+}
+
+std::vector<double> SelfPlayRunner::visit_distribution(const MCTS_node *root) const {
+    /** Share of the root's visits of every move, indexed by action in a fixed action space, else in actions_to_try()
+     * order (the index each edge keeps, see MCTS_edge::action_order). */
+    double total = 0.0;
+    for (size_t e = 0 ; e < root->edges.size() ; e++) total += root->child_visits[e];
+    if (root->state->action_space_size() > 0) {
+        std::vector<double> policy(policy_size, 0.0);
+        for (size_t e = 0 ; e < root->edges.size() ; e++) {
+            const long action = root->edges[e].move->action_index();
+            if (action < 0 || (size_t) action >= policy_size) {
+                throw std::invalid_argument("SelfPlayRunner: action " + std::to_string(action) + " is outside "
+                                            "policy_size (" + std::to_string(policy_size) + ")");
+            }
+            if (total > 0.0) policy[action] = root->child_visits[e] / total;
+        }
+        return policy;
+    }
+    if (root->edges.size() > policy_size) {
+        throw std::invalid_argument("SelfPlayRunner: a position has " + std::to_string(root->edges.size()) +
+                                    " moves, more than policy_size (" + std::to_string(policy_size) + ")");
+    }
+    std::vector<double> policy(policy_size, 0.0);
+    for (size_t e = 0 ; e < root->edges.size() && total > 0.0 ; e++) {
+        policy[root->edges[e].action_order] = root->child_visits[e] / total;
+    }
+    return policy;
+}
+
+const MCTS_move *SelfPlayRunner::sample_move(const MCTS_node *root) const {
+    double total = 0.0;
+    for (size_t e = 0 ; e < root->edges.size() ; e++) total += root->child_visits[e];
+    if (total <= 0.0) return NULL;
+    double r = thread_rng().uniform() * total;
+    for (size_t e = 0 ; e < root->edges.size() ; e++) {
+        r -= root->child_visits[e];
+        if (r < 0.0 && root->child_visits[e] > 0.0) return root->edges[e].move;
+    }
+    return NULL;
+}
+
+void SelfPlayRunner::play_game() {
+    MCTS_agent agent(starting_state, (int) max_iter, max_seconds, exploration_constant);   // the tree copies it
+    agent.set_num_search_threads(num_search_threads);
+    agent.set_seed(mix_seed(seed, games));
+    const SearchBudget budget = agent.get_budget();
+    MCTS_tree *tree = agent.get_tree();
+    std::vector<float> states_rows, policies_rows;
+    std::vector<bool> self_turns;
+    size_t encoding_width = 0;
+    for (unsigned int move_number = 0 ; agent.search(NULL, budget) ; move_number++) {
+        const MCTS_node *root = tree->get_root();
+        std::vector<double> encoding = root->state->encode();
+        if (encoding.empty()) {
+            throw std::invalid_argument("SelfPlayRunner: the states must implement encode()");
+        }
+        if (encoding_width == 0) encoding_width = encoding.size();
+        if (encoding.size() != encoding_width) {
+            throw std::invalid_argument("SelfPlayRunner: encode() gave " + std::to_string(encoding.size()) +
+                                        " values after " + std::to_string(encoding_width));
+        }
+        std::vector<double> policy = visit_distribution(root);
+        states_rows.insert(states_rows.end(), encoding.begin(), encoding.end());
+        policies_rows.insert(policies_rows.end(), policy.begin(), policy.end());
+        self_turns.push_back(root->state->is_self_side_turn());
+
+        const MCTS_move *move = (move_number < sample_moves) ? sample_move(root) : NULL;
+        if (move != NULL) {
+            tree->advance_tree(move);
+        } else if (agent.play_best_move() == NULL) {
+            break;
+        }
+    }
+    // outcome for the self side, then for the side to move at each position
+    const double outcome = agent.get_current_state()->is_terminal() ? agent.get_current_state()->rollout() : 0.5;
+    std::vector<float> values_rows(self_turns.size());
+    for (size_t i = 0 ; i < self_turns.size() ; i++) {
+        values_rows[i] = (float) (self_turns[i] ? outcome : 1.0 - outcome);
+    }
+    games++;
+    py::gil_scoped_acquire gil;
+    writer.append(self_turns.size(), encoding_width, states_rows.data(), policy_size, policies_rows.data(),
+                  values_rows.data());
+}
+
+
+/*** SelfPlayReader ***/
+
+SelfPlayReader::SelfPlayReader(const std::string &directory, size_t chunk_size, const std::string &prefix)
+        : chunk_size(std::max((size_t) 1, chunk_size)), shard(0), row(0), states(py::none()),
+          policies(py::none()), values(py::none()) {
+    py::list found = py::module_::import("glob").attr("glob")(directory + "/" + prefix + "-*.values.npy");
+    found.attr("sort")();
+    for (auto path : found) {
+        std::string values_path = path.cast<std::string>();
+        shards.push_back(values_path.substr(0, values_path.size() - strlen(".values.npy")));
+    }
+}
+
+void SelfPlayReader::open(size_t index) {
+    py::object load = py::module_::import("numpy").attr("load");
+    states = load(shards[index] + ".states.npy", "mmap_mode"_a = "r");
+    policies = load(shards[index] + ".policies.npy", "mmap_mode"_a = "r");
+    values = load(shards[index] + ".values.npy", "mmap_mode"_a = "r");
+    row = 0;
+}
+
+py::tuple SelfPlayReader::next() {
+    while (true) {
+        if (values.is_none()) {
+            if (shard >= shards.size()) throw py::stop_iteration();
+            open(shard);
+        }
+        const size_t n = py::len(values);
+        if (row < n) {
+            const size_t end = std::min(n, row + chunk_size);
+            py::slice rows((py::ssize_t) row, (py::ssize_t) end, 1);
+            row = end;
+            return py::make_tuple(states[rows], policies[rows], values[rows]);
+        }
+        states = policies = values = py::none();
+        shard++;
+    }
+}
+
+size_t SelfPlayReader::get_positions() const {
+    py::object load = py::module_::import("numpy").attr("load");
+    size_t total = 0;
+    for (const std::string &path : shards) {
+        total += py::len(load(path + ".values.npy", "mmap_mode"_a = "r"));
+    }
+    return total;
+}
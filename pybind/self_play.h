@@ -0,0 +1,117 @@
+#ifndef SELF_PLAY_H
+#define SELF_PLAY_H
+
+#include <pybind11/pybind11.h>
+#include <string>
+#include <vector>
+#include "mcts_python.h"
+
+namespace py = pybind11;
+
+#define SELF_PLAY_DEFAULT_SHARD_SIZE 65536      // positions per shard
+#define SELF_PLAY_READ_CHUNK 4096               // rows per chunk given by SelfPlayReader
+
+
+/**
+ * Positions recorded by SelfPlayRunner, in shards of three .npy files (float32) in a directory:
+ * - <prefix>-<index>.states.npy   [rows, encoding size]   MCTS_state::encode() of the position
+ * - <prefix>-<index>.policies.npy [rows, policy size]     share of the root's visits of every move, by action
+ *                                                          index in a fixed action space, else in actions_to_try()
+ *                                                          order, zero padded
+ * - <prefix>-<index>.values.npy   [rows]                  outcome of the game for the side to move: 1 win, 0 loss
+ * A shard is preallocated with shard_size rows and memory mapped (numpy.lib.format.open_memmap), rows are copied
+ * into the mapping in bulk. The last shard is cut down to the rows written when the writer is closed.
+ * Needs NumPy, only imported when the first shard is opened. Every method needs the GIL.
+ */
+class SelfPlayWriter {
+    std::string directory, prefix;
+    size_t shard_size;
+    size_t encoding_size, policy_size;          // row widths, fixed by the first rows written
+    unsigned int next_shard;                    // index of the next shard to open
+    py::object states, policies, values;        // memory maps of the open shard (None if no shard is open)
+    float *states_data, *policies_data, *values_data;
+    size_t rows;                                // rows written to the open shard
+    unsigned long positions;                    // rows written since the writer was created
+    unsigned int shards;                        // shards opened since the writer was created
+    std::string shard_path(unsigned int index, const char *array) const;
+    void open_shard();
+    void close_shard();
+public:
+    SelfPlayWriter(const std::string &directory, size_t shard_size = SELF_PLAY_DEFAULT_SHARD_SIZE,
+                   const std::string &prefix = "selfplay");
+    ~SelfPlayWriter();
+    // appends n rows, states and policies hold n rows of their width each
+    void append(size_t n, size_t encoding_width, const float *states_rows, size_t policy_width,
+                const float *policies_rows, const float *values_rows);
+    void close();                               // closes the open shard, the next append opens a new one
+    unsigned long get_positions() const { return positions; }
+    unsigned int get_shards() const { return shards; }
+    size_t get_shard_size() const { return shard_size; }
+    const std::string &get_directory() const { return directory; }
+};
+
+
+/**
+ * Self-play data generation: an agent plays games against itself and every position it searched is recorded with
+ * its encoding, the visit distribution of the root's moves and the final outcome. The positions of a game are kept
+ * in memory until the game is over, then appended to the writer in one go. Notes:
+ * - The first sample_moves moves of every game are drawn in proportion to the root's visits, the others are the
+ * agent's best move.
+ * - The outcome is the rollout() value of the final state (1 if the self side won), turned into the point of view
+ * of the side to move at each position.
+ * - policy_size is the width of the policy rows (0: the size of the action space, or without a fixed one the number
+ * of moves at the starting position). A position with more moves, or an action index beyond it, is an error.
+ */
+class SelfPlayRunner {
+    MCTS_state *starting_state;                 // not owned, every game starts from a copy
+    SelfPlayWriter writer;
+    long max_iter;
+    double max_seconds;
+    double exploration_constant;
+    size_t policy_size;
+    int num_search_threads;
+    unsigned int sample_moves;
+    uint64_t seed;                              // game i of the runner is searched with seed mix_seed(seed, i)
+    unsigned long games;                        // games played since the runner was created
+    void play_game();
+    std::vector<double> visit_distribution(const MCTS_node *root) const;     // a policy row
+    const MCTS_move *sample_move(const MCTS_node *root) const;               // drawn in proportion to the visits
+public:
+    SelfPlayRunner(MCTS_state *starting_state, const std::string &directory, long max_iter = 800,
+                   double max_seconds = -1.0, size_t shard_size = SELF_PLAY_DEFAULT_SHARD_SIZE,
+                   size_t policy_size = 0, double exploration_constant = 1.41);
+    unsigned long play(unsigned long games);    // returns the positions recorded
+    bool needs_gil() const;                     // like MCTS_tree::needs_gil, for the starting state
+    void close() { writer.close(); }
+    SelfPlayWriter &get_writer() { return writer; }
+    unsigned long get_games() const { return games; }
+    size_t get_policy_size() const { return policy_size; }
+    void set_num_search_threads(int n) { num_search_threads = n; }
+    int get_num_search_threads() const { return num_search_threads; }
+    void set_sample_moves(unsigned int n) { sample_moves = n; }
+    unsigned int get_sample_moves() const { return sample_moves; }
+    void set_seed(uint64_t s) { seed = s; }    // with one search thread, a new runner with this seed replays its games
+    uint64_t get_seed() const { return seed; }
+};
+
+
+/**
+ * Streams the shards of a SelfPlayWriter directory as chunks of rows (states, policies, values). The shards are
+ * opened memory mapped (numpy.load(mmap_mode="r")) one at a time and the chunks are views of them, so nothing is
+ * read before it is used.
+ */
+class SelfPlayReader {
+    std::vector<std::string> shards;            // paths of the shards without the array suffix, in order
+    size_t chunk_size;
+    size_t shard, row;                          // position of the next chunk
+    py::object states, policies, values;        // the shard being read
+    void open(size_t index);
+public:
+    SelfPlayReader(const std::string &directory, size_t chunk_size = SELF_PLAY_READ_CHUNK,
+                   const std::string &prefix = "selfplay");
+    py::tuple next();                           // raises StopIteration after the last chunk
+    size_t get_num_shards() const { return shards.size(); }
+    size_t get_positions() const;               // rows in all shards, read from the headers only
+};
+
+#endif
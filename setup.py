@@ -12,6 +12,7 @@ ext_modules = [
             "pybind/pymcts.cpp",
             "pybind/py_wrappers.cpp",
             "pybind/mcts_python.cpp",  # Use Python-specific MCTS implementation
+            "pybind/self_play.cpp",
             "examples/TicTacToe/TicTacToe.cpp",
         ],
         include_dirs=[
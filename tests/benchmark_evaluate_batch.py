@@ -0,0 +1,90 @@
+"""Benchmark of the two evaluate_batch protocols: a list of (value, [priors]) tuples versus (values, priors) arrays
+read through the buffer protocol.
+
+Searches many games at once with MultiTreeSearch (first argument, batches of the second argument) in a game of 80
+moves per position. Both evaluators return precomputed results, so the difference is what the engine spends reading
+them. Reports the evaluate_batch calls and the states evaluated per second.
+"""
+import sys
+import os
+
+# Ensure pymcts can be imported from current directory or parent directory
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.abspath(os.path.join(script_dir, ".."))
+sys.path.append(script_dir)
+sys.path.append(parent_dir)
+
+try:
+    import numpy as np
+    import pymcts
+except ImportError:
+    print("Error: pymcts module or NumPy not found. Please build/install them first.")
+    sys.exit(1)
+
+ACTIONS = 80
+
+
+class Move(pymcts.MCTS_move):
+    def __init__(self, value):
+        super().__init__()
+        self.value = value
+        self.move_id = value
+
+    def __eq__(self, other):
+        return isinstance(other, Move) and self.value == other.value
+
+
+class State(pymcts.MCTS_state):
+    def __init__(self, depth=0):
+        super().__init__()
+        self.depth = depth
+
+    def actions_to_try(self):
+        return [] if self.is_terminal() else [Move(i) for i in range(ACTIONS)]
+
+    def next_state(self, move):
+        return type(self)(self.depth + 1)
+
+    def rollout(self):
+        return 0.5
+
+    def is_terminal(self):
+        return self.depth >= 10
+
+    def is_self_side_turn(self):
+        return self.depth % 2 == 0
+
+    def clone(self):
+        return type(self)(self.depth)
+
+
+PRIORS = list(np.random.default_rng(0).dirichlet(np.ones(ACTIONS)))
+
+
+class TupleState(State):
+    def evaluate_batch(self, states):
+        return [(0.5, PRIORS)] * len(states)
+
+
+VALUES_ARRAY = np.full(4096, 0.5, dtype=np.float32)
+PRIORS_ARRAY = np.tile(np.array(PRIORS, dtype=np.float32), (4096, 1))
+
+
+class ArrayState(State):
+    def evaluate_batch(self, states):
+        return VALUES_ARRAY[:len(states)], PRIORS_ARRAY[:len(states)]
+
+
+def benchmark(games=256, batch_size=256, iterations=32):
+    print(f"{games} games, {iterations} evaluations per game, batches of {batch_size}, {ACTIONS} moves")
+    print(f"{'Protocol':>10} | {'Calls':>8} | {'Evals/s':>12}")
+    print("-" * 38)
+    for name, state_class in (("tuples", TupleState), ("arrays", ArrayState)):
+        trees = [pymcts.MCTS_tree(pymcts.SerializedPythonState(state_class())) for _ in range(games)]
+        search = pymcts.MultiTreeSearch(trees, batch_size)
+        search.search(iterations)
+        print(f"{name:>10} | {search.batches:8d} | {search.evaluations_per_second:12,.0f}")
+
+
+if __name__ == "__main__":
+    benchmark(*(int(arg) for arg in sys.argv[1:4]))
@@ -0,0 +1,68 @@
+"""Throughput benchmark for independent agents searching from Python threads.
+
+Runs one TicTacToe agent per worker of a ThreadPoolExecutor, for an increasing number of workers (powers of two up to
+the number of hardware threads, or up to the second argument). genmove() releases the GIL while it searches native
+states, so the agents search in parallel: the report gives the total iterations per second, the speedup over one
+worker and the parallel efficiency. Each agent searches with a single thread so that the workers are the only source
+of parallelism.
+"""
+import sys
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Ensure pymcts can be imported from current directory or parent directory
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.abspath(os.path.join(script_dir, ".."))
+sys.path.append(script_dir)
+sys.path.append(parent_dir)
+
+try:
+    import pymcts
+except ImportError:
+    print("Error: pymcts module not found. Please build it first.")
+    sys.exit(1)
+
+from benchmark_tree_parallel import thread_counts
+
+
+def search(iterations, moves):
+    """Plays `moves` moves of a fresh game, returns the iterations made."""
+    agent = pymcts.MCTS_agent(pymcts.TicTacToe_state(), iterations, 3600)
+    agent.num_search_threads = 1
+    done = 0
+    for _ in range(moves):
+        if agent.get_current_state().is_terminal():
+            break
+        agent.genmove(None)
+        done += agent.tree.search_iterations
+    return done
+
+
+def iterations_per_second(workers, iterations, moves, repeats=3):
+    best = 0.0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            total = sum(pool.map(lambda _: search(iterations, moves), range(workers)))
+            best = max(best, total / (time.perf_counter() - start))
+    return best
+
+
+def benchmark_agents(iterations=50000, max_workers=None, moves=3):
+    hardware = pymcts.get_hardware_concurrency()
+    print(f"Multi-agent throughput, {moves} moves of {iterations:,d} iterations per agent, "
+          f"{hardware} hardware threads")
+    print(f"{'Agents':>8} | {'Iterations/s':>14} | {'Speedup':>8} | {'Efficiency':>10}")
+    print("-" * 50)
+    baseline = None
+    for workers in thread_counts(max_workers or hardware):
+        rate = iterations_per_second(workers, iterations, moves)
+        baseline = baseline or rate
+        speedup = rate / baseline
+        print(f"{workers:8d} | {rate:14,.0f} | {speedup:7.2f}x | {100.0 * speedup / workers:9.1f}%")
+
+
+if __name__ == "__main__":
+    benchmark_agents(int(sys.argv[1]) if len(sys.argv) > 1 else 50000,
+                     int(sys.argv[2]) if len(sys.argv) > 2 else None)
@@ -0,0 +1,97 @@
+"""Benchmark of cross-game batching: K games searched one at a time (each agent batching the leaves of its own tree)
+versus all at once with MultiTreeSearch.
+
+The evaluator stands for a neural network: every evaluate_batch call costs a fixed overhead plus a small cost per
+state, so full batches pay off. The report gives, for both drivers, the evaluate_batch calls, the mean batch occupancy
+counting distinct states only (a batch may hold the same leaf several times) and the distinct states evaluated per
+second.
+"""
+import sys
+import os
+import time
+
+# Ensure pymcts can be imported from current directory or parent directory
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.abspath(os.path.join(script_dir, ".."))
+sys.path.append(script_dir)
+sys.path.append(parent_dir)
+
+try:
+    import pymcts
+except ImportError:
+    print("Error: pymcts module not found. Please build it first.")
+    sys.exit(1)
+
+CALL_SECONDS = 0.002          # fixed cost of one evaluate_batch call
+STATE_SECONDS = 0.00002       # cost per state in the batch
+
+
+class Move(pymcts.MCTS_move):
+    def __init__(self, value):
+        super().__init__()
+        self.value = value
+
+    def __eq__(self, other):
+        return isinstance(other, Move) and self.value == other.value
+
+
+class State(pymcts.MCTS_state):
+    batch_sizes = []          # distinct states of every evaluate_batch call
+
+    def __init__(self, depth=0):
+        super().__init__()
+        self.depth = depth
+
+    def actions_to_try(self):
+        return [] if self.is_terminal() else [Move(i) for i in range(4)]
+
+    def next_state(self, move):
+        return State(self.depth + 1)
+
+    def rollout(self):
+        return 0.5
+
+    def is_terminal(self):
+        return self.depth >= 12
+
+    def is_self_side_turn(self):
+        return self.depth % 2 == 0
+
+    def clone(self):
+        return State(self.depth)
+
+    def evaluate_batch(self, states):
+        State.batch_sizes.append(len({id(state) for state in states}))
+        time.sleep(CALL_SECONDS + STATE_SECONDS * len(states))
+        return [(0.5, [0.25] * 4) for _ in states]
+
+
+def report(name, batch_size, elapsed):
+    sizes = State.batch_sizes
+    evaluations = sum(sizes)
+    occupancy = evaluations / (len(sizes) * batch_size) if sizes else 0.0
+    print(f"{name:>12} | {len(sizes):8d} | {100.0 * occupancy:8.1f}% | {evaluations / elapsed:12,.0f}")
+
+
+def benchmark(games=64, iterations=64, batch_size=64):
+    print(f"{games} games, {iterations} evaluations per game, batches of {batch_size}")
+    print(f"{'Driver':>12} | {'Calls':>8} | {'Occupancy':>9} | {'Evals/s':>12}")
+    print("-" * 52)
+
+    State.batch_sizes = []
+    agents = [pymcts.MCTS_agent(pymcts.SerializedPythonState(State()), iterations, 3600) for _ in range(games)]
+    start = time.perf_counter()
+    for agent in agents:
+        agent.batch_size = batch_size
+        agent.genmove(None)
+    report("per tree", batch_size, time.perf_counter() - start)
+
+    State.batch_sizes = []
+    trees = [pymcts.MCTS_tree(pymcts.SerializedPythonState(State())) for _ in range(games)]
+    search = pymcts.MultiTreeSearch(trees, batch_size)
+    search.search(iterations)
+    report("multi-tree", batch_size, search.search_time)
+
+
+if __name__ == "__main__":
+    benchmark(*(int(arg) for arg in sys.argv[1:4]))
@@ -0,0 +1,132 @@
+"""Counts the Python-level calls the engine makes per expansion for a Python game state.
+
+Every MCTS_state method of the game below increments a counter, so the report shows how many times each
+crosses from C++ into Python (including __init__, i.e. state constructions) per node created by the search,
+both for the sequential rollout loop and for batched (evaluate_batch) search, and with the describe() hook that
+answers everything about a state in one call. The engine's own count (pymcts.get_python_crossings()) is reported
+as well.
+"""
+import sys
+import os
+from collections import Counter
+
+# Ensure pymcts can be imported from current directory or parent directory
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.abspath(os.path.join(script_dir, ".."))
+sys.path.append(script_dir)
+sys.path.append(parent_dir)
+
+try:
+    import pymcts
+except ImportError:
+    print("Error: pymcts module not found. Please build it first.")
+    sys.exit(1)
+
+CALLS = Counter()
+BRANCHING = 8
+DEPTH = 6
+
+
+class CountingMove(pymcts.MCTS_move):
+    def __init__(self, value):
+        super().__init__()
+        self.value = value
+        self.move_id = value            # moves are compared by id, not formatted with sprint() to identify them
+
+    def __eq__(self, other):
+        return isinstance(other, CountingMove) and self.value == other.value
+
+    def sprint(self):
+        return f"Move({self.value})"
+
+
+class CountingState(pymcts.MCTS_state):
+    def __init__(self, depth=0):
+        super().__init__()
+        CALLS["__init__"] += 1
+        self.depth = depth
+
+    def actions_to_try(self):
+        CALLS["actions_to_try"] += 1
+        return [CountingMove(i) for i in range(BRANCHING)]
+
+    def next_state(self, move):
+        CALLS["next_state"] += 1
+        return CountingState(self.depth + 1)
+
+    def clone(self):
+        CALLS["clone"] += 1
+        return CountingState(self.depth)
+
+    def rollout(self):
+        CALLS["rollout"] += 1
+        return 0.5
+
+    def is_terminal(self):
+        CALLS["is_terminal"] += 1
+        return self.depth >= DEPTH
+
+    def is_self_side_turn(self):
+        CALLS["is_self_side_turn"] += 1
+        return self.depth % 2 == 0
+
+    def get_action_probabilities(self):
+        CALLS["get_action_probabilities"] += 1
+        return [1.0 / BRANCHING] * BRANCHING
+
+
+class BatchedCountingState(CountingState):
+    def next_state(self, move):
+        CALLS["next_state"] += 1
+        return BatchedCountingState(self.depth + 1)
+
+    def clone(self):
+        CALLS["clone"] += 1
+        return BatchedCountingState(self.depth)
+
+    def evaluate_batch(self, states):
+        CALLS["evaluate_batch"] += 1
+        return [(0.5, [1.0 / BRANCHING] * BRANCHING) for _ in states]
+
+
+class DescribedCountingState(CountingState):
+    def next_state(self, move):
+        CALLS["next_state"] += 1
+        return DescribedCountingState(self.depth + 1)
+
+    def clone(self):
+        CALLS["clone"] += 1
+        return DescribedCountingState(self.depth)
+
+    def describe(self):
+        CALLS["describe"] += 1
+        if self.depth >= DEPTH:
+            return True, self.depth % 2 == 0, 0.5, None, None
+        return (False, self.depth % 2 == 0, None, [CountingMove(i) for i in range(BRANCHING)],
+                [1.0 / BRANCHING] * BRANCHING)
+
+
+def benchmark_calls_per_expansion(state_class, label, iterations=2000):
+    CALLS.clear()
+    tree = pymcts.MCTS_tree(pymcts.SerializedPythonState(state_class()))
+    CALLS.clear()                       # only count what the search itself does
+    pymcts.reset_python_crossings()
+    tree.grow_tree(iterations, 1000)
+    crossings = pymcts.get_python_crossings()
+    expansions = max(tree.nodes_created - 1, 1)
+    print(f"\n--- {label}: {expansions:,d} nodes created ---")
+    print(f"{'Method':>26} | {'Calls':>10} | {'Per expansion':>14}")
+    print("-" * 56)
+    for name, count in sorted(CALLS.items()):
+        print(f"{name:>26} | {count:10,d} | {count / expansions:14.3f}")
+    total = sum(CALLS.values())
+    print(f"{'total':>26} | {total:10,d} | {total / expansions:14.3f}")
+    print(f"{'engine crossings':>26} | {crossings:10,d} | {crossings / expansions:14.3f}")
+
+
+if __name__ == "__main__":
+    print("Python calls per expansion")
+    print("=" * 40)
+    benchmark_calls_per_expansion(CountingState, "Sequential search")
+    benchmark_calls_per_expansion(BatchedCountingState, "Batched search")
+    benchmark_calls_per_expansion(DescribedCountingState, "Sequential search with describe()")
@@ -0,0 +1,167 @@
+/** Microbenchmark for JobScheduler: throughput of many small jobs.
+ * Compares the work-stealing scheduler (one job at a time and in batches via schedule_many) with the previous
+ * design, kept below as LegacyJobScheduler: a single queue and condition variable behind one mutex that is taken
+ * twice per job, and an unordered_map lookup per tagged job. Reports jobs per second for 1 to 64 threads.
+ *
+ * Build & run:  make bench_scheduler && ./bench_scheduler [jobs [work_per_job [max_threads]]]
+ */
+#include <iostream>
+#include <iomanip>
+#include <chrono>
+#include <cstdlib>
+#include <queue>
+#include <unordered_map>
+#include <vector>
+#include <pthread.h>
+#include "../mcts/include/JobScheduler.h"
+
+
+/** The scheduler as it was before work stealing, reduced to what the benchmark needs. */
+class LegacyJobScheduler {
+    vector<pthread_t> threads;
+    volatile bool threads_must_exit;
+    queue<Job *> job_queue;
+    pthread_mutex_t queue_lock;
+    pthread_cond_t queue_cond;
+    pthread_cond_t jobs_finished_cond;
+    volatile unsigned int jobs_running;
+    unordered_map<int, volatile unsigned int> tagged_jobs_pending;
+
+    static void *thread_code(void *arg) {
+        LegacyJobScheduler *self = (LegacyJobScheduler *) arg;
+        while (!self->threads_must_exit) {
+            pthread_mutex_lock(&self->queue_lock);
+            while (self->job_queue.empty() && !self->threads_must_exit) {
+                pthread_cond_wait(&self->queue_cond, &self->queue_lock);
+            }
+            if (self->threads_must_exit) {
+                pthread_mutex_unlock(&self->queue_lock);
+                break;
+            }
+            Job *job = self->job_queue.front();
+            self->job_queue.pop();
+            self->jobs_running++;
+            pthread_mutex_unlock(&self->queue_lock);
+
+            int tag = job->TAG;
+            bool owned = job->OWNED;
+            job->run();
+            if (owned) delete job;
+
+            pthread_mutex_lock(&self->queue_lock);
+            int num = 0;
+            if (tag != NOTAG) num = --self->tagged_jobs_pending[tag];
+            self->jobs_running--;
+            if (num == 0 || self->jobs_running == 0) pthread_cond_broadcast(&self->jobs_finished_cond);
+            pthread_mutex_unlock(&self->queue_lock);
+        }
+        return NULL;
+    }
+
+public:
+    LegacyJobScheduler(unsigned int n) : threads(n), threads_must_exit(false), jobs_running(0) {
+        pthread_mutex_init(&queue_lock, NULL);
+        pthread_cond_init(&queue_cond, NULL);
+        pthread_cond_init(&jobs_finished_cond, NULL);
+        for (pthread_t &t : threads) pthread_create(&t, NULL, thread_code, this);
+    }
+    ~LegacyJobScheduler() {
+        waitUntilJobsHaveFinished();
+        threads_must_exit = true;
+        pthread_cond_broadcast(&queue_cond);
+        for (pthread_t &t : threads) pthread_join(t, NULL);
+        pthread_mutex_destroy(&queue_lock);
+        pthread_cond_destroy(&queue_cond);
+        pthread_cond_destroy(&jobs_finished_cond);
+    }
+    void schedule(Job *job) {
+        pthread_mutex_lock(&queue_lock);
+        if (job->TAG != NOTAG) {
+            auto it = tagged_jobs_pending.find(job->TAG);
+            if (it == tagged_jobs_pending.end()) tagged_jobs_pending.insert(make_pair(job->TAG, 1));
+            else (it->second)++;
+        }
+        job_queue.push(job);
+        pthread_cond_signal(&queue_cond);
+        pthread_mutex_unlock(&queue_lock);
+    }
+    void waitUntilJobsHaveFinished() {
+        pthread_mutex_lock(&queue_lock);
+        while (!job_queue.empty() || jobs_running > 0) {
+            pthread_cond_wait(&jobs_finished_cond, &queue_lock);
+        }
+        pthread_mutex_unlock(&queue_lock);
+    }
+};
+
+
+/** A rollout-sized job: a short arithmetic loop. Not owned, so allocation does not dominate the measurement. */
+class Bench_job : public Job {
+    int work;
+    volatile unsigned long long sink;
+public:
+    Bench_job(int work, int tag) : Job(tag, false), work(work), sink(0) {}
+    void run() override {
+        unsigned long long x = (unsigned long long) work;
+        for (int i = 0 ; i < work ; i++) x = x * 6364136223846793005ULL + 1442695040888963407ULL;
+        sink = x;
+    }
+};
+
+
+template <typename Scheduler>
+double one_at_a_time(Scheduler &scheduler, vector<Job *> &jobs) {
+    auto start = chrono::steady_clock::now();
+    for (Job *job : jobs) scheduler.schedule(job);
+    scheduler.waitUntilJobsHaveFinished();
+    auto end = chrono::steady_clock::now();
+    return (double) jobs.size() / chrono::duration<double>(end - start).count();
+}
+
+double batched(JobScheduler &scheduler, vector<Job *> &jobs, size_t batch) {
+    auto start = chrono::steady_clock::now();
+    for (size_t i = 0 ; i < jobs.size() ; i += batch) {
+        scheduler.schedule_many(jobs.data() + i, min(batch, jobs.size() - i));
+    }
+    scheduler.waitUntilJobsHaveFinished();
+    auto end = chrono::steady_clock::now();
+    return (double) jobs.size() / chrono::duration<double>(end - start).count();
+}
+
+
+int main(int argc, char **argv) {
+    int number_of_jobs = (argc > 1) ? atoi(argv[1]) : 200000;
+    int work = (argc > 2) ? atoi(argv[2]) : 100;
+    unsigned int max_threads = (argc > 3) ? (unsigned int) atoi(argv[3]) : 64;
+    const size_t batch = 64;
+
+    vector<Bench_job> storage;
+    storage.reserve(number_of_jobs);
+    vector<Job *> jobs;
+    for (int i = 0 ; i < number_of_jobs ; i++) {
+        storage.emplace_back(work, i % 8);            // tagged, as the old scheduler pays extra for tags
+        jobs.push_back(&storage.back());
+    }
+
+    cout << number_of_jobs << " jobs of " << work << " steps, " << thread::hardware_concurrency()
+         << " hardware threads (jobs/s, best of 3)" << endl;
+    cout << setw(8) << "Threads" << " | " << setw(12) << "Legacy" << " | " << setw(12) << "Stealing" << " | "
+         << setw(12) << "Batched" << " | " << setw(8) << "Speedup" << endl;
+    cout << "------------------------------------------------------------------" << endl;
+    for (unsigned int threads = 1 ; threads <= max_threads ; threads *= 2) {
+        double legacy = 0.0, stealing = 0.0, many = 0.0;
+        {
+            LegacyJobScheduler scheduler(threads);
+            for (int r = 0 ; r < 3 ; r++) legacy = max(legacy, one_at_a_time(scheduler, jobs));
+        }
+        {
+            JobScheduler scheduler(threads);
+            for (int r = 0 ; r < 3 ; r++) stealing = max(stealing, one_at_a_time(scheduler, jobs));
+            for (int r = 0 ; r < 3 ; r++) many = max(many, batched(scheduler, jobs, batch));
+        }
+        cout << setw(8) << threads << " | " << setw(12) << fixed << setprecision(0) << legacy << " | "
+             << setw(12) << stealing << " | " << setw(12) << many << " | "
+             << setw(7) << setprecision(2) << max(stealing, many) / legacy << "x" << endl;
+    }
+    return 0;
+}
@@ -0,0 +1,69 @@
+/** Microbenchmark for MCTS_node::select_best_child (PUCT/UCT argmax over a node's children).
+ * Builds a root with a configurable branching factor whose children all have a few visits, then times repeated
+ * selections and reports nanoseconds per scored child.
+ *
+ * Build & run:  make bench_selection && ./bench_selection [branching ...]
+ */
+#include <iostream>
+#include <iomanip>
+#include <chrono>
+#include <cstdlib>
+#include <vector>
+#include "../mcts/include/mcts.h"
+
+
+struct Bench_move : public MCTS_move {
+    int id;
+    explicit Bench_move(int id) : id(id) {}
+    bool operator==(const MCTS_move &other) const override { return id == ((const Bench_move &) other).id; }
+    std::vector<double> to_numpy() const override { return std::vector<double>(1, (double) id); }
+    std::vector<int> to_env_action() const override { return std::vector<int>(1, id); }
+};
+
+
+/** Every position has the same number of moves, rollouts are (almost) free and deterministic. */
+class Bench_state : public MCTS_state {
+    int branching, depth;
+public:
+    Bench_state(int branching, int depth = 0) : branching(branching), depth(depth) {}
+    queue<MCTS_move *> *actions_to_try() const override {
+        queue<MCTS_move *> *Q = new queue<MCTS_move *>();
+        for (int i = 0 ; i < branching ; i++) Q->push(new Bench_move(i));
+        return Q;
+    }
+    MCTS_state *next_state(const MCTS_move *move) const override {
+        return new Bench_state(branching, depth + 1);
+    }
+    double rollout() const override { return (depth % 3) / 2.0; }
+    bool is_terminal() const override { return depth >= 2; }
+    bool is_self_side_turn() const override { return depth % 2 == 0; }
+    MCTS_state *clone() const override { return new Bench_state(*this); }
+};
+
+
+int main(int argc, char **argv) {
+    vector<int> branchings;
+    for (int i = 1 ; i < argc ; i++) branchings.push_back(atoi(argv[i]));
+    if (branchings.empty()) branchings = {8, 32, 128, 512};
+    const long long target_children = 20000000;     // children scored per configuration
+
+    cout << setw(10) << "Branching" << " | " << setw(12) << "Selections" << " | " << setw(10) << "ns/child" << endl;
+    cout << "--------------------------------------" << endl;
+    for (int b : branchings) {
+        MCTS_tree tree(new Bench_state(b));
+        tree.grow_tree(b, 1000.0);           // exactly one expansion per root child
+        MCTS_node *root = tree.get_root();
+        long long selections = target_children / b;
+        const MCTS_node *sink = NULL;
+        auto start = chrono::steady_clock::now();
+        for (long long i = 0 ; i < selections ; i++) {
+            sink = root->select_best_child(1.41);
+        }
+        auto end = chrono::steady_clock::now();
+        double ns = chrono::duration<double, nano>(end - start).count();
+        if (sink == NULL) cerr << "Warning: no child selected" << endl;
+        cout << setw(10) << b << " | " << setw(12) << selections << " | "
+             << setw(10) << fixed << setprecision(3) << ns / (double) (selections * b) << endl;
+    }
+    return 0;
+}
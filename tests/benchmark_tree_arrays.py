@@ -0,0 +1,55 @@
+"""Benchmark of dumping a searched tree's statistics: walking it node by node from Python (get_children() and the
+node properties) versus MCTS_tree.to_arrays().
+
+Grows a TicTacToe tree of the given number of iterations (first argument) and reports the nodes dumped per second by
+both ways (best of three dumps).
+"""
+import sys
+import os
+import time
+
+# Ensure pymcts can be imported from current directory or parent directory
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.abspath(os.path.join(script_dir, ".."))
+sys.path.append(script_dir)
+sys.path.append(parent_dir)
+
+try:
+    import pymcts
+except ImportError:
+    print("Error: pymcts module not found. Please build it first.")
+    sys.exit(1)
+
+
+def walk(tree):
+    rows = []
+    stack = [(tree.root, -1, 0)]
+    while stack:
+        node, parent, depth = stack.pop()
+        rows.append((parent, node.visit_count, node.score, node.prior_probability, depth))
+        row = len(rows) - 1
+        stack.extend((child, row, depth + 1) for child in node.get_children())
+    return len(rows)
+
+
+def arrays(tree):
+    return len(tree.to_arrays()["visits"])
+
+
+def benchmark(iterations=200000):
+    tree = pymcts.MCTS_tree(pymcts.TicTacToe_state())
+    tree.grow_tree(iterations, 3600)
+    print(f"{tree.arena_size:,} nodes")
+    print(f"{'Dump':>12} | {'Seconds':>9} | {'Nodes/s':>14}")
+    print("-" * 42)
+    for name, dump in (("get_children", walk), ("to_arrays", arrays)):
+        elapsed = float("inf")
+        for _ in range(3):
+            start = time.perf_counter()
+            nodes = dump(tree)
+            elapsed = min(elapsed, time.perf_counter() - start)
+        print(f"{name:>12} | {elapsed:9.3f} | {nodes / elapsed:14,.0f}")
+
+
+if __name__ == "__main__":
+    benchmark(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,60 @@
+"""Scaling benchmark for tree-parallel search on native (C++) states.
+
+Grows a TicTacToe tree with an increasing number of search threads (powers of two up to the number of hardware
+threads, or up to the second argument) and reports iterations per second, the speedup over one thread and the
+parallel efficiency.
+"""
+import sys
+import os
+import time
+
+# Ensure pymcts can be imported from current directory or parent directory
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.abspath(os.path.join(script_dir, ".."))
+sys.path.append(script_dir)
+sys.path.append(parent_dir)
+
+try:
+    import pymcts
+except ImportError:
+    print("Error: pymcts module not found. Please build it first.")
+    sys.exit(1)
+
+
+def thread_counts(max_threads):
+    counts = [1]
+    while counts[-1] * 2 <= max_threads:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != max_threads:
+        counts.append(max_threads)
+    return counts
+
+
+def iterations_per_second(threads, iterations, repeats=3):
+    best = 0.0
+    for _ in range(repeats):
+        tree = pymcts.MCTS_tree(pymcts.TicTacToe_state())
+        tree.num_search_threads = threads
+        start = time.perf_counter()
+        tree.grow_tree(iterations, 3600)
+        elapsed = time.perf_counter() - start
+        best = max(best, tree.root.visit_count / elapsed)
+    return best
+
+
+def benchmark_scaling(iterations=200000, max_threads=None):
+    hardware = pymcts.get_hardware_concurrency()
+    print(f"Tree-parallel scaling, {iterations:,d} iterations, {hardware} hardware threads")
+    print(f"{'Threads':>8} | {'Iterations/s':>14} | {'Speedup':>8} | {'Efficiency':>10}")
+    print("-" * 50)
+    baseline = None
+    for threads in thread_counts(max_threads or hardware):
+        rate = iterations_per_second(threads, iterations)
+        baseline = baseline or rate
+        speedup = rate / baseline
+        print(f"{threads:8d} | {rate:14,.0f} | {speedup:7.2f}x | {100.0 * speedup / threads:9.1f}%")
+
+
+if __name__ == "__main__":
+    benchmark_scaling(int(sys.argv[1]) if len(sys.argv) > 1 else 200000,
+                      int(sys.argv[2]) if len(sys.argv) > 2 else None)
@@ -0,0 +1,126 @@
+"""Tests for the fixed action-space mode: states with action_space_size give their legal moves as action indices or a
+mask, the moves are native ActionMoves and priors are given per action index."""
+import pytest
+
+np = pytest.importorskip("numpy")
+
+LINES = [(0, 1, 2), (3, 4, 5), (6, 7, 8), (0, 3, 6), (1, 4, 7), (2, 5, 8), (0, 4, 8), (2, 4, 6)]
+
+
+def make_game(pymcts_module, legal="mask", probabilities=None, evaluate=None):
+    class TicTacToe(pymcts_module.MCTS_state):
+        """Tic-tac-toe with actions 0..8 (the cells), 'x' (1) is the self side."""
+        action_space_size = 9
+        given = []                          # what next_state() was given
+
+        def __init__(self, board=(0,) * 9, player=1):
+            super().__init__()
+            self.board = board
+            self.player = player
+        def winner(self):
+            for a, b, c in LINES:
+                if self.board[a] != 0 and self.board[a] == self.board[b] == self.board[c]:
+                    return self.board[a]
+            return 0
+        def legal_actions(self):
+            empty = [cell == 0 for cell in self.board]
+            if legal == "mask":
+                return np.array(empty, dtype=bool)
+            if legal == "indices":
+                return np.flatnonzero(empty).astype(np.int32)
+            if legal == "bools":
+                return empty
+            return [i for i in range(9) if empty[i]]
+        def next_state(self, action):
+            TicTacToe.given.append(action)
+            board = list(self.board)
+            board[action] = self.player
+            return TicTacToe(tuple(board), -self.player)
+        def rollout(self):
+            state = self
+            rng = np.random.default_rng()
+            while not state.is_terminal():
+                state = state.next_state(int(rng.choice(np.flatnonzero(np.array(state.board) == 0))))
+            return {1: 1.0, -1: 0.0, 0: 0.5}[state.winner()]
+        def is_terminal(self):
+            return self.winner() != 0 or 0 not in self.board
+        def is_self_side_turn(self):
+            return self.player == 1
+        def clone(self):
+            return TicTacToe(self.board, self.player)
+        def encode(self):
+            return [cell * self.player for cell in self.board]
+
+    if probabilities is not None:
+        TicTacToe.get_action_probabilities = lambda self: probabilities
+    if evaluate is not None:
+        TicTacToe.evaluate_batch = lambda self, states: evaluate(states)
+    TicTacToe.given = []
+    return TicTacToe
+
+
+def root_priors(tree):
+    stats = tree.root.children_stats()
+    return dict(zip(stats["move_id"].tolist(), stats["prior"].tolist()))
+
+
+@pytest.mark.parametrize("legal", ["mask", "indices", "bools", "ints"])
+def test_legal_actions(pymcts_module, legal):
+    game = make_game(pymcts_module, legal)
+    board = (1, 0, -1, 0, 0, 0, 0, 0, 0)
+    tree = pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(game(board)))
+    tree.grow_tree(50, 10.0)
+    assert sorted(root_priors(tree)) == [1, 3, 4, 5, 6, 7, 8]
+    assert game.given and all(type(action) is int for action in game.given)
+
+
+def test_genmove_returns_action_moves(pymcts_module):
+    game = make_game(pymcts_module)
+    agent = pymcts_module.MCTS_agent(pymcts_module.SerializedPythonState(game()), 300, 10)
+    move = agent.genmove(None)
+    assert isinstance(move, pymcts_module.ActionMove)
+    assert 0 <= move.action < 9 and str(move) == str(move.action)
+    assert move == pymcts_module.ActionMove(move.action) and move != pymcts_module.ActionMove((move.action + 1) % 9)
+    # the opponent's move is given back as an ActionMove too (the returned move belongs to the tree until then)
+    played = move.action
+    enemy = next(a for a in range(9) if a != played)
+    reply = agent.genmove(pymcts_module.ActionMove(enemy))
+    assert reply.action not in (played, enemy)
+
+
+def test_priors_per_action(pymcts_module):
+    probabilities = [0.05, 0.3, 0.05, 0.05, 0.4, 0.05, 0.05, 0.05, 0.0]
+    game = make_game(pymcts_module, probabilities=probabilities)
+    tree = pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(game((0, 0, 0, 0, 1, 0, 0, 0, -1))))
+    tree.grow_tree(20, 10.0)
+    priors = root_priors(tree)
+    assert set(priors) == {0, 1, 2, 3, 5, 6, 7}
+    assert all(priors[action] == probabilities[action] for action in priors)
+
+
+def test_evaluator_priors_per_action(pymcts_module):
+    def evaluate(states):
+        priors = np.zeros((len(states), 9), dtype=np.float32)
+        priors[:, 4] = 100.0                            # the centre: illegal below, it is dropped
+        priors[:, 1] = 3.0
+        priors[:, 5] = 1.0
+        return np.full(len(states), 0.5, dtype=np.float32), priors
+
+    game = make_game(pymcts_module, evaluate=evaluate)
+    tree = pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(game((0, 0, 0, 0, 1, 0, 0, 0, -1))))
+    pymcts_module.MultiTreeSearch([tree], batch_size=4).search(20)
+    priors = root_priors(tree)
+    assert priors[1] == pytest.approx(0.75) and priors[5] == pytest.approx(0.25)
+    assert all(priors[action] == 0.0 for action in (0, 2, 3, 6, 7))
+
+
+def test_self_play_policies_are_indexed_by_action(pymcts_module, tmp_path):
+    game = make_game(pymcts_module)
+    runner = pymcts_module.SelfPlayRunner(pymcts_module.SerializedPythonState(game()), str(tmp_path), max_iter=100)
+    assert runner.policy_size == 9
+    runner.play(2)
+    runner.close()
+    reader = pymcts_module.SelfPlayReader(str(tmp_path))
+    states, policies, _ = (np.concatenate(arrays) for arrays in zip(*reader))
+    assert np.allclose(policies.sum(axis=1), 1.0)
+    assert (policies[states != 0] == 0).all()           # occupied cells get nothing
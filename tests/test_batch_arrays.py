@@ -0,0 +1,122 @@
+"""Tests for the array protocol of evaluate_batch: values and priors returned as arrays, read through the buffer
+protocol, with an optional legal-move mask."""
+import pytest
+
+import pymcts
+
+np = pytest.importorskip("numpy")
+
+
+class Move(pymcts.MCTS_move):
+    def __init__(self, value):
+        super().__init__()
+        self.value = value
+        self.move_id = value
+    def __eq__(self, other):
+        return isinstance(other, Move) and self.value == other.value
+
+
+class State(pymcts.MCTS_state):
+    """Four plies of three moves. The tests subclass it with the evaluate_batch they need."""
+    moves = 3
+
+    def __init__(self, depth=0):
+        super().__init__()
+        self.depth = depth
+    def actions_to_try(self):
+        return [] if self.is_terminal() else [Move(i) for i in range(self.moves)]
+    def next_state(self, move):
+        return type(self)(self.depth + 1)
+    def rollout(self):
+        return 0.5
+    def is_terminal(self):
+        return self.depth >= 4
+    def is_self_side_turn(self):
+        return self.depth % 2 == 0
+    def clone(self):
+        return type(self)(self.depth)
+
+
+def search(state_class, iterations=40):
+    tree = pymcts.MCTS_tree(pymcts.SerializedPythonState(state_class()))
+    pymcts.MultiTreeSearch([tree], batch_size=8).search(iterations)
+    return tree
+
+
+def root_priors(tree):
+    stats = tree.root.children_stats()
+    return stats["prior"][np.argsort(stats["move_id"])]
+
+
+def test_arrays_match_tuples():
+    class TupleState(State):
+        def evaluate_batch(self, states):
+            return [(0.6, [0.2, 0.3, 0.5]) for _ in states]
+
+    class ArrayState(State):
+        def evaluate_batch(self, states):
+            n = len(states)
+            return np.full(n, 0.6, dtype=np.float32), np.tile(np.array([2, 3, 5], dtype=np.float32), (n, 1))
+
+    with_tuples = search(TupleState)
+    with_arrays = search(ArrayState)
+    assert np.allclose(root_priors(with_arrays), [0.2, 0.3, 0.5])       # normalized
+    assert np.allclose(root_priors(with_arrays), root_priors(with_tuples))
+    assert np.isclose(with_arrays.root.score, with_tuples.root.score, rtol=1e-6)
+    assert with_arrays.root.visit_count == with_tuples.root.visit_count == 40
+
+
+def test_legal_mask():
+    class MaskedState(State):
+        def evaluate_batch(self, states):
+            n = len(states)
+            priors = np.tile(np.array([1, 1, 2, 7, 9], dtype=np.float32), (n, 1))
+            legal = np.zeros((n, 5), dtype=bool)
+            legal[:, :3] = True
+            return np.full(n, 0.5, dtype=np.float32), priors, legal
+
+    assert np.allclose(root_priors(search(MaskedState)), [0.25, 0.25, 0.5])
+
+
+def test_zero_priors_are_uniform_over_legal_moves():
+    class ZeroPriorState(State):
+        moves = 4
+        def evaluate_batch(self, states):
+            n = len(states)
+            legal = np.array([[1, 0, 1, 0]] * n, dtype=np.uint8)
+            return np.full(n, 0.5), np.zeros((n, 4)), legal             # float64 is read too
+
+    assert np.allclose(root_priors(search(ZeroPriorState)), [0.5, 0.0, 0.5, 0.0])
+
+
+def test_strided_arrays():
+    class StridedState(State):
+        def evaluate_batch(self, states):                               # neither array is contiguous
+            n = len(states)
+            values = np.full(2 * n, 0.7, dtype=np.float32)[::2]
+            priors = np.tile(np.array([2.0, 9.0, 3.0, 1.0, 5.0, 1.0], dtype=np.float32), (n, 1))[:, ::2]
+            return values, priors
+
+    assert np.allclose(root_priors(search(StridedState)), [0.2, 0.3, 0.5])
+
+
+def test_wrong_shapes():
+    class WrongShapeState(State):
+        def evaluate_batch(self, states):
+            n = len(states) + 1
+            return np.full(n, 0.5, dtype=np.float32), np.ones((n, 3), dtype=np.float32)
+
+    with pytest.raises(RuntimeError):
+        search(WrongShapeState)
+
+
+def test_batched_search():
+    class ArrayState(State):
+        def evaluate_batch(self, states):
+            n = len(states)
+            return np.full(n, 0.5, dtype=np.float32), np.tile(np.array([1, 1, 8], dtype=np.float32), (n, 1))
+
+    tree = pymcts.MCTS_tree(pymcts.SerializedPythonState(ArrayState()))
+    tree.num_search_threads = 2
+    tree.grow_tree(200, 10.0)
+    assert np.allclose(root_priors(tree), [0.1, 0.1, 0.8])
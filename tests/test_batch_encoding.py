@@ -0,0 +1,103 @@
+"""Tests for batched state encoding: states that declare encoding_shape are encoded into a reused float32 input
+tensor that is handed to evaluate_batch(states, inputs)."""
+import pytest
+
+np = pytest.importorskip("numpy")
+
+
+def make_state_class(pymcts_module, encode_into=True):
+    class Move(pymcts_module.MCTS_move):
+        def __init__(self, value):
+            super().__init__()
+            self.value = value
+        def __eq__(self, other):
+            return isinstance(other, Move) and self.value == other.value
+
+    class State(pymcts_module.MCTS_state):
+        encoding_shape = (2, 3)
+        calls = []                          # (inputs, states) of every evaluate_batch call
+
+        def __init__(self, moves=()):
+            super().__init__()
+            self.moves = moves
+        def actions_to_try(self):
+            return [] if self.is_terminal() else [Move(i) for i in range(3)]
+        def next_state(self, move):
+            return State(self.moves + (move.value,))
+        def rollout(self):
+            return 0.5
+        def is_terminal(self):
+            return len(self.moves) >= 4
+        def is_self_side_turn(self):
+            return len(self.moves) % 2 == 0
+        def clone(self):
+            return State(self.moves)
+        def planes(self):
+            planes = np.zeros((2, 3), dtype=np.float32)
+            for ply, move in enumerate(self.moves):
+                planes[ply % 2, move] += 1
+            return planes
+        def evaluate_batch(self, states, inputs):
+            State.calls.append((inputs, states))
+            for state, row in zip(states, inputs):
+                assert (row == state.planes()).all()
+            return [(0.5, [1 / 3] * 3) for _ in states]
+
+    if encode_into:
+        def encode_into(self, buffer, row):
+            buffer[row] += self.planes()            # the row is zeroed beforehand
+        State.encode_into = encode_into
+    else:
+        State.encode = lambda self: self.planes().ravel().tolist()
+    State.calls = []
+    return State
+
+
+@pytest.mark.parametrize("encode_into", [True, False])
+def test_states_are_encoded(pymcts_module, encode_into):
+    state_class = make_state_class(pymcts_module, encode_into)
+    tree = pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(state_class()))
+    pymcts_module.MultiTreeSearch([tree], batch_size=8).search(60)
+    assert tree.root.visit_count == 60
+    assert len(state_class.calls) > 1
+    for inputs, states in state_class.calls:
+        assert inputs.dtype == np.float32 and inputs.shape == (len(states), 2, 3)
+
+
+def test_the_buffer_is_reused(pymcts_module):
+    state_class = make_state_class(pymcts_module)
+    trees = [pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(state_class())) for _ in range(4)]
+    search = pymcts_module.MultiTreeSearch(trees, batch_size=8)
+    for _ in range(2):
+        search.search(30)
+        for tree in trees:
+            tree.advance_tree(tree.select_best_child().get_move())
+    # the first batch (the roots) is smaller, the buffer grows once and is then reused, across moves too
+    buffers = {inputs.__array_interface__["data"][0] for inputs, _ in state_class.calls[1:]}
+    assert len(buffers) == 1
+    assert all(inputs.base is not None for inputs, _ in state_class.calls)        # views of the buffer
+
+
+def test_batched_search(pymcts_module):
+    state_class = make_state_class(pymcts_module)
+    tree = pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(state_class()))
+    tree.num_search_threads = 2
+    tree.grow_tree(100, 10.0)
+    assert tree.root.visit_count >= 100
+    assert state_class.calls
+
+
+def test_states_without_encoding(pymcts_module):
+    state_class = make_state_class(pymcts_module)
+    del state_class.encode_into                     # neither encode_into nor encode
+    tree = pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(state_class()))
+    with pytest.raises(RuntimeError):
+        pymcts_module.MultiTreeSearch([tree], batch_size=8).search(10)
+
+
+def test_encoding_shape_is_read_once_per_class(pymcts_module):
+    state_class = make_state_class(pymcts_module)
+    tree = pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(state_class()))
+    state_class.encoding_shape = (6,)               # not seen: the class was probed when its first state was wrapped
+    pymcts_module.MultiTreeSearch([tree], batch_size=8).search(30)
+    assert all(inputs.shape[1:] == (2, 3) for inputs, _ in state_class.calls)
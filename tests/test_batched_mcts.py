@@ -228,6 +228,54 @@ def test_multi_thread_integration():
     print("test_multi_thread_integration passed!")
 
 
+class WideState(BatchedState):
+    """BatchedState with an AlphaZero-like branching factor that counts next_state calls."""
+    next_state_calls = 0
+    evaluations = 0
+
+    def actions_to_try(self):
+        if self.is_terminal():
+            return []
+        return [BatchedMove(i) for i in range(50)]
+
+    def is_terminal(self):
+        return self.moves_made >= 10
+
+    def next_state(self, move):
+        WideState.next_state_calls += 1
+        return WideState((self.turn + 1) % 2, self.moves_made + 1)
+
+    def clone(self):
+        return WideState(self.turn, self.moves_made)
+
+    def evaluate_batch(self, states):
+        WideState.evaluations += len(states)
+        return [(0.5, [1.0 / 50] * 50) for _ in states]
+
+
+def test_children_materialized_lazily():
+    """expand_with_priors must not compute child states: only edges that selection descends into do."""
+    WideState.next_state_calls = 0
+    WideState.evaluations = 0
+    tree = pymcts.MCTS_tree(pymcts.SerializedPythonState(WideState()))
+    tree.grow_tree(max_iter=40, max_time_in_seconds=5)
+
+    assert WideState.evaluations > 1
+    # one next_state per evaluated leaf (the root has none), instead of 50 per evaluation
+    assert WideState.next_state_calls <= WideState.evaluations
+
+
+def test_selected_children_have_states():
+    """Nodes handed to Python (select, get_children) are materialized, even when selection creates them."""
+    tree = pymcts.MCTS_tree(pymcts.SerializedPythonState(WideState()))
+    tree.grow_tree(max_iter=40, max_time_in_seconds=5)
+
+    node = tree.select(1.4)
+    assert node.get_current_state() is not None
+    node.expand()
+    assert all(child.get_current_state() is not None for child in tree.root.get_children())
+
+
 if __name__ == "__main__":
     print(f"Using pymcts from: {pymcts.__file__}")
     test_batched_mcts_config()
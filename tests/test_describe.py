@@ -0,0 +1,139 @@
+"""Tests for the single-call introspection protocol: states with describe() are asked for everything at once, and what
+a state class defines is probed once per class. Python crossings are counted by pymcts.get_python_crossings()."""
+from collections import Counter
+
+import pytest
+
+
+def make_game(pymcts_module, describe=True, actions=True, priors=True, terminal_value=True):
+    calls = Counter()
+
+    class Move(pymcts_module.MCTS_move):
+        def __init__(self, value):
+            super().__init__()
+            self.value = value
+            self.move_id = value
+        def __eq__(self, other):
+            return isinstance(other, Move) and self.value == other.value
+
+    class State(pymcts_module.MCTS_state):
+        def __init__(self, depth=0):
+            super().__init__()
+            self.depth = depth
+        def actions_to_try(self):
+            calls["actions_to_try"] += 1
+            return [Move(i) for i in range(4)]
+        def next_state(self, move):
+            return State(self.depth + 1)
+        def rollout(self):
+            calls["rollout"] += 1
+            return 0.25
+        def is_terminal(self):
+            calls["is_terminal"] += 1
+            return self.depth >= 6
+        def is_self_side_turn(self):
+            calls["is_self_side_turn"] += 1
+            return self.depth % 2 == 0
+        def clone(self):
+            return State(self.depth)
+        def get_action_probabilities(self):
+            calls["get_action_probabilities"] += 1
+            return [0.1, 0.2, 0.3, 0.4]
+
+    if describe:
+        def describe(self):
+            calls["describe"] += 1
+            terminal = self.depth >= 6
+            return (terminal, self.depth % 2 == 0, 0.25 if terminal and terminal_value else None,
+                    [Move(i) for i in range(4)] if actions else None, [0.1, 0.2, 0.3, 0.4] if priors else None)
+        State.describe = describe
+    return State, calls
+
+
+def search(pymcts_module, state_class, iterations=300):
+    tree = pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(state_class()))
+    pymcts_module.reset_python_crossings()
+    tree.grow_tree(iterations, 10.0)
+    return tree, pymcts_module.get_python_crossings() / tree.nodes_created
+
+
+def root_priors(tree):
+    return sorted(child.prior_probability for child in tree.root.get_children())
+
+
+def test_describe_replaces_the_separate_calls(pymcts_module):
+    state_class, calls = make_game(pymcts_module)
+    tree, _ = search(pymcts_module, state_class)
+    assert calls["describe"] > 0
+    assert not {"actions_to_try", "rollout", "is_terminal", "is_self_side_turn", "get_action_probabilities"} & set(calls)
+    assert root_priors(tree) == pytest.approx([0.1, 0.2, 0.3, 0.4])
+    assert tree.root.visit_count == 300
+
+
+def test_one_crossing_per_node(pymcts_module):
+    _, with_describe = search(pymcts_module, make_game(pymcts_module)[0])
+    _, without = search(pymcts_module, make_game(pymcts_module, describe=False)[0])
+    assert with_describe <= 2.0                 # next_state() and describe()
+    assert without > 3.5
+
+
+def test_missing_values_are_asked_for(pymcts_module):
+    state_class, calls = make_game(pymcts_module, actions=False, priors=False, terminal_value=False)
+    tree, _ = search(pymcts_module, state_class)
+    assert calls["actions_to_try"] > 0 and calls["get_action_probabilities"] > 0 and calls["rollout"] > 0
+    assert "is_terminal" not in calls and "is_self_side_turn" not in calls
+    assert root_priors(tree) == pytest.approx([0.1, 0.2, 0.3, 0.4])
+
+
+def test_classes_are_probed_once(pymcts_module):
+    state_class, _ = make_game(pymcts_module)
+    crossings = []
+    for _ in range(2):
+        pymcts_module.reset_python_crossings()
+        pymcts_module.SerializedPythonState(state_class())
+        crossings.append(pymcts_module.get_python_crossings())
+    assert crossings[1] == 1                    # describe() only
+    assert crossings[0] > crossings[1]
+
+
+def test_inherited_methods_are_not_called(pymcts_module):
+    state_class, _ = make_game(pymcts_module, describe=False)
+    _, with_priors = search(pymcts_module, make_game(pymcts_module, describe=False)[0])
+    del state_class.get_action_probabilities    # the pymcts.MCTS_state default is left
+    tree, without_priors = search(pymcts_module, state_class)
+    assert len(set(root_priors(tree))) == 1     # no priors
+    assert without_priors < with_priors
+
+
+def test_fixed_action_space(pymcts_module):
+    np = pytest.importorskip("numpy")
+
+    class State(pymcts_module.MCTS_state):
+        action_space_size = 5
+
+        def __init__(self, depth=0):
+            super().__init__()
+            self.depth = depth
+        def describe(self):
+            legal = np.array([True, False, True, True, False])
+            return self.depth >= 4, self.depth % 2 == 0, 0.5, legal, np.array([0.0, 0.0, 0.25, 0.75, 0.0])
+        def next_state(self, action):
+            assert action in (0, 2, 3)
+            return State(self.depth + 1)
+        def clone(self):
+            return State(self.depth)
+
+    tree = pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(State()))
+    tree.grow_tree(100, 10.0)
+    stats = tree.root.children_stats()
+    priors = dict(zip(stats["move_id"].tolist(), stats["prior"].tolist()))
+    assert priors == pytest.approx({0: 0.0, 2: 0.25, 3: 0.75})
+
+
+def test_batched_search(pymcts_module):
+    state_class, calls = make_game(pymcts_module)
+    state_class.evaluate_batch = lambda self, states: [(0.5, [0.25] * 4) for _ in states]
+    tree = pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(state_class()))
+    pymcts_module.MultiTreeSearch([tree], batch_size=8).search(60)
+    assert tree.root.visit_count >= 60
+    assert not {"actions_to_try", "is_terminal", "is_self_side_turn"} & set(calls)
@@ -0,0 +1,132 @@
+"""Tests for genmove_async: searching from asyncio without blocking the event loop."""
+import asyncio
+import time
+
+import pytest
+
+
+async def _await(function, *args):
+    return await function(*args)
+
+
+def test_genmove_async_plays_a_move(pymcts_module):
+    agent = pymcts_module.MCTS_agent(pymcts_module.TicTacToe_state(), 500, 30)
+
+    async def main():
+        return await agent.genmove_async()
+
+    assert asyncio.run(main()) is not None
+    assert agent.tree.search_iterations == 500
+    assert agent.get_current_state().get_turn() == 'o'
+
+
+def test_event_loop_keeps_running(pymcts_module):
+    agent = pymcts_module.MCTS_agent(pymcts_module.TicTacToe_state(), -1, 30)
+    agent.num_search_threads = 1
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        move = await agent.genmove_async(budget=pymcts_module.SearchBudget(max_seconds=0.3))
+        task.cancel()
+        return move, ticks
+
+    move, ticks = asyncio.run(main())
+    assert move is not None
+    assert agent.tree.stop_reason == "time"
+    assert ticks >= 10
+
+
+def test_budget_overrides_the_agent_limits(pymcts_module):
+    agent = pymcts_module.MCTS_agent(pymcts_module.TicTacToe_state(), 100000, 30)
+    budget = pymcts_module.SearchBudget(max_iter=200)
+    assert budget.max_iter == 200 and budget.max_seconds < 0
+    asyncio.run(_await(agent.genmove_async, None, budget))
+    assert agent.tree.search_iterations == 200
+    assert agent.max_iter == 100000
+
+
+def test_cancel_search_returns_the_best_move_so_far(pymcts_module):
+    agent = pymcts_module.MCTS_agent(pymcts_module.TicTacToe_state(), -1, 60)
+
+    async def main():
+        asyncio.get_running_loop().call_later(0.1, agent.cancel_search)
+        start = time.perf_counter()
+        move = await agent.genmove_async()
+        return move, time.perf_counter() - start
+
+    move, elapsed = asyncio.run(main())
+    assert move is not None
+    assert elapsed < 5
+    assert agent.tree.stop_reason == "cancelled"
+    assert agent.get_current_state().get_turn() == 'o'
+
+
+def test_cancel_search_while_idle_does_not_cancel_the_next_search(pymcts_module):
+    agent = pymcts_module.MCTS_agent(pymcts_module.TicTacToe_state(), 500, 30)
+    agent.cancel_search()
+    assert agent.genmove(None) is not None
+    assert agent.tree.search_iterations >= 500
+    assert agent.tree.stop_reason != "cancelled"
+
+
+def test_task_cancellation_stops_the_search_without_playing(pymcts_module):
+    agent = pymcts_module.MCTS_agent(pymcts_module.TicTacToe_state(), -1, 60)
+
+    async def main():
+        task = asyncio.create_task(_await(agent.genmove_async))
+        await asyncio.sleep(0.1)
+        start = time.perf_counter()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # the search stops by itself shortly after, and the agent can search again
+        while True:
+            try:
+                return await agent.genmove_async(budget=pymcts_module.SearchBudget(max_iter=100)), start
+            except RuntimeError:
+                assert time.perf_counter() - start < 5
+                await asyncio.sleep(0.01)
+
+    move, start = asyncio.run(main())
+    assert move is not None
+    assert agent.tree.search_iterations == 100
+    assert agent.get_current_state().get_turn() == 'o'      # only the second search played
+
+
+def test_python_states_search_asynchronously(pymcts_module, simple_python_state):
+    agent = pymcts_module.MCTS_agent(pymcts_module.SerializedPythonState(simple_python_state), 200, 30)
+
+    async def main():
+        return await agent.genmove_async()
+
+    assert asyncio.run(main()) is not None
+    assert agent.tree.search_iterations > 0
+
+
+def test_one_search_at_a_time(pymcts_module):
+    agent = pymcts_module.MCTS_agent(pymcts_module.TicTacToe_state(), -1, 60)
+
+    async def main():
+        future = agent.genmove_async()
+        with pytest.raises(RuntimeError):
+            agent.genmove(None)
+        with pytest.raises(RuntimeError):
+            agent.genmove_async()
+        agent.cancel_search()
+        return await future
+
+    assert asyncio.run(main()) is not None
+
+
+def test_needs_a_running_event_loop(pymcts_module):
+    agent = pymcts_module.MCTS_agent(pymcts_module.TicTacToe_state(), 100, 30)
+    with pytest.raises(RuntimeError):
+        agent.genmove_async()
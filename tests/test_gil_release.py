@@ -0,0 +1,59 @@
+"""Tests for searching without the GIL: other Python threads keep running while a tree grows."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Spinner:
+    """Counts loop turns in a Python thread, i.e. how much Python ran meanwhile."""
+    def __init__(self):
+        self.spins = 0
+        self.running = True
+        self.thread = threading.Thread(target=self.spin)
+
+    def spin(self):
+        while self.running:
+            self.spins += 1
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.running = False
+        self.thread.join()
+
+
+def test_native_search_releases_the_gil(pymcts_module, tictactoe_state):
+    tree = pymcts_module.MCTS_tree(tictactoe_state)
+    tree.num_search_threads = 1
+    with Spinner() as spinner:
+        tree.grow_tree(max_iter=-1, max_time_in_seconds=0.3)
+        spins = spinner.spins
+    assert tree.search_iterations > 0
+    assert spins > 1000
+
+
+def test_python_state_search_takes_the_gil_per_call(pymcts_module, simple_python_state):
+    tree = pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(simple_python_state))
+    with Spinner() as spinner:
+        tree.grow_tree(max_iter=-1, max_time_in_seconds=0.3)
+        spins = spinner.spins
+    assert tree.search_iterations > 0
+    assert spins > 1000
+
+
+def test_agents_search_from_a_thread_pool(pymcts_module):
+    def play(seed):
+        agent = pymcts_module.MCTS_agent(pymcts_module.TicTacToe_state(), 300, 30)
+        agent.num_search_threads = 1
+        agent.seed = seed
+        moves = []
+        while not agent.get_current_state().is_terminal():
+            move = agent.genmove(None)
+            moves.append((move.x, move.y))
+        return moves
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        games = list(pool.map(play, [1, 2, 3, 4, 1]))
+    assert all(len(game) >= 5 for game in games)
+    assert games[0] == games[4]                 # searches did not interfere
@@ -0,0 +1,76 @@
+"""Tests for deferred move generation: actions_to_try() runs only when a node is first expanded."""
+import pytest
+
+
+@pytest.fixture
+def counting_state_class(pymcts_module):
+    class CountingMove(pymcts_module.MCTS_move):
+        def __init__(self, value):
+            super().__init__()
+            self.value = value
+        def __eq__(self, other):
+            return isinstance(other, CountingMove) and self.value == other.value
+        def sprint(self):
+            return f"Move({self.value})"
+
+    class CountingState(pymcts_module.MCTS_state):
+        generated = 0
+        cloned = 0
+
+        def __init__(self, depth=0):
+            super().__init__()
+            self.depth = depth
+        def actions_to_try(self):
+            CountingState.generated += 1
+            return [CountingMove(i) for i in range(4)]
+        def next_state(self, move):
+            return CountingState(self.depth + 1)
+        def rollout(self):
+            return 0.5
+        def is_terminal(self):
+            return self.depth >= 4
+        def is_self_side_turn(self):
+            return self.depth % 2 == 0
+        def clone(self):
+            CountingState.cloned += 1
+            return CountingState(self.depth)
+
+    CountingState.generated = 0
+    CountingState.cloned = 0
+    return CountingState
+
+
+def test_new_tree_does_not_generate_moves(pymcts_module, counting_state_class):
+    tree = pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(counting_state_class()))
+    assert counting_state_class.generated == 0
+    assert tree.nodes_created == 1
+    assert tree.move_generations == 0
+    assert tree.nodes_without_moves == 1
+
+
+def test_only_expanded_nodes_generate_moves(pymcts_module, counting_state_class):
+    tree = pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(counting_state_class()))
+    tree.grow_tree(max_iter=5, max_time_in_seconds=5)
+    # the root is expanded four times, then one child gets expanded; the other leaves never needed moves
+    assert tree.move_generations == counting_state_class.generated == 2
+    assert tree.nodes_created == 6
+    assert tree.nodes_without_moves == 4
+
+
+def test_counters_survive_advance_tree(pymcts_module, tictactoe_state):
+    tree = pymcts_module.MCTS_tree(tictactoe_state)
+    tree.grow_tree(max_iter=300, max_time_in_seconds=5)
+    created, generated = tree.nodes_created, tree.move_generations
+    assert 0 < generated < created
+    tree.advance_tree(tree.select_best_child().get_move())
+    assert tree.nodes_created == created
+    assert tree.move_generations == generated
+
+
+def test_expansion_adopts_states_without_cloning(pymcts_module, counting_state_class):
+    """Only the user's root state is cloned, states produced by next_state() are adopted by their nodes."""
+    tree = pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(counting_state_class()))
+    assert counting_state_class.cloned == 1
+    tree.grow_tree(max_iter=50, max_time_in_seconds=5)
+    assert tree.nodes_created > 1
+    assert counting_state_class.cloned == 1
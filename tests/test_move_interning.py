@@ -0,0 +1,87 @@
+"""Tests for move interning and lazy move metadata: moves with a move_id are compared by id, shared per game and only
+formatted (sprint) when asked."""
+import gc
+import weakref
+
+import pytest
+
+
+def make_game(pymcts_module, with_move_id=True):
+    calls = {"sprint": 0, "__eq__": 0}
+    alive = []                                  # weak references to every move created
+
+    class Move(pymcts_module.MCTS_move):
+        def __init__(self, value):
+            super().__init__()
+            self.value = value
+            if with_move_id:
+                self.move_id = value
+            alive.append(weakref.ref(self))
+        def __eq__(self, other):
+            calls["__eq__"] += 1
+            return isinstance(other, Move) and self.value == other.value
+        __hash__ = None
+        def sprint(self):
+            calls["sprint"] += 1
+            return f"Move({self.value})"
+
+    class State(pymcts_module.MCTS_state):
+        def __init__(self, depth=0):
+            super().__init__()
+            self.depth = depth
+        def actions_to_try(self):
+            return [] if self.is_terminal() else [Move(i) for i in range(4)]
+        def next_state(self, move):
+            return State(self.depth + 1)
+        def rollout(self):
+            return 0.5
+        def is_terminal(self):
+            return self.depth >= 5
+        def is_self_side_turn(self):
+            return self.depth % 2 == 0
+        def clone(self):
+            return State(self.depth)
+
+    return State, Move, calls, alive
+
+
+def count_alive(references):
+    gc.collect()
+    return sum(reference() is not None for reference in references)
+
+
+def search_two_trees(pymcts_module, state_class):
+    trees = [pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(state_class())) for _ in range(2)]
+    for tree in trees:
+        tree.grow_tree(300, 10.0)
+    return trees
+
+
+def test_moves_with_an_id_are_neither_formatted_nor_compared_in_python(pymcts_module):
+    state_class, _, calls, _ = make_game(pymcts_module)
+    first, second = search_two_trees(pymcts_module, state_class)
+    move = first.select_best_child().get_move()
+    second.advance_tree(move)                                   # matched against the other tree's moves by id
+    assert not second.get_current_state().is_self_side_turn()  # one move down
+    assert second.root.visit_count > 0                          # the subtree was kept
+    assert calls == {"sprint": 0, "__eq__": 0}
+    assert move.sprint() == move.sprint()
+    assert calls["sprint"] == 1                                 # formatted once, when asked for
+
+
+def test_moves_are_interned(pymcts_module):
+    state_class, _, _, alive = make_game(pymcts_module)
+    tree = pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(state_class()))
+    tree.grow_tree(500, 10.0)
+    assert tree.arena_size > 100
+    assert count_alive(alive) == 4                              # one Python move per move_id
+
+
+def test_moves_without_an_id(pymcts_module):
+    state_class, _, calls, alive = make_game(pymcts_module, with_move_id=False)
+    first, second = search_two_trees(pymcts_module, state_class)
+    assert count_alive(alive) > 4                               # not interned
+    assert calls["sprint"] > 0                                  # unhashable: the id comes from sprint()
+    second.advance_tree(first.select_best_child().get_move())
+    assert calls["__eq__"] > 0
+    assert second.root.visit_count > 0
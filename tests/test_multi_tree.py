@@ -0,0 +1,152 @@
+"""Tests for MultiTreeSearch: one evaluate_batch call gathers the leaves of many trees."""
+import pytest
+
+
+@pytest.fixture
+def counting_state_class(pymcts_module):
+    """A small game with evaluate_batch that records the size of every batch it is given."""
+    class CountMove(pymcts_module.MCTS_move):
+        def __init__(self, value):
+            super().__init__()
+            self.value = value
+        def __eq__(self, other):
+            return isinstance(other, CountMove) and self.value == other.value
+
+    class CountState(pymcts_module.MCTS_state):
+        batches = []
+
+        def __init__(self, moves=()):
+            super().__init__()
+            self.moves = moves
+        def actions_to_try(self):
+            return [] if self.is_terminal() else [CountMove(i) for i in range(3)]
+        def next_state(self, move):
+            return CountState(self.moves + (move.value,))
+        def rollout(self):
+            return 0.5
+        def is_terminal(self):
+            return len(self.moves) >= 6
+        def is_self_side_turn(self):
+            return len(self.moves) % 2 == 0
+        def clone(self):
+            return CountState(self.moves)
+        def evaluate_batch(self, states):
+            CountState.batches.append(len(states))
+            return [(0.9 if state.moves[:1] == (2,) else 0.4, [0.2, 0.3, 0.5]) for state in states]
+
+    CountState.batches = []
+    return CountState
+
+
+def make_trees(pymcts_module, state_class, count):
+    return [pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(state_class())) for _ in range(count)]
+
+
+def test_every_tree_gets_its_iterations(pymcts_module, counting_state_class):
+    trees = make_trees(pymcts_module, counting_state_class, 8)
+    search = pymcts_module.MultiTreeSearch(trees, batch_size=16)
+    evaluations = search.search(max_iter=50)
+    for tree in trees:
+        assert tree.stop_reason == "iterations"
+        assert tree.search_iterations == tree.root.visit_count == 50
+    assert evaluations == search.evaluations == sum(counting_state_class.batches)
+    assert search.batches == len(counting_state_class.batches)
+    assert max(counting_state_class.batches) <= 16
+    assert 0.0 < search.occupancy <= 1.0
+    assert search.evaluations_per_second > 0.0
+    assert search.search_time > 0.0
+
+
+def test_batches_span_the_trees(pymcts_module, counting_state_class):
+    trees = make_trees(pymcts_module, counting_state_class, 32)
+    search = pymcts_module.MultiTreeSearch(trees, batch_size=32)
+    search.search(max_iter=20)
+    # every root is evaluated by the first call, then the batches stay full until the last ones
+    assert counting_state_class.batches[0] == 32
+    assert search.occupancy > 0.8
+
+
+def test_a_single_tree_gives_several_leaves_per_batch(pymcts_module, counting_state_class):
+    tree, = make_trees(pymcts_module, counting_state_class, 1)
+    search = pymcts_module.MultiTreeSearch([tree], batch_size=8)
+    search.search(max_iter=100)
+    assert counting_state_class.batches[0] == 1                 # the root, then virtual losses spread the leaves
+    assert max(counting_state_class.batches) > 1
+    assert tree.root.visit_count == 100
+    best = tree.select_best_child()
+    assert best.score / best.visit_count > 0.7                  # the move evaluate_batch favours
+
+
+def test_moves_are_played_between_searches(pymcts_module, counting_state_class):
+    trees = make_trees(pymcts_module, counting_state_class, 4)
+    search = pymcts_module.MultiTreeSearch(trees, batch_size=8)
+    for _ in range(3):
+        search.search(max_iter=30)
+        for tree in search.trees:
+            tree.advance_tree(tree.select_best_child().get_move())
+        assert all(tree.search_iterations == 30 for tree in trees)
+    assert not any(tree.get_current_state().is_self_side_turn() for tree in trees)     # three moves played
+
+
+def test_deadline(pymcts_module, counting_state_class):
+    trees = make_trees(pymcts_module, counting_state_class, 4)
+    search = pymcts_module.MultiTreeSearch(trees)
+    search.search(max_iter=-1, max_time_in_seconds=0.1)
+    assert all(tree.stop_reason in ("time", "exhausted") for tree in trees)
+    assert search.search_time < 1.0
+
+
+def test_needs_evaluate_batch(pymcts_module, simple_python_state, tictactoe_state):
+    with pytest.raises(ValueError):
+        pymcts_module.MultiTreeSearch([pymcts_module.MCTS_tree(tictactoe_state)])
+    with pytest.raises(ValueError):
+        pymcts_module.MultiTreeSearch([pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(simple_python_state))])
+
+
+def test_each_tree_draws_from_its_own_seed(pymcts_module):
+    draws = {}
+
+    class RandomMove(pymcts_module.MCTS_move):
+        def __init__(self, value):
+            super().__init__()
+            self.value = value
+            self.move_id = value
+        def __eq__(self, other):
+            return isinstance(other, RandomMove) and self.value == other.value
+
+    class RandomState(pymcts_module.MCTS_state):
+        """Records the draws of pymcts.random() made while the search of its game creates states."""
+        def __init__(self, game, depth=0):
+            super().__init__()
+            self.game = game
+            self.depth = depth
+        def actions_to_try(self):
+            return [] if self.is_terminal() else [RandomMove(i) for i in range(3)]
+        def next_state(self, move):
+            draws[self.game].append(pymcts_module.random())
+            return RandomState(self.game, self.depth + 1)
+        def rollout(self):
+            return 0.5
+        def is_terminal(self):
+            return self.depth >= 4
+        def is_self_side_turn(self):
+            return self.depth % 2 == 0
+        def clone(self):
+            return RandomState(self.game, self.depth)
+        def evaluate_batch(self, states):
+            return [(0.5, [0.2, 0.3, 0.5]) for _ in states]
+
+    def search(games):
+        trees = []
+        for game, seed in games:
+            draws[game] = []
+            trees.append(pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(RandomState(game))))
+            trees[-1].seed = seed
+        pymcts_module.MultiTreeSearch(trees, batch_size=64).search(max_iter=20)
+        return dict(draws)
+
+    first = search([("a", 1), ("b", 2)])
+    swapped = search([("b", 2), ("a", 1)])
+    assert first["a"] and first == swapped                  # whatever the position of the tree in the list
+    reseeded = search([("a", 3), ("b", 2)])
+    assert reseeded["a"] != first["a"] and reseeded["b"] == first["b"]
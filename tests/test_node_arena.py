@@ -0,0 +1,38 @@
+"""Tests for the tree-owned node arena and its compaction on advance_tree."""
+import pytest
+
+
+def test_arena_grows_with_tree(pymcts_module, tictactoe_state):
+    """Every expanded node should come from the tree's arena."""
+    tree = pymcts_module.MCTS_tree(tictactoe_state)
+    assert tree.arena_size == 1          # just the root
+    tree.grow_tree(max_iter=200, max_time_in_seconds=5)
+    assert tree.arena_size > 1
+    assert tree.arena_bytes > 0
+
+
+def test_advance_tree_reclaims_discarded_subtrees(pymcts_module, tictactoe_state):
+    """advance_tree should drop the old root and its other children from the arena."""
+    tree = pymcts_module.MCTS_tree(tictactoe_state)
+    tree.grow_tree(max_iter=500, max_time_in_seconds=5)
+    before = tree.arena_size
+
+    best = tree.select_best_child()
+    kept_visits = best.visit_count
+    tree.advance_tree(best.get_move())
+
+    assert 1 <= tree.arena_size < before
+    # The surviving subtree keeps its statistics after being relocated
+    assert tree.root.visit_count == kept_visits
+    assert tree.root.get_parent() is None
+
+
+def test_search_continues_after_compaction(pymcts_module, tictactoe_state):
+    """Relocated nodes must remain fully usable for further search."""
+    agent = pymcts_module.MCTS_agent(tictactoe_state, 300, 5)
+    for _ in range(3):
+        move = agent.genmove(None)
+        assert move is not None
+        if agent.get_current_state().is_terminal():
+            break
+    assert agent.tree.arena_size >= 1
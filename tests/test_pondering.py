@@ -0,0 +1,72 @@
+"""Tests for pondering: the agent keeps growing its tree in a background thread during the opponent's turn."""
+import time
+
+
+def wait_for_iterations(agent, seconds=0.2):
+    time.sleep(seconds)
+    assert agent.pondering
+
+
+def test_not_pondering_by_default(pymcts_module):
+    agent = pymcts_module.MCTS_agent(pymcts_module.TicTacToe_state(), 100, 5)
+    assert not agent.pondering
+    agent.stop_pondering()                      # nothing to stop
+    assert agent.ponder_time == 0.0
+    assert agent.ponder_iterations == 0
+
+
+def test_pondered_statistics_are_reused(pymcts_module):
+    player = pymcts_module.MCTS_agent(pymcts_module.TicTacToe_state(), 500, 30)
+    opponent = pymcts_module.MCTS_agent(pymcts_module.TicTacToe_state(), 500, 30)
+    player.num_search_threads = 1
+    move = player.genmove(None)
+    player.start_pondering()
+    wait_for_iterations(player)
+    reply = opponent.genmove(move)
+    assert player.genmove(reply) is not None
+    assert not player.pondering
+    assert player.ponder_iterations > 0
+    assert player.ponder_time >= 0.2
+    assert 0.0 < player.reuse_ratio <= 1.0
+
+
+def test_stop_pondering_cancels_the_search(pymcts_module):
+    agent = pymcts_module.MCTS_agent(pymcts_module.TicTacToe_state(), 100, 5)
+    agent.num_search_threads = 2
+    agent.start_pondering()
+    agent.start_pondering()                     # already pondering: no second thread
+    wait_for_iterations(agent, 0.05)
+    agent.stop_pondering()
+    assert not agent.pondering
+    assert agent.tree.stop_reason == "cancelled"
+    assert agent.tree.root.visit_count == agent.ponder_iterations > 0
+
+
+def test_pondering_stops_when_the_node_limit_is_reached(pymcts_module):
+    agent = pymcts_module.MCTS_agent(pymcts_module.TicTacToe_state(), 100, 5)
+    agent.max_nodes = 200
+    agent.start_pondering()
+    deadline = time.time() + 10
+    while agent.pondering and time.time() < deadline:
+        time.sleep(0.01)
+    assert not agent.pondering
+    assert agent.tree.stop_reason == "nodes"
+
+
+def test_python_states_ponder_without_blocking_python(pymcts_module, simple_python_state):
+    agent = pymcts_module.MCTS_agent(pymcts_module.SerializedPythonState(simple_python_state), 100, 5)
+    agent.start_pondering()
+    # this thread keeps running Python while the pondering thread takes the GIL between its slices
+    start, spins = time.perf_counter(), 0
+    while time.perf_counter() - start < 0.2:
+        spins += 1
+    agent.stop_pondering()
+    assert spins > 1000
+    assert agent.ponder_iterations > 0
+    assert agent.genmove(None) is not None
+
+
+def test_agent_can_be_deleted_while_pondering(pymcts_module):
+    agent = pymcts_module.MCTS_agent(pymcts_module.TicTacToe_state(), 100, 5)
+    agent.start_pondering()
+    del agent
@@ -198,3 +198,39 @@ def test_untried_actions_sorted_by_prior(pymcts_module):
     agent = pymcts_module.MCTS_agent(wrapped_state, max_iter=1, max_seconds=1)
     move = agent.genmove(None)
     assert move.sprint() == "high"
+
+def test_equal_priors_keep_action_order(pymcts_module):
+    """
+    Edges are sorted by prior with a stable sort, so moves with equal priors are
+    expanded in the order actions_to_try() returned them.
+    """
+    class SimpleMove(pymcts_module.MCTS_move):
+        def __init__(self, name):
+            super().__init__()
+            self.name = name
+        def __eq__(self, other):
+            return isinstance(other, SimpleMove) and self.name == other.name
+        def sprint(self):
+            return self.name
+        def to_numpy(self): return [0.0]
+        def to_env_action(self): return [0]
+
+    class TiedPriorState(pymcts_module.MCTS_state):
+        def __init__(self):
+            super().__init__()
+        def actions_to_try(self):
+            return [SimpleMove("low"), SimpleMove("first"), SimpleMove("second"), SimpleMove("third")]
+        def get_action_probabilities(self):
+            return [0.1, 0.3, 0.3, 0.3]
+        def next_state(self, move): return TiedPriorState()
+        def rollout(self): return 0.5
+        def is_terminal(self): return False
+        def is_self_side_turn(self): return True
+
+    wrapped_state = pymcts_module.SerializedPythonState(TiedPriorState())
+    tree = pymcts_module.MCTS_tree(wrapped_state)
+    tree.grow_tree(max_iter=4, max_time_in_seconds=1)
+
+    children = tree.root.get_children()
+    assert [child.get_move().sprint() for child in children] == ["first", "second", "third", "low"]
+    assert tree.root.is_fully_expanded()
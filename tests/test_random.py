@@ -0,0 +1,92 @@
+"""Tests for the seeded per-thread random generators: searches with the same seed are reproducible."""
+import pytest
+
+
+def root_statistics(tree):
+    return [(child.visit_count, child.score) for child in tree.root.get_children()]
+
+
+def grown_tree(pymcts_module, state, seed, iterations=2000):
+    tree = pymcts_module.MCTS_tree(state)
+    tree.num_search_threads = 1
+    tree.seed = seed
+    tree.grow_tree(max_iter=iterations, max_time_in_seconds=60)
+    return tree
+
+
+@pytest.fixture
+def coin_state_class(pymcts_module):
+    """A Python game whose rollouts draw from pymcts.random(), i.e. from the search thread's generator."""
+    class CoinMove(pymcts_module.MCTS_move):
+        def __init__(self, side):
+            super().__init__()
+            self.side = side
+        def __eq__(self, other):
+            return isinstance(other, CoinMove) and self.side == other.side
+
+    class CoinState(pymcts_module.MCTS_state):
+        def __init__(self, depth=0):
+            super().__init__()
+            self.depth = depth
+        def actions_to_try(self):
+            return [CoinMove(0), CoinMove(1), CoinMove(2)]
+        def next_state(self, move):
+            return CoinState(self.depth + 1)
+        def rollout(self):
+            return pymcts_module.random()
+        def is_terminal(self):
+            return self.depth >= 3
+        def is_self_side_turn(self):
+            return self.depth % 2 == 0
+        def clone(self):
+            return CoinState(self.depth)
+
+    return CoinState
+
+
+def test_seed_is_random_by_default(pymcts_module, tictactoe_state):
+    seeds = {pymcts_module.MCTS_tree(tictactoe_state).seed for _ in range(4)}
+    assert len(seeds) > 1
+
+
+def test_same_seed_same_search(pymcts_module):
+    first = grown_tree(pymcts_module, pymcts_module.TicTacToe_state(), 12345)
+    second = grown_tree(pymcts_module, pymcts_module.TicTacToe_state(), 12345)
+    assert first.seed == second.seed == 12345
+    assert root_statistics(first) == root_statistics(second)
+
+
+def test_different_seeds_differ(pymcts_module):
+    results = [root_statistics(grown_tree(pymcts_module, pymcts_module.TicTacToe_state(), seed)) for seed in range(4)]
+    assert any(result != results[0] for result in results[1:])
+
+
+def test_python_rollouts_follow_the_seed(pymcts_module, coin_state_class):
+    wrap = pymcts_module.SerializedPythonState
+    first = grown_tree(pymcts_module, wrap(coin_state_class()), 7, iterations=300)
+    second = grown_tree(pymcts_module, wrap(coin_state_class()), 7, iterations=300)
+    assert root_statistics(first) == root_statistics(second)
+    assert 0.0 < first.root.score < first.root.visit_count
+
+
+def test_agent_seed_replays_a_game(pymcts_module):
+    def play(seed):
+        agent = pymcts_module.MCTS_agent(pymcts_module.TicTacToe_state(), 500, 30)
+        agent.num_search_threads = 1
+        agent.seed = seed
+        assert agent.seed == seed
+        moves = []
+        while not agent.get_current_state().is_terminal():
+            move = agent.genmove(None)
+            moves.append((move.x, move.y))
+        return moves
+
+    assert play(99) == play(99)
+
+
+def test_module_generator_bounds(pymcts_module):
+    for _ in range(1000):
+        assert 0.0 <= pymcts_module.random() < 1.0
+        assert 0 <= pymcts_module.randrange(3) < 3
+    with pytest.raises(ValueError):
+        pymcts_module.randrange(0)
@@ -0,0 +1,159 @@
+"""Tests for the search budget: iteration, deadline, node and memory limits and the reported stop reason."""
+import time
+
+import pytest
+
+
+def test_iteration_limit(pymcts_module, tictactoe_state):
+    tree = pymcts_module.MCTS_tree(tictactoe_state)
+    tree.grow_tree(max_iter=500, max_time_in_seconds=60)
+    assert tree.stop_reason == "iterations"
+    assert tree.search_iterations == 500
+    assert tree.root.visit_count == 500
+
+
+@pytest.mark.parametrize("threads", [1, 4])
+def test_sub_second_deadline(pymcts_module, tictactoe_state, threads):
+    tree = pymcts_module.MCTS_tree(tictactoe_state)
+    tree.num_search_threads = threads
+    start = time.perf_counter()
+    tree.grow_tree(max_iter=-1, max_time_in_seconds=0.05)
+    elapsed = time.perf_counter() - start
+    assert tree.stop_reason == "time"
+    assert 0.05 <= tree.search_time < 0.5
+    assert elapsed < 0.5
+    assert tree.search_iterations == tree.root.visit_count > 0
+
+
+def test_node_limit(pymcts_module, tictactoe_state):
+    tree = pymcts_module.MCTS_tree(tictactoe_state)
+    tree.grow_tree(max_iter=-1, max_time_in_seconds=60, max_nodes=300)
+    assert tree.stop_reason == "nodes"
+    assert 300 <= tree.arena_size < 400
+
+
+def test_memory_limit(pymcts_module, tictactoe_state):
+    tree = pymcts_module.MCTS_tree(tictactoe_state)
+    limit = tree.memory_bytes + 1           # reached as soon as the arena needs a second slab
+    tree.grow_tree(max_iter=-1, max_time_in_seconds=60, max_memory_bytes=limit)
+    assert tree.stop_reason == "memory"
+    assert tree.memory_bytes >= limit
+    assert tree.search_iterations > 0
+
+
+def test_stop_reason_before_any_search(pymcts_module, tictactoe_state):
+    tree = pymcts_module.MCTS_tree(tictactoe_state)
+    assert tree.stop_reason == "none"
+    assert tree.search_iterations == 0
+
+
+def test_agent_budget_properties(pymcts_module):
+    agent = pymcts_module.MCTS_agent(pymcts_module.TicTacToe_state(), 100000, 0.05)
+    assert agent.max_seconds == pytest.approx(0.05)
+    start = time.perf_counter()
+    assert agent.genmove(None) is not None
+    assert time.perf_counter() - start < 0.5
+    assert agent.tree.stop_reason == "time"
+
+    agent.max_iter = 50
+    agent.max_seconds = 60
+    assert agent.genmove(None) is not None
+    assert agent.tree.stop_reason == "iterations"
+    assert agent.tree.search_iterations == 50
+
+    agent.max_iter = -1
+    agent.max_nodes = 200
+    assert agent.max_nodes == 200
+    assert agent.genmove(None) is not None
+    assert agent.tree.stop_reason == "nodes"
+
+
+@pytest.fixture
+def one_sided_state_class(pymcts_module):
+    """A one move game: the first of `width` moves always wins for the side to play, the others always lose."""
+    class PickMove(pymcts_module.MCTS_move):
+        def __init__(self, index):
+            super().__init__()
+            self.index = index
+        def __eq__(self, other):
+            return isinstance(other, PickMove) and self.index == other.index
+
+    class OneSidedState(pymcts_module.MCTS_state):
+        def __init__(self, width=3, picked=None):
+            super().__init__()
+            self.width = width
+            self.picked = picked
+        def actions_to_try(self):
+            return [PickMove(i) for i in range(self.width)]
+        def next_state(self, move):
+            return OneSidedState(self.width, move.index)
+        def rollout(self):
+            return 1.0 if self.picked == 0 else 0.0
+        def is_terminal(self):
+            return self.picked is not None
+        def is_self_side_turn(self):
+            return self.picked is None
+        def clone(self):
+            return OneSidedState(self.width, self.picked)
+
+    return OneSidedState
+
+
+def test_early_stop_is_off_by_default(pymcts_module, one_sided_state_class):
+    tree = pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(one_sided_state_class()))
+    tree.grow_tree(max_iter=2000, max_time_in_seconds=60)
+    assert tree.stop_reason == "iterations"
+    assert tree.search_iterations_saved == 0
+
+
+def test_early_stop_when_the_gap_cannot_close(pymcts_module, one_sided_state_class):
+    tree = pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(one_sided_state_class()))
+    tree.grow_tree(max_iter=5000, max_time_in_seconds=60, early_stop=True)
+    assert tree.stop_reason == "decided"
+    assert 0 < tree.search_iterations < 5000
+    assert tree.search_iterations + tree.search_iterations_saved == 5000
+    best = tree.select_best_child()
+    assert best.score == best.visit_count                # the winning move
+
+
+def test_early_stop_confidence_stops_sooner(pymcts_module, one_sided_state_class):
+    budget_only = pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(one_sided_state_class()))
+    budget_only.grow_tree(max_iter=5000, max_time_in_seconds=60, early_stop=True)
+    confident = pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(one_sided_state_class()))
+    confident.grow_tree(max_iter=5000, max_time_in_seconds=60, early_stop=True, early_stop_confidence=0.95)
+    assert confident.stop_reason == "decided"
+    assert confident.search_iterations < budget_only.search_iterations
+    best = confident.select_best_child()
+    assert best.score == best.visit_count
+
+
+def test_early_stop_with_a_single_legal_move(pymcts_module, one_sided_state_class):
+    tree = pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(one_sided_state_class(width=1)))
+    tree.grow_tree(max_iter=-1, max_time_in_seconds=30, early_stop=True)
+    assert tree.stop_reason == "forced"
+    assert tree.search_iterations == 1
+    assert tree.search_time < 1.0
+    assert tree.search_iterations_saved > 0          # estimated from the deadline and the iteration rate
+
+
+@pytest.mark.parametrize("threads", [1, 4])
+def test_early_stop_on_native_states(pymcts_module, tictactoe_state, threads):
+    tree = pymcts_module.MCTS_tree(tictactoe_state)
+    tree.num_search_threads = threads
+    tree.grow_tree(max_iter=200000, max_time_in_seconds=60, early_stop=True, early_stop_confidence=0.99)
+    assert tree.stop_reason in ("decided", "exhausted")
+    assert tree.search_iterations < 200000
+    if tree.stop_reason == "decided":
+        assert tree.search_iterations_saved > 0
+
+
+def test_agent_early_stop(pymcts_module, one_sided_state_class):
+    agent = pymcts_module.MCTS_agent(pymcts_module.SerializedPythonState(one_sided_state_class()), 5000, 60)
+    assert not agent.early_stop
+    agent.early_stop = True
+    agent.early_stop_confidence = 0.9
+    assert agent.early_stop_confidence == pytest.approx(0.9)
+    assert agent.genmove(None) is not None
+    assert agent.tree.stop_reason == "decided"
+    assert agent.tree.search_iterations < 5000
+    assert agent.tree.root.score == agent.tree.root.visit_count > 0     # advanced to the winning move
@@ -0,0 +1,122 @@
+"""Tests for the self-play runner and its memory-mapped .npy shards."""
+import pytest
+
+np = pytest.importorskip("numpy")
+
+
+def read_all(pymcts_module, directory, chunk_size=4096):
+    chunks = list(pymcts_module.SelfPlayReader(str(directory), chunk_size))
+    return tuple(np.concatenate([chunk[i] for chunk in chunks]) for i in range(3))
+
+
+def test_tictactoe_encoding(pymcts_module):
+    state = pymcts_module.TicTacToe_state()
+    assert state.encode() == [0.0] * 9
+    state = state.next_state(pymcts_module.TicTacToe_move(0, 0, 'x'))
+    assert state.encode() == [-1.0] + [0.0] * 8          # from the point of view of 'o', to move
+
+
+def test_positions_are_recorded(pymcts_module, tmp_path):
+    runner = pymcts_module.SelfPlayRunner(pymcts_module.TicTacToe_state(), str(tmp_path), max_iter=200)
+    assert runner.policy_size == 9
+    positions = runner.play(3)
+    runner.close()
+    assert runner.games == 3
+    assert positions == runner.positions >= 15
+    states, policies, values = read_all(pymcts_module, tmp_path)
+    assert states.shape == (positions, 9) and policies.shape == (positions, 9) and values.shape == (positions,)
+    assert states.dtype == policies.dtype == values.dtype == np.float32
+    assert np.allclose(policies.sum(axis=1), 1.0)
+    assert not states[0].any()                          # the empty board
+    assert set(np.unique(values)) <= {0.0, 0.5, 1.0}
+    # an empty cell is a legal move: the policy only covers the empty cells, in actions_to_try() order
+    assert all((policy[np.count_nonzero(state == 0):] == 0).all() for state, policy in zip(states, policies))
+
+
+def test_outcome_is_seen_from_the_side_to_move(pymcts_module, tmp_path):
+    runner = pymcts_module.SelfPlayRunner(pymcts_module.TicTacToe_state(), str(tmp_path), max_iter=50)
+    runner.sample_moves = 9                             # random-ish games, some of them decisive
+    runner.seed = 3
+    lengths = [runner.play(1) for _ in range(10)]
+    runner.close()
+    _, _, values = read_all(pymcts_module, tmp_path)
+    for game in np.split(values, np.cumsum(lengths)[:-1]):
+        assert (game == 0.5).all() or ((game == 0.0) | (game == 1.0)).all() and (game[1:] + game[:-1] == 1.0).all()
+
+
+def test_shards_are_preallocated_and_cut_on_close(pymcts_module, tmp_path):
+    runner = pymcts_module.SelfPlayRunner(pymcts_module.TicTacToe_state(), str(tmp_path), max_iter=100,
+                                          shard_size=8)
+    positions = runner.play(4)
+    assert runner.shards == (positions + 7) // 8
+    last = tmp_path / "selfplay-{:05d}.values.npy".format(runner.shards - 1)
+    assert np.load(str(last), mmap_mode="r").shape == (8,)          # still preallocated
+    runner.close()
+    assert np.load(str(last), mmap_mode="r").shape == ((positions - 1) % 8 + 1,)
+
+    reader = pymcts_module.SelfPlayReader(str(tmp_path), chunk_size=5)
+    assert reader.num_shards == runner.shards
+    assert reader.positions == positions
+    chunks = list(reader)
+    assert all(len(values) <= 5 for _, _, values in chunks)
+    assert isinstance(chunks[0][0], np.memmap)
+    assert sum(len(values) for _, _, values in chunks) == positions
+
+
+def test_a_new_runner_appends_shards(pymcts_module, tmp_path):
+    for _ in range(2):
+        runner = pymcts_module.SelfPlayRunner(pymcts_module.TicTacToe_state(), str(tmp_path), max_iter=50)
+        runner.play(1)
+        runner.close()
+    assert pymcts_module.SelfPlayReader(str(tmp_path)).num_shards == 2
+
+
+def test_python_states(pymcts_module, tmp_path):
+    class Move(pymcts_module.MCTS_move):
+        def __init__(self, value):
+            super().__init__()
+            self.value = value
+        def __eq__(self, other):
+            return isinstance(other, Move) and self.value == other.value
+
+    asked = []                                          # states whose moves were asked for, once per call
+
+    class Countdown(pymcts_module.MCTS_state):
+        """Players take 1 or 2 from a pile, whoever takes the last one wins."""
+        def __init__(self, pile=5, self_turn=True):
+            super().__init__()
+            self.pile = pile
+            self.self_turn = self_turn
+        def actions_to_try(self):
+            asked.append(self)
+            return [Move(n) for n in (1, 2) if n <= self.pile]
+        def get_action_probabilities(self):
+            return [0.1, 0.9][:min(self.pile, 2)]       # the edges are sorted the other way round
+        def next_state(self, move):
+            return Countdown(self.pile - move.value, not self.self_turn)
+        def rollout(self):
+            return 0.0 if self.self_turn else 1.0             # the previous player took the last one
+        def is_terminal(self):
+            return self.pile == 0
+        def is_self_side_turn(self):
+            return self.self_turn
+        def clone(self):
+            return Countdown(self.pile, self.self_turn)
+        def encode(self):
+            return np.array([self.pile], dtype=np.float32)
+
+    runner = pymcts_module.SelfPlayRunner(pymcts_module.SerializedPythonState(Countdown()), str(tmp_path),
+                                          max_iter=300)
+    runner.play(2)
+    runner.close()
+    states, policies, values = read_all(pymcts_module, tmp_path)
+    assert states[0, 0] == 5
+    assert policies[0, 1] > policies[0, 0]              # taking 2 leaves a losing pile of 3
+    assert values[0] == 1.0
+    assert len(asked) == len(set(map(id, asked)))       # the policy comes from the root's edges, no second call
+
+
+def test_states_without_encoding(pymcts_module, tmp_path, simple_python_state):
+    runner = pymcts_module.SelfPlayRunner(pymcts_module.SerializedPythonState(simple_python_state), str(tmp_path))
+    with pytest.raises(ValueError):
+        runner.play(1)
@@ -0,0 +1,138 @@
+"""Tests for the transposition table: nodes of equal positions reached through different move orders are shared."""
+import pytest
+
+
+@pytest.fixture
+def grid_state_class(pymcts_module):
+    """A walk on a grid: every move steps right or down, so all move orders reaching a cell transpose."""
+    class StepMove(pymcts_module.MCTS_move):
+        def __init__(self, direction):
+            super().__init__()
+            self.direction = direction
+        def __eq__(self, other):
+            return isinstance(other, StepMove) and self.direction == other.direction
+        def sprint(self):
+            return f"Step({self.direction})"
+
+    class GridState(pymcts_module.MCTS_state):
+        def __init__(self, x=0, y=0):
+            super().__init__()
+            self.x, self.y = x, y
+        def actions_to_try(self):
+            return [StepMove("right"), StepMove("down")]
+        def next_state(self, move):
+            if move.direction == "right":
+                return type(self)(self.x + 1, self.y)
+            return type(self)(self.x, self.y + 1)
+        def rollout(self):
+            return 1.0 if self.x > self.y else 0.0
+        def is_terminal(self):
+            return self.x + self.y >= 6
+        def is_self_side_turn(self):
+            return (self.x + self.y) % 2 == 0
+        def clone(self):
+            return type(self)(self.x, self.y)
+
+    return GridState
+
+
+@pytest.fixture
+def keyed_state_class(grid_state_class):
+    class KeyedGridState(grid_state_class):
+        def state_key(self):
+            return (self.x, self.y)
+
+    return KeyedGridState
+
+
+def test_disabled_by_default(pymcts_module, keyed_state_class):
+    tree = pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(keyed_state_class()))
+    assert tree.transposition_table_size == 0
+    tree.grow_tree(max_iter=200, max_time_in_seconds=5)
+    assert tree.transposition_hits == 0
+    assert tree.transposition_entries == 0
+
+
+def test_transpositions_share_nodes(pymcts_module, keyed_state_class):
+    tree = pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(keyed_state_class()))
+    tree.transposition_table_size = 1024
+    tree.grow_tree(max_iter=200, max_time_in_seconds=5)
+    assert tree.transposition_hits > 0
+    # a 7-level grid walk only has 1 + 2 + ... + 7 = 28 distinct positions
+    assert tree.transposition_entries <= 28
+    assert tree.nodes_created <= 28
+    # shared nodes do not inflate the visits of the nodes above them
+    root = tree.root
+    assert sum(child.visit_count for child in root.get_children()) == root.visit_count == 200
+
+
+def test_expand_credits_the_expanding_node(pymcts_module, keyed_state_class):
+    """node.expand() reaching a shared node backs the rollout up through the node that expanded it."""
+    tree = pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(keyed_state_class()))
+    tree.transposition_table_size = 1024
+    root = tree.root
+    root.expand()
+    root.expand()
+    right, down = root.get_children()
+    right.expand()
+    right.expand()                    # (1, 1) through right
+    down.expand()                     # (1, 1) through down: the node is shared
+    assert tree.transposition_hits == 1
+    assert down.visit_count == 2
+    assert down.get_children()[0].visit_count == 2
+    assert right.visit_count == 3
+    assert root.visit_count == 5
+
+
+def test_states_without_key_are_not_shared(pymcts_module, grid_state_class):
+    tree = pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(grid_state_class()))
+    tree.transposition_table_size = 1024
+    tree.grow_tree(max_iter=100, max_time_in_seconds=5)
+    assert tree.transposition_hits == 0
+    assert tree.transposition_entries == 0
+
+
+def test_advance_tree_keeps_shared_nodes(pymcts_module, tictactoe_state):
+    tree = pymcts_module.MCTS_tree(tictactoe_state)
+    tree.transposition_table_size = 1 << 14
+    tree.grow_tree(max_iter=3000, max_time_in_seconds=10)
+    assert tree.transposition_hits > 0
+    best = tree.select_best_child()
+    visits = best.visit_count
+    tree.advance_tree(best.get_move())
+    assert tree.root.visit_count == visits
+    assert 0 < tree.transposition_entries <= tree.transposition_table_size
+    tree.grow_tree(max_iter=500, max_time_in_seconds=10)
+    assert tree.root.visit_count > visits
+
+
+def test_batched_search_with_transpositions(pymcts_module, keyed_state_class):
+    class BatchedGridState(keyed_state_class):
+        calls = 0
+        def get_action_probabilities(self):
+            return [0.5, 0.5]
+        def evaluate_batch(self, states):
+            BatchedGridState.calls += 1
+            return [(0.5, [0.5, 0.5]) for _ in states]
+
+    agent = pymcts_module.MCTS_agent(pymcts_module.SerializedPythonState(BatchedGridState()), 300, 5)
+    agent.batch_size = 4
+    agent.num_search_threads = 2
+    agent.transposition_table_size = 1024
+    assert agent.tree.transposition_table_size == 1024
+    assert agent.genmove(None) is not None
+    assert BatchedGridState.calls > 0
+    assert agent.tree.transposition_hits > 0
+
+
+def test_agent_plays_a_full_game_with_transpositions(pymcts_module):
+    """Moves of shared nodes must follow the first parent that survives advance_tree()."""
+    agent = pymcts_module.MCTS_agent(pymcts_module.TicTacToe_state(), 2000, 30)
+    agent.transposition_table_size = 1 << 12
+    moves = 0
+    while not agent.get_current_state().is_terminal():
+        assert agent.genmove(None) is not None
+        moves += 1
+        children = [child.get_move().sprint() for child in agent.tree.root.get_children()]
+        assert len(children) == len(set(children))
+    assert 5 <= moves <= 9
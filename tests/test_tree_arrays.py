@@ -0,0 +1,93 @@
+"""Tests for the NumPy views of tree statistics: MCTS_tree.to_arrays() and MCTS_node.children_stats()."""
+import pytest
+
+np = pytest.importorskip("numpy")
+
+
+def test_one_row_per_node(pymcts_module, tictactoe_state):
+    tree = pymcts_module.MCTS_tree(tictactoe_state)
+    tree.grow_tree(2000, 10.0)
+    arrays = tree.to_arrays()
+    assert set(arrays) == {"parent", "move_id", "visits", "value_sum", "prior", "depth"}
+    n = tree.arena_size                                         # nothing was discarded yet
+    assert all(len(column) == n for column in arrays.values())
+    assert arrays["parent"].dtype == np.int64 and arrays["visits"].dtype == np.uint32
+    assert arrays["value_sum"].dtype == arrays["prior"].dtype == np.float64
+
+    parent, depth, visits = arrays["parent"], arrays["depth"], arrays["visits"]
+    assert parent[0] == -1 and depth[0] == 0
+    assert visits[0] == tree.root.visit_count and arrays["value_sum"][0] == tree.root.score
+    assert (parent[1:] < np.arange(1, n)).all()                 # breadth first: parents come first
+    assert (depth[1:] == depth[parent[1:]] + 1).all()
+    assert (np.diff(depth) >= 0).all()
+    # a node's visits cover the ones of its children
+    children_visits = np.bincount(parent[1:], weights=visits[1:], minlength=n)
+    assert (children_visits <= visits).all()
+
+
+def test_children_stats(pymcts_module, tictactoe_state):
+    tree = pymcts_module.MCTS_tree(tictactoe_state)
+    tree.grow_tree(500, 10.0)
+    stats = tree.root.children_stats()
+    assert set(stats) == {"move_id", "visits", "value_sum", "prior"}
+    assert len(stats["visits"]) == 9                            # every move of the empty board
+    children = tree.root.get_children()
+    assert sorted(stats["visits"][stats["visits"] > 0]) == sorted(child.visit_count for child in children)
+    assert np.isclose(stats["value_sum"].sum(), sum(child.score for child in children))
+
+    fresh = pymcts_module.MCTS_tree(tictactoe_state)
+    assert len(fresh.root.children_stats()["visits"]) == 0            # moves not generated yet
+
+
+def test_move_ids_of_python_moves(pymcts_module):
+    class Move(pymcts_module.MCTS_move):
+        def __init__(self, value):
+            super().__init__()
+            self.value = value
+            self.move_id = 100 + value
+        def __eq__(self, other):
+            return isinstance(other, Move) and self.value == other.value
+
+    class State(pymcts_module.MCTS_state):
+        def __init__(self, depth=0):
+            super().__init__()
+            self.depth = depth
+        def actions_to_try(self):
+            return [] if self.is_terminal() else [Move(i) for i in range(3)]
+        def next_state(self, move):
+            return State(self.depth + 1)
+        def rollout(self):
+            return 0.5
+        def is_terminal(self):
+            return self.depth >= 3
+        def is_self_side_turn(self):
+            return self.depth % 2 == 0
+        def clone(self):
+            return State(self.depth)
+
+    tree = pymcts_module.MCTS_tree(pymcts_module.SerializedPythonState(State()))
+    tree.grow_tree(200, 10.0)
+    arrays = tree.to_arrays()
+    assert len(arrays["visits"]) == 1 + 3 + 9 + 27
+    assert arrays["move_id"][0] == 0
+    assert set(arrays["move_id"][1:]) == {100, 101, 102}
+    assert sorted(tree.root.children_stats()["move_id"]) == [100, 101, 102]
+
+
+def test_transpositions_are_listed_once(pymcts_module, tictactoe_state):
+    tree = pymcts_module.MCTS_tree(tictactoe_state)
+    tree.transposition_table_size = 1 << 16
+    tree.grow_tree(3000, 10.0)
+    assert tree.transposition_hits > 0
+    arrays = tree.to_arrays()
+    assert (arrays["depth"][1:] == arrays["depth"][arrays["parent"][1:]] + 1).all()
+    assert len(arrays["visits"]) <= tree.arena_size
+
+
+def test_arrays_outlive_the_tree(pymcts_module, tictactoe_state):
+    tree = pymcts_module.MCTS_tree(tictactoe_state)
+    tree.grow_tree(300, 10.0)
+    arrays = tree.to_arrays()
+    root_visits = tree.root.visit_count
+    del tree
+    assert arrays["visits"][0] == root_visits
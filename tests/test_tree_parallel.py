@@ -0,0 +1,86 @@
+"""Tests for tree-parallel search: several threads growing one tree of native (C++) states."""
+import asyncio
+
+import pytest
+
+
+@pytest.mark.parametrize("threads", [1, 2, 4, 8])
+def test_statistics_are_consistent(pymcts_module, tictactoe_state, threads):
+    tree = pymcts_module.MCTS_tree(tictactoe_state)
+    tree.num_search_threads = threads
+    tree.grow_tree(max_iter=3000, max_time_in_seconds=60)
+    root = tree.root
+    # every iteration is counted exactly once and no virtual loss is left behind
+    assert root.visit_count == 3000
+    assert sum(child.visit_count for child in root.get_children()) == 3000
+    assert 0.0 <= root.score <= root.visit_count
+    for child in root.get_children():
+        assert 0.0 <= child.score <= child.visit_count
+
+
+def test_parallel_search_with_transpositions(pymcts_module, tictactoe_state):
+    tree = pymcts_module.MCTS_tree(tictactoe_state)
+    tree.num_search_threads = 4
+    tree.transposition_table_size = 1 << 14
+    tree.grow_tree(max_iter=3000, max_time_in_seconds=60)
+    assert tree.root.visit_count == 3000
+    assert tree.transposition_hits > 0
+    assert tree.transposition_entries <= tree.nodes_created
+
+
+def test_parallel_agent_plays_a_full_game(pymcts_module):
+    agent = pymcts_module.MCTS_agent(pymcts_module.TicTacToe_state(), 2000, 30)
+    agent.num_search_threads = 4
+    moves = 0
+    while not agent.get_current_state().is_terminal():
+        assert agent.genmove(None) is not None
+        moves += 1
+    assert 5 <= moves <= 9
+
+
+def test_parallel_mode_defaults_to_tree(pymcts_module):
+    agent = pymcts_module.MCTS_agent(pymcts_module.TicTacToe_state(), 100, 5)
+    assert agent.parallel_mode == "tree"
+    agent.parallel_mode = "root"
+    assert agent.parallel_mode == "root"
+    with pytest.raises(ValueError):
+        agent.parallel_mode = "leaf"
+
+
+def test_root_parallel_agent_splits_iterations(pymcts_module):
+    agent = pymcts_module.MCTS_agent(pymcts_module.TicTacToe_state(), 4000, 30)
+    agent.parallel_mode = "root"
+    agent.num_search_threads = 4
+    assert agent.genmove(None) is not None
+    # the agent's own tree only ran its share of the iterations, the other trees were merged at the root
+    assert 0 < agent.tree.root.visit_count <= 1000
+
+
+def test_root_parallel_merge_keeps_the_root_size(pymcts_module):
+    agent = pymcts_module.MCTS_agent(pymcts_module.TicTacToe_state(), -1, 60)
+    agent.parallel_mode = "root"
+    agent.num_search_threads = 4
+
+    async def main():
+        future = agent.genmove_async()
+        await asyncio.sleep(0.2)
+        future.cancel()               # no move is played, so the merged root stays the root
+        while agent.searching:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    root = agent.tree.root
+    assert root.visit_count > agent.tree.search_iterations      # the other trees were merged
+    assert root.get_size() == root.visit_count
+
+
+def test_root_parallel_agent_plays_a_full_game(pymcts_module):
+    agent = pymcts_module.MCTS_agent(pymcts_module.TicTacToe_state(), 2000, 30)
+    agent.parallel_mode = "root"
+    agent.num_search_threads = 4
+    agent.transposition_table_size = 1 << 12
+    moves = 0
+    while not agent.get_current_state().is_terminal():
+        assert agent.genmove(None) is not None
+        moves += 1
+    assert 5 <= moves <= 9